@@ -0,0 +1,23 @@
+# operational endpoints; guarded by the admin key rather than user jwt
+
+from fastapi import APIRouter, Depends
+from typing import List
+
+from app.db.schemas import SlowQueryOut, SlowQueryListAdapter, TraceOut, TraceListAdapter
+from app.core.security import require_admin
+from app.core.slow_queries import recent_slow_queries
+from app.core.tracing import recent_traces
+from app.core.timing import TimedRoute
+from app.core.responses import FastJSONResponse
+
+
+router = APIRouter(route_class=TimedRoute, dependencies=[Depends(require_admin)])
+
+@router.get("/slow-queries", response_model=List[SlowQueryOut])
+def view_slow_queries(limit: int = 50):
+    return FastJSONResponse(recent_slow_queries()[:limit], SlowQueryListAdapter)
+
+
+@router.get("/traces", response_model=List[TraceOut])
+def view_traces(limit: int = 20):
+    return FastJSONResponse(recent_traces()[:limit], TraceListAdapter)
@@ -8,9 +8,10 @@ from app.db.models import User
 from app.core.exceptions import AuthJwtCreationError, AuthCredentialsError
 from app.core.security import hash_password, verify_password, create_access_token
 from app.core.logger import get_request_logger
+from app.core.timing import TimedRoute
 
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 # signup
 @router.post("/signup", response_model=AuthOut)
@@ -50,7 +51,7 @@ def signup(
         )
     except Exception as e:
         db.rollback()
-        logger.error(f"error in create group endpoint: {e}")
+        logger.error("error in create group endpoint: %s", e)
         raise HTTPException(status_code=500, detail="Unexpected server error")
 
 # login
@@ -84,5 +85,5 @@ def login(
             detail="Error creating user token"
         )
     except Exception as e:
-        logger.error(f"error in create group endpoint: {e}")
+        logger.error("error in create group endpoint: %s", e)
         raise HTTPException(status_code=500, detail="Unexpected server error")
\ No newline at end of file
@@ -1,19 +1,22 @@
 # translates pure http --> expenses class
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session # type: ignore
 from logging import Logger
 
 from app.db.session import get_db
-from app.db.schemas import ExpenseCreate, ExpenseOut, ExpenseUpdate, ExpenseDelete
-from app.db.models import Expense
+from app.db.schemas import ExpenseCreate, ExpenseOut, ExpenseUpdate, ExpenseDelete, ExpenseOutAdapter
 from app.core.logger import get_request_logger
-from app.core.exceptions import ExpenseCreationError, ExpenseEditError, ExpenseNotFoundError
+from app.core.timing import TimedRoute
+from app.core.responses import FastJSONResponse
+from app.core.exceptions import ExpenseCreationError, ExpenseEditError, ExpenseNotFoundError, ExpenseVersionConflictError, ExpenseSplitMemberError
 
-from app.services.expense_service import create_expense_service, edit_expense_service
+from app.services.expense_service import create_expense_service, edit_expense_service, delete_expense_service, get_expense_details
 from app.core.security import get_current_group, GroupContext
+from app.core.idempotency import get_idempotency, Idempotency
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 @router.post("/{group_id}/create-expense", response_model=ExpenseOut)
 def create_expense(
@@ -21,16 +24,25 @@ def create_expense(
     expense: ExpenseCreate,
     db: Session = Depends(get_db),
     ctx: GroupContext = Depends(get_current_group), #to make sure that this user is a member of the curent group
+    idempotency: Idempotency = Depends(get_idempotency), #retried requests get the stored response instead of a duplicate expense
     logger: Logger = Depends(get_request_logger),
 ):
+    if idempotency.replay is not None:
+        return idempotency.replay
     try:
         logger.info("expense create payload received", extra={"group_id": ctx.group.id, "paid_by": expense.paid_by_id, "created_by": ctx.user.id})
         new_expense = create_expense_service(new_expense=expense, user_id=ctx.user.id, group_id=ctx.group.id, db=db)
-        db.commit()
-        logger.debug("expense created", extra={"expense_id": new_expense.id})
+        expense_id = new_expense.id
+        logger.debug("expense created", extra={"expense_id": expense_id})
 
-        return new_expense
+        return idempotency.save(FastJSONResponse(get_expense_details(expense_id=expense_id, db=db), ExpenseOutAdapter), db) #commits the write together with the stored response
     
+    except ExpenseSplitMemberError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Splits can only name members of the group"
+        )
     except ExpenseCreationError:
         db.rollback()
         raise HTTPException(
@@ -38,7 +50,7 @@ def create_expense(
             detail="Error creating expense"
         ) 
     except Exception as e:
-        logger.error(f"Error creating expense: {e}")
+        logger.error("Error creating expense: %s", e)
         db.rollback()
         raise HTTPException(status_code=500, detail="Unexpected server error")
 
@@ -48,17 +60,18 @@ def edit_expense(
     expense: ExpenseUpdate,
     db: Session = Depends(get_db),
     ctx: GroupContext = Depends(get_current_group),
+    idempotency: Idempotency = Depends(get_idempotency),
     logger: Logger = Depends(get_request_logger),
 ):
+    if idempotency.replay is not None:
+        return idempotency.replay
     try:
         logger.info("expense edit payload recieved", extra={"group_id": ctx.group.id, "user_id": ctx.user.id, "expense_id": expense.id})
         updated_expense = edit_expense_service(expense_update=expense, user_id=ctx.user.id, group_id=ctx.group.id, db=db)
         db.add(updated_expense)
-        db.commit()
-        db.refresh(updated_expense)
-        logger.debug("expense updated", extra={"expense_id": updated_expense.id})
+        logger.debug("expense updated", extra={"expense_id": expense.id})
 
-        return updated_expense
+        return idempotency.save(FastJSONResponse(get_expense_details(expense_id=expense.id, db=db), ExpenseOutAdapter), db) #commits the write together with the stored response
     
     except ExpenseNotFoundError:
         db.rollback()
@@ -66,6 +79,18 @@ def edit_expense(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Expense not found"
         ) 
+    except ExpenseVersionConflictError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Expense was changed by someone else; reload it and try again"
+        )
+    except ExpenseSplitMemberError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Splits can only name members of the group"
+        )
     except ExpenseEditError:
         db.rollback()
         raise HTTPException(
@@ -73,7 +98,7 @@ def edit_expense(
             detail="Error creating expense"
         ) 
     except Exception as e:
-        logger.error(f"Error editing expense: {e}")
+        logger.error("Error editing expense: %s", e)
         db.rollback()
         raise HTTPException(status_code=500, detail="Unexpected server error")
 
@@ -84,21 +109,16 @@ def delete_expense(
     expense: ExpenseDelete,
     db: Session = Depends(get_db),
     ctx: GroupContext = Depends(get_current_group),
+    idempotency: Idempotency = Depends(get_idempotency),
     logger: Logger = Depends(get_request_logger),
 ):
+    if idempotency.replay is not None:
+        return idempotency.replay
     try:
         logger.info("expense delete payload recieved", extra={"group_id": ctx.group.id, "user_id": ctx.user.id, "expense_id": expense.id})   
-        expense_to_delete = (
-            db.query(Expense)
-            .filter(Expense.id == expense.id, Expense.group_id == group_id)
-            .first()
-        )
-        if not expense_to_delete:
-            raise ExpenseNotFoundError
-        db.delete(expense_to_delete)
-        db.commit()
+        delete_expense_service(expense_delete=expense, group_id=ctx.group.id, db=db, user_id=ctx.user.id)
 
-        return {"msg": "Expense deleted"}
+        return idempotency.save(JSONResponse({"msg": "Expense deleted"}), db) #commits the write together with the stored response
     
     except ExpenseNotFoundError:
         db.rollback()
@@ -106,7 +126,13 @@ def delete_expense(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Expense not found"
         )
+    except ExpenseVersionConflictError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Expense was changed by someone else; reload it and try again"
+        )
     except Exception as e:
-        logger.error(f"Error deleting expense: {e}")
+        logger.error("Error deleting expense: %s", e)
         db.rollback()
         raise HTTPException(status_code=500, detail="Unexpected server error")
\ No newline at end of file
@@ -1,52 +1,68 @@
 # translates pure http --> group class
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, status
 from sqlalchemy.orm import Session
 from logging import Logger
-from typing import List
-from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from datetime import date, datetime, timedelta, timezone
+from dataclasses import replace
 
 from app.db.session import get_db
-from app.db.schemas import GroupCreate, GroupJoinIn, GroupOut, GroupShortOut, GroupInviteOut
+from app.db.schemas import (
+    GroupCreate, GroupJoinIn, GroupOut, GroupShortOut, GroupInviteOut, GroupOutAdapter, GroupShortListAdapter, UtcDatetime,
+    MonthlyRollupOut, MonthlyRollupListAdapter, BalancePointOut, BalancePointListAdapter,
+    MemberBalanceOut, MemberBalanceListAdapter,
+)
 from app.db.models import Group, User, GroupMembers
-from app.services.group_service import get_full_group_details, check_join_group, check_link_join, get_short_group_details, calculate_balance, add_user_group, create_group_invite_service
+from app.services.group_read_model import load_group_view, to_columnar, parse_group_include
+from app.services.group_service import check_join_group, check_link_join, get_short_group_details, calculate_balances, add_user_group, create_group_invite_service
+from app.services.rollup_service import get_group_rollups
+from app.services.balance_history import get_balance_history
+from app.services.event_log import get_balances_at
 from app.core.exceptions import (
     GroupFullDetailsError, GroupCheckPwJoinError, GroupCheckLinkJoinError, GroupAddUserError, GroupShortDetailsError, 
-    GroupInviteLinkCreateError, GroupNotFoundError, GroupUserAlreadyJoinedError
+    GroupInviteLinkCreateError, GroupNotFoundError, GroupUserAlreadyJoinedError, GroupIncludeError, GroupAnalyticsError,
+    GroupBalanceHistoryError, GroupBalanceAtError,
 )
 from app.core.security import get_current_user, get_current_group, GroupContext
+from app.core.idempotency import get_idempotency, Idempotency
 from app.core.logger import get_request_logger
+from app.core.timing import TimedRoute
+from app.core.responses import FastJSONResponse, ColumnarResponse, negotiate, COLUMNAR_JSON, COLUMNAR_MSGPACK
 
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 @router.post("/create", response_model=GroupOut)
 def create_group(
     group: GroupCreate, 
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user), #from jwt
+    idempotency: Idempotency = Depends(get_idempotency),
     logger: Logger = Depends(get_request_logger),
 ):
+    if idempotency.replay is not None:
+        return idempotency.replay
     try:
         logger.debug("group create payload received", extra={"group": group.dict(), "user_id": current_user.id})
-        new_group = Group(pw=group.group_pw, name=group.name, emoji=group.emoji)
+        new_group = Group(pw=group.group_pw, name=group.name, emoji=group.emoji, member_count=1) #the creator
 
         # ensure the creator is attached through the association table
         new_member = GroupMembers(user=current_user, group=new_group)
         new_group.member_associations.append(new_member)
 
         db.add(new_group)
-        db.commit()
-        db.refresh(new_group)
+        db.flush() #committed by idempotency.save, together with the stored response
 
         logger.info("group created", extra={"group_id": new_group.id})
 
-        group_details = get_full_group_details(new_group.id, db=db)
+        group_details = load_group_view(new_group.id, db=db)
         # calc balances
+        balances = calculate_balances(group_id=group_details.id, db=db)
         for member in group_details.members:
-            member.balance = calculate_balance(user=member, group_id=group_details.id, db=db)
+            member.balance = balances.get(member.id, 0)
 
-        return group_details
+        return idempotency.save(FastJSONResponse(group_details, GroupOutAdapter), db)
     
     except GroupFullDetailsError:
         db.rollback()
@@ -62,7 +78,7 @@ def create_group(
         )
     except Exception as e:
         db.rollback()
-        logger.error(f"error in create group endpoint: {e}")
+        logger.error("error in create group endpoint: %s", e)
         raise HTTPException(status_code=500, detail="Unexpected server error")
 
 @router.post("/join", response_model=GroupOut)
@@ -70,19 +86,22 @@ def join_group(
     group: GroupJoinIn,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
+    idempotency: Idempotency = Depends(get_idempotency), #a retried join replays the 200 instead of failing with "already in this group"
     logger: Logger = Depends(get_request_logger),
 ):
+    if idempotency.replay is not None:
+        return idempotency.replay
     try:
         logger.debug("join group attempt", extra={"type": group.pw_auth if group.pw_auth else group.link_auth})
         group_id = check_join_group(group_name=group.pw_auth.group_name, group_pw=group.pw_auth.group_pw, db=db) if group.pw_auth else check_link_join(token_link=group.link_auth, db=db)
         # group not found error raised instead of checking group_id val
-        joined_group_details = add_user_group(group_id=group_id, user=current_user, db=db)
-        db.commit()
+        add_user_group(group_id=group_id, user=current_user, db=db) #committed by idempotency.save
+        joined_group_details = load_group_view(group_id=group_id, db=db)
 
+        balances = calculate_balances(group_id=joined_group_details.id, db=db) # this is only querying, no db commit needed
         for member in joined_group_details.members:
-            member.balance = calculate_balance(user=member, group_id=joined_group_details.id, db=db)
-            # this is only querying, no db commit needed
-        return joined_group_details
+            member.balance = balances.get(member.id, 0)
+        return idempotency.save(FastJSONResponse(joined_group_details, GroupOutAdapter), db)
 
     except GroupNotFoundError:
         db.rollback()
@@ -116,7 +135,7 @@ def join_group(
         ) 
     except Exception as e:
         db.rollback()
-        logger.error(f"error in join group endpoint: {e}")
+        logger.error("error in join group endpoint: %s", e)
         raise HTTPException(status_code=500, detail="Unexpected server error")
 
 
@@ -128,7 +147,7 @@ def view_all_groups(
 ):
     try:
         logger.debug("view all groups attempt", extra={"User id": current_user.id, "User name ": current_user.name})
-        return get_short_group_details(user_id=current_user.id, db=db)
+        return FastJSONResponse(get_short_group_details(user_id=current_user.id, db=db), GroupShortListAdapter)
     except GroupShortDetailsError:
         raise HTTPException(
             status_code=status.HTTP_404_INTERNAL_ERROR,
@@ -138,19 +157,43 @@ def view_all_groups(
         # no db rollback cause only reading
         raise HTTPException(status_code=500, detail="Unexpected server error")
 
-@router.get("/{group_id}", response_model=GroupOut)
+@router.get(
+    "/{group_id}",
+    response_model=GroupOut,
+    responses={200: {"content": {COLUMNAR_JSON: {}, COLUMNAR_MSGPACK: {}}, "description": "GroupOut, or its columnar form when asked for via Accept"}},
+)
 def view_group(
     ctx: GroupContext = Depends(get_current_group),
     db: Session = Depends(get_db),
     logger: Logger = Depends(get_request_logger),
+    accept: Optional[str] = Header(default=None),
+    include: Optional[str] = Query(
+        default=None,
+        description="Parts to load and return, eg. members,balances,expenses(limit=20). Omit for everything, empty for the group header only",
+    ),
+    since: Optional[UtcDatetime] = Query(default=None, description="Only expenses that occurred at or after this time; balances then cover just those expenses"),
+    until: Optional[UtcDatetime] = Query(default=None, description="Only expenses that occurred before this time"),
 ):
     try:
         logger.debug("view group attempt", extra={"group_name": ctx.group.name, "user_name": ctx.user.name})
-        
-        joined_group_details = get_full_group_details(ctx.group.id, db=db)
-        for member in joined_group_details.members:
-            member.balance = calculate_balance(user=member, group_id=joined_group_details.id, db=db)
-        return joined_group_details
+        group_include = replace(parse_group_include(include), since=since, until=until)
+
+        joined_group_details = load_group_view(ctx.group.id, db=db, include=group_include)
+        if group_include.balances:
+            balances = calculate_balances(group_id=joined_group_details.id, db=db, since=since, until=until)
+            for member in joined_group_details.members:
+                member.balance = balances.get(member.id, 0)
+
+        # big ledgers can ask for the columnar form; users are listed once instead of per expense/split
+        media_type = negotiate(accept, ["application/json", COLUMNAR_JSON, COLUMNAR_MSGPACK])
+        if media_type != "application/json":
+            return ColumnarResponse(to_columnar(joined_group_details, group_include), media_type, headers={"Vary": "Accept"})
+        return FastJSONResponse(joined_group_details, GroupOutAdapter, headers={"Vary": "Accept"}, exclude=group_include.exclude())
+    except GroupIncludeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except GroupFullDetailsError:
         db.rollback()
         raise HTTPException(
@@ -158,10 +201,78 @@ def view_group(
             detail="Error polling db for group details"
         )
     except Exception as e:
-        logger.error(f"error in view group endpoint: {e}")
+        logger.error("error in view group endpoint: %s", e)
         raise HTTPException(status_code=500, detail="Unexpected server error")
     
 
+@router.get("/{group_id}/analytics", response_model=List[MonthlyRollupOut])
+def group_analytics(
+    ctx: GroupContext = Depends(get_current_group),
+    db: Session = Depends(get_db),
+    logger: Logger = Depends(get_request_logger),
+    since: Optional[date] = Query(default=None, description="First month to include (any day in it)"),
+    until: Optional[date] = Query(default=None, description="Months starting on or after this day are left out"),
+):
+    # paid/owed totals and counts per member and month, read from the rollups rather than summing expenses
+    try:
+        rollups = get_group_rollups(group_id=ctx.group.id, db=db, since=since, until=until)
+        return FastJSONResponse(rollups, MonthlyRollupListAdapter)
+    except GroupAnalyticsError:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error loading group analytics"
+        )
+    except Exception as e:
+        logger.error("error in group analytics endpoint: %s", e)
+        raise HTTPException(status_code=500, detail="Unexpected server error")
+
+
+@router.get("/{group_id}/balance-history", response_model=List[BalancePointOut])
+def balance_history(
+    ctx: GroupContext = Depends(get_current_group),
+    db: Session = Depends(get_db),
+    logger: Logger = Depends(get_request_logger),
+    user_id: Optional[int] = Query(default=None, description="Member to chart; defaults to the caller"),
+    since: Optional[UtcDatetime] = Query(default=None, description="Start of the chart; the first point is the balance at this time"),
+    until: Optional[UtcDatetime] = Query(default=None, description="Expenses that occurred at or after this time are left out"),
+    points: int = Query(default=300, ge=3, le=5000, description="Most points to return; longer histories are downsampled"),
+):
+    try:
+        history = get_balance_history(
+            group_id=ctx.group.id, user_id=user_id or ctx.user.id, db=db, since=since, until=until, points=points,
+        )
+        return FastJSONResponse(history, BalancePointListAdapter)
+    except GroupBalanceHistoryError:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error loading balance history"
+        )
+    except Exception as e:
+        logger.error("error in balance history endpoint: %s", e)
+        raise HTTPException(status_code=500, detail="Unexpected server error")
+
+
+@router.get("/{group_id}/balances-at", response_model=List[MemberBalanceOut])
+def balances_at(
+    ctx: GroupContext = Depends(get_current_group),
+    db: Session = Depends(get_db),
+    logger: Logger = Depends(get_request_logger),
+    at: UtcDatetime = Query(description="Balances as the ledger stood at this time; later edits and deletes are undone"),
+):
+    try:
+        balances = get_balances_at(group_id=ctx.group.id, at=at, db=db)
+        rows = [{"user_id": user_id, "balance": balance} for user_id, balance in sorted(balances.items()) if balance]
+        return FastJSONResponse(rows, MemberBalanceListAdapter)
+    except GroupBalanceAtError:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error loading balances"
+        )
+    except Exception as e:
+        logger.error("error in balances at endpoint: %s", e)
+        raise HTTPException(status_code=500, detail="Unexpected server error")
+
+
 @router.get("/{group_id}/create-invite", response_model=GroupInviteOut)
 def create_group_invite(
     ctx: GroupContext = Depends(get_current_group),
@@ -183,5 +294,5 @@ def create_group_invite(
         )
     except Exception as e:
         db.rollback()
-        logger.error(f"Error creating group invite: {e}")
+        logger.error("Error creating group invite: %s", e)
         raise HTTPException(status_code=500, detail="Unexpected server error")
@@ -0,0 +1,189 @@
+# response compression; gzip always, brotli / zstd when their packages are installed
+# pure ASGI so streamed bodies are compressed chunk by chunk instead of being buffered
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.core.config import settings
+
+try:
+    import brotli
+except ImportError: #optional; pip install brotli
+    brotli = None
+
+try:
+    import zstandard
+except ImportError: #optional; pip install zstandard
+    zstandard = None
+
+
+# only types that shrink; images/archives are already compressed
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/vnd.mycount.columnar+json",
+    "application/vnd.mycount.columnar+msgpack",
+    "application/x-ndjson",
+    "text/",
+)
+
+
+class _Gzip:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS) #16+ -> gzip header/trailer
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH) #lets the client decode what has arrived so far
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _Brotli:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class _Zstd:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+def available_encodings() -> dict:
+    """content-coding -> compressor factory, in server preference order (smallest output first)"""
+    encodings = {}
+    if brotli is not None:
+        encodings["br"] = lambda: _Brotli(settings.compression_brotli_quality)
+    if zstandard is not None:
+        encodings["zstd"] = lambda: _Zstd(settings.compression_zstd_level)
+    encodings["gzip"] = lambda: _Gzip(settings.compression_gzip_level)
+    return encodings
+
+
+ENCODINGS = available_encodings()
+
+
+def choose_encoding(accept_encoding: str, encodings: dict = ENCODINGS) -> Optional[str]:
+    """Best supported coding the client accepts (q > 0); client q wins, server order breaks ties"""
+    accepted: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, *params = [piece.strip() for piece in part.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.lower()] = q
+
+    best, best_q = None, 0.0
+    for coding in encodings:
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def _compressible(headers: Headers) -> bool:
+    if "content-encoding" in headers:
+        return False
+    content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """
+        Compresses responses whose content-type is in COMPRESSIBLE_TYPES. Single-message bodies under
+        settings.compression_min_size go out as-is; streamed bodies (more_body) are always compressed,
+        flushing after every chunk so the client keeps receiving data while the export is produced
+    """
+
+    def __init__(self, app, encodings: Optional[dict] = None):
+        self.app = app
+        self.encodings = ENCODINGS if encodings is None else encodings
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.compression_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        coding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None #set once we've decided to compress
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough
+
+            if message["type"] == "http.response.start":
+                if _compressible(Headers(raw=message["headers"])):
+                    start_message = message #held until the first body chunk says whether it's worth it
+                else:
+                    passthrough = True
+                    await send(message)
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                if not more_body and len(body) < settings.compression_min_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                compressor = self.encodings[coding]()
+                headers["Content-Encoding"] = coding
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    del headers["Content-Length"] #streamed; length unknown until the end
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": compressor.compress(body) + compressor.flush(), "more_body": True})
+                else:
+                    compressed = compressor.compress(body) + compressor.finish()
+                    headers["Content-Length"] = str(len(compressed))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": compressed})
+                return
+
+            if more_body:
+                await send({"type": "http.response.body", "body": compressor.compress(body) + compressor.flush(), "more_body": True})
+            else:
+                await send({"type": "http.response.body", "body": compressor.compress(body) + compressor.finish()})
+
+        await self.app(scope, receive, send_compressed)
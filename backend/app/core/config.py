@@ -1,4 +1,5 @@
 # basic settings; db url, env vars
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -11,6 +12,35 @@ class Settings(BaseSettings):
 
     log_format: str
     base_logger_name: str
+    log_level: str = "INFO"
+    log_json: bool = True #one json object per line; False -> plain log_format lines
+    log_queue_size: int = 10000 #records waiting for the writer thread; overflow is dropped, never waited on
+    log_sample_rates: dict[str, float] = {} #module logger -> fraction of its debug/info records kept, eg. {"app.services.group_service": 0.1}
+
+    perf_sample_rate: float = 0.0 #fraction of requests that get Server-Timing headers + timing logs
+
+    slow_query_log_enabled: bool = False
+    slow_query_threshold_ms: float = 200.0
+    slow_query_buffer_size: int = 200
+
+    trace_sample_rate: float = 0.0 #head sampling; fraction of requests that record a span tree
+    trace_trust_upstream: bool = False #let an incoming traceparent's sampled flag decide; only behind a proxy that sets/strips it, else any client can force tracing
+    trace_buffer_size: int = 100 #finished traces kept in memory for /admin/traces
+    trace_file: Optional[str] = None #also append every finished trace as a json line here
+
+    idempotency_ttl_hours: int = 24 #how long a stored response can be replayed
+    idempotency_wait_seconds: float = 5.0 #how long a retry waits for the original request's response before giving up with 409
+
+    balance_snapshot_lag_seconds: int = 600 #events this recent are left out of balance snapshots; must outlast the longest expense write transaction
+
+    admin_api_key: Optional[str] = None #admin endpoints are disabled unless this is set
+    metrics_token: Optional[str] = None #/metrics wants "Authorization: Bearer <token>" when set; unset, it must only be reachable on an internal network
+
+    compression_enabled: bool = True
+    compression_min_size: int = 1024 #bytes; smaller bodies aren't worth the cpu or the encoding overhead
+    compression_gzip_level: int = 6 #1 (fast) - 9 (small)
+    compression_brotli_quality: int = 4 #0 - 11; above ~5 gets slow for dynamic responses
+    compression_zstd_level: int = 3 #1 - 22
 
     @property
     def database_url(self):
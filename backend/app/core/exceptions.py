@@ -17,11 +17,19 @@ class ExpenseNotFoundError(Exception):
     """Generic fallback"""
     pass
 
+class ExpenseVersionConflictError(Exception):
+    """When the expense was changed by someone else since the client read it (version mismatch / stale UPDATE or DELETE)"""
+    pass
+
+class ExpenseSplitMemberError(ExpenseCreationError):
+    """When a split or split rule names a user who isn't a member of the group"""
+    pass
+
 # ******************************************************************************************************************************************************************************************
 # GROUPS
 # ******************************************************************************************************************************************************************************************
 class GroupFullDetailsError(Exception):
-    "When get_full_group_details service fails"
+    "When load_group_view service fails"
     pass
 
 class GroupCalculateBalanceError(Exception):
@@ -52,6 +60,22 @@ class GroupInviteLinkCreateError(Exception):
     """When create_group_invite_service service fails"""
     pass
 
+class GroupIncludeError(Exception):
+    """When the include= query param of the group view can't be parsed; message is safe to show the client"""
+    pass
+
+class GroupAnalyticsError(Exception):
+    """When get_group_rollups service fails"""
+    pass
+
+class GroupBalanceHistoryError(Exception):
+    """When get_balance_history service fails"""
+    pass
+
+class GroupBalanceAtError(Exception):
+    """When get_balances_at service fails"""
+    pass
+
 # generic/reusable
 class GroupNotFoundError(Exception):
     """generic error msg for invalid inputs"""
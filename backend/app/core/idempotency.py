@@ -0,0 +1,143 @@
+# Idempotency-Key support for mutation endpoints; a retried request gets the stored response instead of repeating the write
+import hashlib
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Request, status
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.responses import Response
+
+from app.core.config import settings
+from app.core.logger import get_module_logger
+from app.core.security import get_current_user
+from app.db.models import IdempotencyKey, User
+from app.db.session import get_db
+
+
+logger = get_module_logger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+_MAX_KEY_LENGTH = 255
+_POLL_SECONDS = 0.05
+
+
+@dataclass
+class Idempotency:
+    """
+        Per-request handle. `replay` is set when an earlier request with the same key already ran; the
+        endpoint returns it as-is. Otherwise `key_id` is the key reserved in the request's transaction
+        (None when the client sent no key) and save() stores the response and commits. Endpoints build the
+        response before committing, so the write, the key and its response commit together or not at all;
+        a failure on the way rolls back the key too, instead of leaving it reserved with no response
+    """
+    key_id: Optional[int] = None
+    replay: Optional[Response] = None
+
+    def save(self, response: Response, db: Session) -> Response:
+        if self.key_id is not None:
+            # plain UPDATE by id; the reserved row doesn't need reloading
+            db.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.id == self.key_id)
+                .values(status_code=response.status_code, media_type=response.media_type, response_body=bytes(response.body))
+            )
+        db.commit()
+        return response
+
+
+def _utc(value: datetime) -> datetime:
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc) #sqlite hands back naive datetimes
+
+
+def _stored_key(user_id: int, key: str, db: Session) -> Optional[IdempotencyKey]:
+    return db.execute(
+        select(IdempotencyKey)
+        .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+        .execution_options(populate_existing=True) #re-read while polling
+    ).scalar_one_or_none()
+
+
+def _replay(stored: IdempotencyKey, request_hash: str, db: Session) -> Response:
+    if stored.request_hash != request_hash:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used for a different request",
+        )
+
+    # the original request commits its write, the key and the response together; this wait only covers
+    # sqlite (no insert blocking) and a request that is still running when the key is looked up
+    deadline = time.monotonic() + settings.idempotency_wait_seconds
+    while stored.status_code is None:
+        if time.monotonic() >= deadline:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is still being processed",
+            )
+        time.sleep(_POLL_SECONDS)
+        db.refresh(stored)
+
+    return Response(
+        content=stored.response_body,
+        status_code=stored.status_code,
+        media_type=stored.media_type,
+        headers={REPLAYED_HEADER: "true"},
+    )
+
+
+async def _request_hash(request: Request) -> Optional[str]:
+    # async so the (cached) body can be read; the db work below stays in the sync dependency
+    if IDEMPOTENCY_HEADER not in request.headers:
+        return None
+    body = await request.body()
+    return hashlib.sha256(f"{request.method} {request.url.path}\n".encode() + body).hexdigest()
+
+
+def get_idempotency(
+    request: Request,
+    request_hash: Optional[str] = Depends(_request_hash),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> Idempotency:
+    """
+        Because this is a dependency it needs a HTTPException rather than a custom exception.
+        Reserving the key is an INSERT against the (user_id, key) unique constraint, so on postgres a
+        concurrent request with the same key waits for the first one to commit and then replays its response
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if key is None:
+        return Idempotency()
+    if not key.strip() or len(key) > _MAX_KEY_LENGTH:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid Idempotency-Key")
+
+    user_id = current_user.id
+    now = datetime.now(timezone.utc)
+    for _ in range(2): #second pass only after losing the insert race
+        stored = _stored_key(user_id, key, db)
+        if stored is not None and _utc(stored.expires_at) <= now:
+            db.delete(stored)
+            db.flush()
+            stored = None
+        if stored is not None:
+            logger.debug("replaying idempotent request", extra={"user_id": user_id, "status_code": stored.status_code})
+            return Idempotency(replay=_replay(stored, request_hash, db))
+
+        record = IdempotencyKey(key=key, user_id=user_id, request_hash=request_hash, expires_at=now + timedelta(hours=settings.idempotency_ttl_hours))
+        db.add(record)
+        try:
+            db.flush()
+            return Idempotency(key_id=record.id)
+        except IntegrityError:
+            db.rollback()
+
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A request with this Idempotency-Key is still being processed")
+
+
+def purge_expired_idempotency_keys(db: Session, now: Optional[datetime] = None) -> int:
+    """Deletes expired keys through the expires_at index; returns how many went. Caller commits"""
+    result = db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= (now or datetime.now(timezone.utc))))
+    return result.rowcount
@@ -1,21 +1,178 @@
+import atexit
+import json
 import logging
+import queue
+import random
+import re
+import threading
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
 from logging import Logger
+from logging.handlers import QueueHandler, QueueListener
 from typing import Optional
 from fastapi import Request
+from starlette.datastructures import Headers, MutableHeaders
 
 from app.core.config import settings
 
 
-def setup_logging(level: int = logging.INFO) -> Logger:
+# ******************************************************************************************************************************************************************************************
+# REQUEST ID
+# ******************************************************************************************************************************************************************************************
+_request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+_valid_request_id = re.compile(r"^[A-Za-z0-9._-]{1,64}$") #ids from the client end up in logs, so keep them boring
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+class RequestIdMiddleware:
+    """Pure ASGI; reuses a sane incoming X-Request-ID or makes one, exposes it to logs and echoes it back"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = Headers(scope=scope).get("x-request-id", "")
+        request_id = incoming if _valid_request_id.match(incoming) else uuid.uuid4().hex
+        token = _request_id.set(request_id)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Request-ID"] = request_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            _request_id.reset(token)
+
+
+# ******************************************************************************************************************************************************************************************
+# FORMATTING + SAMPLING
+# ******************************************************************************************************************************************************************************************
+# attributes every LogRecord has; anything else came in through extra={...}
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One json object per line; extra={...} fields are merged in at the top level"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+        Keeps a fraction of the below-WARNING records of chatty loggers (settings.log_sample_rates, keyed by
+        module name relative to the base logger, eg. "app.services.group_service"). Longest prefix wins.
+        Warnings and errors are never sampled away
+    """
+
+    def __init__(self, rates: dict[str, float], base_name: str):
+        super().__init__()
+        self.rates = rates
+        self.prefix = base_name + "."
+        self._resolved: dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            relative = name.removeprefix(self.prefix)
+            matches = [key for key in self.rates if relative == key or relative.startswith(key + ".")]
+            rate = self._resolved[name] = self.rates[max(matches, key=len)] if matches else 1.0
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+        Hands records to the listener thread without formatting them; the message is only built (and
+        %-args rendered) over there. Drops records instead of blocking when the bounded queue is full
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # the request id lives in a contextvar, so it has to be captured on the request thread
+        record.request_id = _request_id.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+
+def dropped_log_records() -> int:
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+def _stop_listener() -> None:
+    if _listener is not None:
+        _listener.stop() #drains what's queued before exit
+
+
+# ******************************************************************************************************************************************************************************************
+# SETUP
+# ******************************************************************************************************************************************************************************************
+def setup_logging(level: Optional[int] = None) -> Logger:
+    """
+        Request threads only put records on a bounded queue; a QueueListener thread formats them
+        (json or settings.log_format) and writes them to stderr
+    """
+    global _queue_handler, _listener
+
     logger = logging.getLogger(settings.base_logger_name)
     if logger.handlers:
         return logger
 
+    level = level if level is not None else logging.getLevelName(settings.log_level.upper())
     logger.setLevel(level)
+
     stream_handler = logging.StreamHandler()
     stream_handler.setLevel(level)
-    stream_handler.setFormatter(logging.Formatter(settings.log_format))
-    logger.addHandler(stream_handler)
+    stream_handler.setFormatter(JsonFormatter() if settings.log_json else logging.Formatter(settings.log_format))
+
+    _queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=settings.log_queue_size))
+    _queue_handler.addFilter(SamplingFilter(settings.log_sample_rates, settings.base_logger_name))
+    _listener = QueueListener(_queue_handler.queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_stop_listener)
+
+    logger.addHandler(_queue_handler)
     logger.propagate = False
 
     return logger
@@ -36,4 +193,4 @@ def get_request_logger(request: Request, name: Optional[str] = None) -> Logger:
 def get_module_logger(name: str) -> Logger:
     base_logger = logging.getLogger(settings.base_logger_name)
 
-    return base_logger.getChild(name)
\ No newline at end of file
+    return base_logger.getChild(name)
@@ -0,0 +1,170 @@
+# prometheus metrics; route latency, in-flight requests, errors per exception class, db pool + cache stats
+# set PROMETHEUS_MULTIPROC_DIR when running several uvicorn/gunicorn workers so values are shared through mmap files
+# /metrics has no user auth: set METRICS_TOKEN (prometheus scrape_config `authorization`) or keep it off the public port
+import atexit
+import os
+import secrets
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+from prometheus_client.core import CounterMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
+from sqlalchemy.pool import Pool
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.core.config import settings
+from app.core.logger import dropped_log_records
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Request latency per route template",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+REQUESTS_TOTAL = Counter("http_requests_total", "Requests per route and status code", ["method", "route", "status"])
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being handled", multiprocess_mode="livesum")
+EXCEPTIONS_TOTAL = Counter("http_exceptions_total", "Errors per exception class", ["exception"])
+
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out of the pool", multiprocess_mode="livesum")
+DB_POOL_CONNECTS_TOTAL = Counter("db_pool_connects_total", "New DBAPI connections opened by the pool")
+DB_POOL_INVALIDATIONS_TOTAL = Counter("db_pool_invalidations_total", "Pooled connections invalidated (eg. dropped by the server)")
+
+# hit ratio = rate(cache_requests_total{result="hit"}) / rate(cache_requests_total)
+CACHE_REQUESTS_TOTAL = Counter("cache_requests_total", "Cache lookups per cache and result", ["cache", "result"])
+
+
+_MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+
+class _LogDropCollector:
+    """
+        Reads the log queue's drop count at scrape time instead of touching a metric from the logging hot path.
+        The count lives in this process, so with several workers it's labelled by pid: each worker is its own series
+    """
+
+    def collect(self):
+        if _MULTIPROCESS:
+            family = CounterMetricFamily("log_records_dropped_total", "Log records dropped because the log queue was full", labels=["pid"])
+            family.add_metric([str(os.getpid())], dropped_log_records())
+            yield family
+        else:
+            yield CounterMetricFamily("log_records_dropped_total", "Log records dropped because the log queue was full", value=dropped_log_records())
+
+
+_log_drops = _LogDropCollector()
+REGISTRY.register(_log_drops)
+
+if _MULTIPROCESS:
+    # live gauges (in flight, pool checked out) keep a file per pid; without this a dead worker's last value stays in the sum.
+    # runs on a clean worker exit; under gunicorn also call multiprocess.mark_process_dead(worker.pid) from child_exit
+    atexit.register(multiprocess.mark_process_dead, os.getpid())
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS_TOTAL.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+def record_exception(exc: BaseException) -> None:
+    """
+        Endpoints translate service exceptions into HTTPException inside an except block, so the
+        service exception is still reachable through __context__ and is the more useful label
+    """
+    if isinstance(exc, StarletteHTTPException) and exc.__context__ is not None:
+        exc = exc.__context__
+    EXCEPTIONS_TOTAL.labels(exception=type(exc).__name__).inc()
+
+
+# ******************************************************************************************************************************************************************************************
+# SQLALCHEMY HOOKS
+# ******************************************************************************************************************************************************************************************
+@event.listens_for(Pool, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    DB_POOL_CHECKED_OUT.inc()
+
+
+@event.listens_for(Pool, "checkin")
+def _on_checkin(dbapi_connection, connection_record):
+    DB_POOL_CHECKED_OUT.dec()
+
+
+@event.listens_for(Pool, "connect")
+def _on_connect(dbapi_connection, connection_record):
+    DB_POOL_CONNECTS_TOTAL.inc()
+
+
+@event.listens_for(Pool, "invalidate")
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    DB_POOL_INVALIDATIONS_TOTAL.inc()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _on_statement(conn, cursor, statement, parameters, context, executemany):
+    # sqlalchemy's compiled statement cache; misses mean sql gets recompiled on every call
+    cache_hit = getattr(context, "cache_hit", None)
+    if cache_hit is CACHE_HIT:
+        record_cache("sql_compiled", hit=True)
+    elif cache_hit is CACHE_MISS:
+        record_cache("sql_compiled", hit=False)
+
+
+# ******************************************************************************************************************************************************************************************
+# MIDDLEWARE + ENDPOINT
+# ******************************************************************************************************************************************************************************************
+class MetricsMiddleware:
+    """Pure ASGI middleware; labels by route template (not raw path) to keep cardinality bounded"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception as exc:
+            record_exception(exc)
+            raise
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")
+            route_name = route.path if route is not None else "unmatched"
+            REQUEST_LATENCY.labels(method=scope["method"], route=route_name).observe(time.perf_counter() - started)
+            REQUESTS_TOTAL.labels(method=scope["method"], route=route_name, status=str(status_code)).inc()
+
+
+def _authorized(request: Request) -> bool:
+    if not settings.metrics_token:
+        return True
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    return scheme.lower() == "bearer" and secrets.compare_digest(token.encode(), settings.metrics_token.encode())
+
+
+def metrics_endpoint(request: Request) -> Response:
+    if not _authorized(request):
+        return Response("Invalid metrics token", status_code=401, headers={"WWW-Authenticate": "Bearer"})
+    if _MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(_log_drops) #not backed by the mmap files, so it isn't in what MultiProcessCollector reads
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
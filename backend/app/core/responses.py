@@ -0,0 +1,119 @@
+# fast response path for big payloads; ORM objects -> pydantic-core -> json bytes, skipping fastapi's python-dict + json.dumps round trip
+# plus the negotiated columnar encodings for clients that render large ledgers
+import json
+import time
+from typing import Any, Mapping, Optional
+
+import msgpack
+from pydantic import TypeAdapter
+from starlette.background import BackgroundTask
+from starlette.responses import Response
+
+from app.core.timing import current_timings
+from app.core.tracing import span
+
+
+COLUMNAR_JSON = "application/vnd.mycount.columnar+json"
+COLUMNAR_MSGPACK = "application/vnd.mycount.columnar+msgpack"
+
+
+def _add_ser_time(started: float) -> None:
+    # rendered inside the endpoint, so TimedRoute wouldn't see it
+    timings = current_timings()
+    if timings is not None:
+        timings.ser_ms += (time.perf_counter() - started) * 1000
+
+
+def _media_ranges(accept: str) -> list[tuple[str, float]]:
+    ranges = []
+    for part in accept.split(","):
+        media_range, *params = [piece.strip() for piece in part.split(";")]
+        if not media_range:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        ranges.append((media_range.lower(), q))
+    return ranges
+
+
+def negotiate(accept: Optional[str], offers: list[str]) -> str:
+    """
+        Picks the offer the Accept header ranks highest; the most specific matching range sets an offer's q.
+        Ties go to the earlier offer, and a missing or unsatisfiable header gets the first (default) offer
+    """
+    if not accept:
+        return offers[0]
+    ranges = _media_ranges(accept)
+
+    def quality(offer: str) -> float:
+        kind = offer.split("/")[0]
+        for candidate in (offer, f"{kind}/*", "*/*"):
+            matches = [q for media_range, q in ranges if media_range == candidate]
+            if matches:
+                return max(matches)
+        return 0.0
+
+    best = max(offers, key=lambda offer: (quality(offer), -offers.index(offer)))
+    return best if quality(best) > 0 else offers[0]
+
+
+class FastJSONResponse(Response):
+    """
+        Validates `content` (usually ORM objects) through a prebuilt TypeAdapter and renders it with
+        dump_json, so the body is written by pydantic-core in one pass. Endpoints keep their response_model
+        for the openapi schema; returning a Response makes fastapi skip its own validation + encoding
+    """
+    media_type = "application/json"
+
+    def __init__(
+        self,
+        content: Any,
+        adapter: TypeAdapter,
+        status_code: int = 200,
+        headers: Optional[Mapping[str, str]] = None,
+        background: Optional[BackgroundTask] = None,
+        exclude: Optional[dict] = None, #pydantic exclude spec, for sparse fieldsets
+    ):
+        self.adapter = adapter
+        self.exclude = exclude
+        super().__init__(content, status_code, headers, None, background)
+
+    def render(self, content: Any) -> bytes:
+        started = time.perf_counter()
+        with span("serialize json"):
+            body = self.adapter.dump_json(self.adapter.validate_python(content, from_attributes=True), exclude=self.exclude)
+        _add_ser_time(started)
+        return body
+
+
+class ColumnarResponse(Response):
+    """Plain dict/list payload encoded as compact json or msgpack, depending on the negotiated media type"""
+
+    def __init__(
+        self,
+        content: dict,
+        media_type: str,
+        status_code: int = 200,
+        headers: Optional[Mapping[str, str]] = None,
+        background: Optional[BackgroundTask] = None,
+    ):
+        if media_type not in (COLUMNAR_JSON, COLUMNAR_MSGPACK):
+            raise ValueError(f"unsupported columnar media type {media_type!r}")
+        self.media_type = media_type
+        super().__init__(content, status_code, headers, media_type, background)
+
+    def render(self, content: dict) -> bytes:
+        started = time.perf_counter()
+        with span("serialize columnar", media_type=self.media_type):
+            if self.media_type == COLUMNAR_MSGPACK:
+                body = msgpack.packb(content, use_bin_type=True)
+            else:
+                body = json.dumps(content, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        _add_ser_time(started)
+        return body
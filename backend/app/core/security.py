@@ -1,5 +1,7 @@
 # for later; jwt + pw hashing
-from fastapi import HTTPException, Depends, status
+import secrets
+
+from fastapi import HTTPException, Depends, Header, status
 from passlib.context import CryptContext
 from datetime import datetime, timezone, timedelta
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
@@ -10,6 +12,7 @@ from dataclasses import dataclass
 from app.core.config import settings
 from app.db.session import get_db
 from app.db.models import User, Group, GroupMembers
+from app.core.tracing import traced
 
 
 #inits
@@ -47,6 +50,7 @@ def decode_access_token(token: str):
 
 
 # dependency for jwt
+@traced
 def get_current_user(
         creds: HTTPAuthorizationCredentials = Depends(bearer_scheme),
         db: Session = Depends(get_db),
@@ -68,6 +72,7 @@ def get_current_user(
 
 
 # dependency using jwt and parameter group id
+@traced
 def get_current_group(
         group_id: int,
         db: Session = Depends(get_db),
@@ -95,3 +100,16 @@ def get_current_group(
         )
 
     return GroupContext(group=group, user=current_user)
+
+
+# dependency for operational endpoints (slow query log etc.); separate from user auth
+@traced
+def require_admin(x_admin_key: str | None = Header(default=None)) -> None:
+    """
+        Admin endpoints are off unless ADMIN_API_KEY is configured.
+        compare_digest avoids leaking the key through response timing; on bytes, as it raises on non-ascii str
+    """
+    if not settings.admin_api_key:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_admin_key or not secrets.compare_digest(x_admin_key.encode(), settings.admin_api_key.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin key")
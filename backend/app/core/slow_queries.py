@@ -0,0 +1,103 @@
+# opt-in slow query recorder; maps slow statements back to the service/endpoint that issued them
+import sys
+import time
+from collections import deque
+from dataclasses import dataclass, asdict, field
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.logger import get_module_logger
+
+
+logger = get_module_logger(__name__)
+
+# frames from these packages are the interesting call sites; core/db frames are just plumbing
+_CALL_SITE_PREFIXES = ("app.services.", "app.api.")
+_MAX_CALL_STACK = 5
+
+
+@dataclass
+class SlowQuery:
+    statement: str
+    duration_ms: float
+    rowcount: int
+    param_shape: object
+    call_site: Optional[str]
+    call_stack: list[str] = field(default_factory=list)
+    recorded_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+_buffer: deque[SlowQuery] = deque(maxlen=settings.slow_query_buffer_size)
+
+
+def recent_slow_queries() -> list[SlowQuery]:
+    # newest first; list() of a deque is atomic enough under the GIL for a read-only snapshot
+    return list(reversed(_buffer))
+
+
+def clear_slow_queries() -> None:
+    _buffer.clear()
+
+
+def _param_shape(parameters, executemany: bool):
+    """Types only, never values; bound params can hold emails, password hashes etc."""
+    if executemany:
+        rows = list(parameters)
+        return {"batch": len(rows), "row": _param_shape(rows[0], False) if rows else None}
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+def _call_stack() -> list[str]:
+    frames = []
+    frame = sys._getframe(2)
+    while frame is not None and len(frames) < _MAX_CALL_STACK:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith(_CALL_SITE_PREFIXES):
+            frames.append(f"{module}.{frame.f_code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return frames
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if settings.slow_query_log_enabled:
+        conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("slow_query_start")
+    if not starts: #disabled, or enabled mid-query
+        return
+
+    duration_ms = (time.perf_counter() - starts.pop()) * 1000
+    if duration_ms < settings.slow_query_threshold_ms:
+        return
+
+    stack = _call_stack()
+    slow_query = SlowQuery(
+        statement=statement,
+        duration_ms=round(duration_ms, 2),
+        rowcount=cursor.rowcount,
+        param_shape=_param_shape(parameters, executemany),
+        call_site=stack[0] if stack else None,
+        call_stack=stack,
+    )
+    _buffer.append(slow_query)
+    logger.warning("slow query", extra=asdict(slow_query))
+
+
+@event.listens_for(Engine, "handle_error")
+def _on_error(exception_context):
+    # after_cursor_execute never fires for a failed statement; drop its start time so the stack stays aligned
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("slow_query_start"):
+        conn.info["slow_query_start"].pop()
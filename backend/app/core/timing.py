@@ -0,0 +1,202 @@
+# per-request performance counters; sql time, orm hydration and serialization, emitted as Server-Timing headers
+import random
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import wraps
+from inspect import iscoroutinefunction
+from typing import Optional
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+
+from app.core.config import settings
+from app.core.logger import get_module_logger
+from app.core.tracing import current_trace, record_span, span
+from app.db.base import Base
+
+
+logger = get_module_logger(__name__)
+
+
+@dataclass
+class RequestTimings:
+    started: float
+    queries: int = 0
+    db_ms: float = 0.0
+    rows: int = 0 #rows reported by the driver (postgres reports SELECT row counts, sqlite only DML)
+    orm_loads: int = 0 #ORM instances hydrated into the identity map
+    endpoint_done: Optional[float] = None
+    ser_ms: float = 0.0
+
+    @property
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self) -> str:
+        return ", ".join([
+            f'db;dur={self.db_ms:.2f};desc="{self.queries} queries, {self.rows} rows"',
+            f'orm;desc="{self.orm_loads} objects"',
+            f"ser;dur={self.ser_ms:.2f}",
+            f"total;dur={self.total_ms:.2f}",
+        ])
+
+    def log_fields(self) -> dict:
+        return {
+            "queries": self.queries,
+            "db_ms": round(self.db_ms, 2),
+            "rows": self.rows,
+            "orm_loads": self.orm_loads,
+            "ser_ms": round(self.ser_ms, 2),
+            "total_ms": round(self.total_ms, 2),
+        }
+
+
+# only set for sampled requests, so every hook below is a single contextvar lookup otherwise
+_current_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current_timings.get()
+
+
+# ******************************************************************************************************************************************************************************************
+# SQLALCHEMY HOOKS (registered on the Engine class so the test engine is covered too)
+# ******************************************************************************************************************************************************************************************
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_timings.get() is not None:
+        conn.info.setdefault("timing_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = _current_timings.get()
+    if timings is None:
+        return
+    starts = conn.info.get("timing_query_start")
+    if not starts: #sampling started mid-query
+        return
+
+    timings.queries += 1
+    timings.db_ms += (time.perf_counter() - starts.pop()) * 1000
+    if cursor.rowcount and cursor.rowcount > 0:
+        timings.rows += cursor.rowcount
+
+
+@event.listens_for(Engine, "handle_error")
+def _on_error(exception_context):
+    # after_cursor_execute never fires for a failed statement; drop its start time so the stack stays aligned
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("timing_query_start"):
+        conn.info["timing_query_start"].pop()
+
+
+@event.listens_for(Base, "load", propagate=True)
+def _on_orm_load(target, context):
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.orm_loads += 1
+
+
+# ******************************************************************************************************************************************************************************************
+# ROUTE + MIDDLEWARE
+# ******************************************************************************************************************************************************************************************
+def _endpoint_done() -> None:
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.endpoint_done = time.perf_counter()
+    trace = current_trace()
+    if trace is not None:
+        trace.endpoint_done_ns = time.time_ns()
+
+
+def _mark_endpoint_done(endpoint):
+    """
+        Wraps an endpoint so the moment it returns is recorded; everything after that is response serialization.
+        Sampled traces also get an endpoint span
+    """
+    if getattr(endpoint, "_marks_endpoint_done", False): #include_router rebuilds routes from the already wrapped endpoint
+        return endpoint
+    span_name = f"endpoint {endpoint.__qualname__}"
+
+    if iscoroutinefunction(endpoint):
+        @wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            try:
+                with span(span_name):
+                    return await endpoint(*args, **kwargs)
+            finally:
+                _endpoint_done()
+        async_wrapper._marks_endpoint_done = True
+        return async_wrapper
+
+    @wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        try:
+            with span(span_name):
+                return endpoint(*args, **kwargs)
+        finally:
+            _endpoint_done()
+    wrapper._marks_endpoint_done = True
+    return wrapper
+
+
+class TimedRoute(APIRoute):
+    """APIRoute that measures response_model validation + encoding after the endpoint returns"""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _mark_endpoint_done(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            response = await handler(request)
+            timings = _current_timings.get()
+            if timings is not None and timings.endpoint_done is not None:
+                timings.ser_ms += (time.perf_counter() - timings.endpoint_done) * 1000
+            trace = current_trace()
+            if trace is not None and trace.endpoint_done_ns is not None:
+                record_span("serialize response_model", trace.endpoint_done_ns, time.time_ns())
+            return response
+
+        return timed_handler
+
+
+class ServerTimingMiddleware:
+    """
+        Pure ASGI middleware; samples settings.perf_sample_rate of requests, collects their counters
+        and adds them as a Server-Timing header + a structured log line
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or random.random() >= settings.perf_sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings(started=time.perf_counter())
+        token = _current_timings.set(timings)
+        status_code = None
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", timings.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_timings.reset(token)
+            logger.info(
+                "request timing",
+                extra={"method": scope["method"], "path": scope["path"], "status_code": status_code, **timings.log_fields()},
+            )
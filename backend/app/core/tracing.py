@@ -0,0 +1,311 @@
+# minimal request tracing; a span tree per sampled request covering dependencies, endpoint, services, each sql statement and serialization
+# ids follow w3c trace context (32/16 hex), so an incoming traceparent is continued and the exported spans map 1:1 onto OTLP spans
+import atexit
+import json
+import queue
+import random
+import re
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, asdict
+from functools import wraps
+from inspect import iscoroutinefunction
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import Headers
+
+from app.core.config import settings
+from app.core.logger import get_module_logger, current_request_id
+
+
+logger = get_module_logger(__name__)
+
+_MAX_STATEMENT_LENGTH = 500
+_traceparent = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+@dataclass(slots=True)
+class Span:
+    name: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int #unix epoch, ns
+    end_ns: Optional[int] = None
+    status: str = "ok"
+    attributes: dict = field(default_factory=dict)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+
+@dataclass(slots=True)
+class Trace:
+    trace_id: str
+    spans: list[Span] = field(default_factory=list) #in start order; appended from the event loop and threadpool alike, list.append is atomic
+    endpoint_done_ns: Optional[int] = None #set by TimedRoute, what follows is response_model serialization
+
+
+# only set for sampled requests, so every hook below is a single contextvar lookup otherwise
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("span", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def _start_span(trace: Trace, name: str, parent: Optional[Span], attributes: dict) -> Span:
+    new_span = Span(
+        name=name,
+        span_id=secrets.token_hex(8),
+        parent_id=parent.span_id if parent is not None else None,
+        start_ns=time.time_ns(),
+        attributes=attributes,
+    )
+    trace.spans.append(new_span)
+    return new_span
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Child of the current span; yields None (and records nothing) outside a sampled request"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    current = _start_span(trace, name, _current_span.get(), attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as exc:
+        current.status = "error"
+        current.attributes["exception"] = type(exc).__name__
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current_span.reset(token)
+
+
+def record_span(name: str, start_ns: int, end_ns: int, **attributes) -> None:
+    """For work that's only measurable after the fact (eg. fastapi's response_model encoding)"""
+    trace = _current_trace.get()
+    if trace is not None:
+        recorded = _start_span(trace, name, _current_span.get(), attributes)
+        recorded.start_ns, recorded.end_ns = start_ns, end_ns
+
+
+def traced(fn=None, *, name: Optional[str] = None):
+    """
+        Decorator; runs the function inside a span named module.qualname. Keeps the signature intact
+        (functools.wraps), so it's safe on fastapi dependencies
+    """
+    def decorate(fn):
+        span_name = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        if iscoroutinefunction(fn):
+            @wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if _current_trace.get() is None:
+                    return await fn(*args, **kwargs)
+                with span(span_name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current_trace.get() is None:
+                return fn(*args, **kwargs)
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorate(fn) if fn is not None else decorate
+
+
+# ******************************************************************************************************************************************************************************************
+# COLLECTOR / EXPORT
+# ******************************************************************************************************************************************************************************************
+_buffer: deque[Trace] = deque(maxlen=settings.trace_buffer_size)
+# file export runs on its own thread, like the log listener: the event loop only enqueues, and drops when it's full
+_file_queue: queue.Queue = queue.Queue(maxsize=settings.trace_buffer_size)
+_writer: Optional[threading.Thread] = None
+_writer_lock = threading.Lock()
+_dropped = 0
+
+
+def recent_traces() -> list[Trace]:
+    # newest first, same as the slow query log
+    return list(reversed(_buffer))
+
+
+def clear_traces() -> None:
+    _buffer.clear()
+
+
+def trace_to_dict(trace: Trace) -> dict:
+    return {
+        "trace_id": trace.trace_id,
+        "spans": [{**asdict(recorded), "duration_ms": round(recorded.duration_ms, 3)} for recorded in trace.spans],
+    }
+
+
+def dropped_traces() -> int:
+    """Finished traces that didn't make it to trace_file because the writer fell behind"""
+    return _dropped
+
+
+def _write_traces() -> None:
+    while True:
+        item = _file_queue.get()
+        try:
+            if item is None:
+                return
+            path, trace = item
+            line = json.dumps(trace_to_dict(trace), default=str) #serialized here too, off the request path
+            with open(path, "a", encoding="utf-8") as trace_file:
+                trace_file.write(line + "\n")
+        except OSError as e:
+            logger.warning("Could not write trace to %s: %s", path, e)
+        finally:
+            _file_queue.task_done()
+
+
+def _stop_writer() -> None:
+    if _writer is not None:
+        _file_queue.put(None) #after whatever is queued, so it's drained before exit
+        _writer.join()
+
+
+def _start_writer() -> None:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_write_traces, name="trace-writer", daemon=True)
+            _writer.start()
+            atexit.register(_stop_writer)
+
+
+def flush_trace_file() -> None:
+    """Blocks until every queued trace is written; for tests and shutdown hooks"""
+    _file_queue.join()
+
+
+def _export(trace: Trace) -> None:
+    global _dropped
+    _buffer.append(trace)
+    if not settings.trace_file:
+        return
+    if _writer is None:
+        _start_writer()
+    try:
+        _file_queue.put_nowait((settings.trace_file, trace))
+    except queue.Full:
+        _dropped += 1
+
+
+# ******************************************************************************************************************************************************************************************
+# SQLALCHEMY HOOKS
+# ******************************************************************************************************************************************************************************************
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    attributes = {"db.statement": statement[:_MAX_STATEMENT_LENGTH]}
+    if executemany:
+        attributes["db.executemany"] = True
+    conn.info.setdefault("trace_sql_spans", []).append(_start_span(trace, "sql", _current_span.get(), attributes))
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    spans = conn.info.get("trace_sql_spans")
+    if not spans: #not sampled, or sampling started mid-query
+        return
+    sql_span = spans.pop()
+    sql_span.end_ns = time.time_ns()
+    if cursor.rowcount is not None and cursor.rowcount >= 0:
+        sql_span.attributes["db.rowcount"] = cursor.rowcount
+
+
+@event.listens_for(Engine, "handle_error")
+def _on_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("trace_sql_spans"):
+        sql_span = conn.info["trace_sql_spans"].pop()
+        sql_span.end_ns = time.time_ns()
+        sql_span.status = "error"
+        sql_span.attributes["exception"] = type(exception_context.original_exception).__name__
+
+
+# ******************************************************************************************************************************************************************************************
+# MIDDLEWARE
+# ******************************************************************************************************************************************************************************************
+def _head_sample(headers: Headers) -> tuple[bool, str, Optional[str]]:
+    """
+        Decided once, when the request arrives, from settings.trace_sample_rate. An incoming traceparent is
+        continued (same trace id, its span as parent); its sampled flag only decides with trace_trust_upstream,
+        so a trace is never half recorded across services but a client can't force tracing on every request
+    """
+    match = _traceparent.match(headers.get("traceparent", ""))
+    if match:
+        trace_id, parent_id, flags = match.groups()
+        if settings.trace_trust_upstream:
+            return bool(int(flags, 16) & 0x01), trace_id, parent_id
+        return random.random() < settings.trace_sample_rate, trace_id, parent_id
+    return random.random() < settings.trace_sample_rate, secrets.token_hex(16), None
+
+
+class TracingMiddleware:
+    """Pure ASGI middleware; opens the root span of sampled requests and exports the finished trace"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        sampled, trace_id, parent_id = _head_sample(Headers(scope=scope))
+        if not sampled:
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(trace_id=trace_id)
+        root = _start_span(trace, f"{scope['method']} {scope['path']}", None, {"http.method": scope["method"], "http.target": scope["path"]})
+        root.parent_id = parent_id
+        request_id = current_request_id()
+        if request_id:
+            root.attributes["request_id"] = request_id
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(root)
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                root.attributes["http.status_code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        except BaseException as exc:
+            root.status = "error"
+            root.attributes["exception"] = type(exc).__name__
+            raise
+        finally:
+            root.end_ns = time.time_ns()
+            route = scope.get("route")
+            if route is not None: #name by template so traces group per endpoint
+                root.name = f"{scope['method']} {route.path}"
+                root.attributes["http.route"] = route.path
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            _export(trace)
@@ -2,7 +2,7 @@
 import secrets
 
 from .base import Base
-from sqlalchemy import Column, Integer, Text, String, ForeignKey, Boolean, Float, DateTime, func
+from sqlalchemy import Column, Integer, BigInteger, Text, String, ForeignKey, Boolean, DateTime, Date, Index, LargeBinary, UniqueConstraint, JSON, func
 from sqlalchemy.orm import relationship
 
 
@@ -12,7 +12,7 @@ class User(Base):
     id = Column(Integer, autoincrement=True, primary_key=True)
     name = Column(String, nullable=False)
     pw = Column(String, nullable=False)
-    email = Column(String, nullable=False)
+    email = Column(String, nullable=False, index=True) #login lookup
 
     group_associations = relationship("GroupMembers", back_populates="user")
     groups = relationship("Group", secondary="group_members", viewonly=True)
@@ -25,11 +25,18 @@ class Group(Base):
     __tablename__ = "group"
 
     id = Column(Integer, autoincrement=True, primary_key=True)
-    name = Column(String, nullable=False)
+    name = Column(String, nullable=False, index=True) #join by name + pw
     pw = Column(String, nullable=False)
 
     emoji = Column(Text) #emoji code; the icon representing group
 
+    # denormalized for the groups dashboard (view-short); kept current by the member/expense write paths in the same
+    # transaction (see group_service.bump_group_counters), recomputed by group_service.recount_group
+    member_count = Column(Integer, nullable=False, default=0, server_default="0")
+    expense_count = Column(Integer, nullable=False, default=0, server_default="0")
+    total_spent = Column(BigInteger, nullable=False, default=0, server_default="0") #cents
+    last_activity_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now()) #last member join or expense change
+
     member_associations = relationship("GroupMembers", back_populates="group")
     members = relationship("User", secondary="group_members", viewonly=True)
     expenses = relationship("Expense", back_populates="group")
@@ -39,17 +46,27 @@ class GroupMembers(Base):
     __tablename__ = "group_members"
 
     user_id = Column(Integer, ForeignKey("user.id"), primary_key=True)
-    group_id = Column(Integer, ForeignKey("group.id"), primary_key=True)
+    group_id = Column(Integer, ForeignKey("group.id"), primary_key=True, index=True) #pk covers user_id lookups, this covers members of a group
 
     user = relationship("User", back_populates="group_associations")
     group = relationship("Group", back_populates="member_associations")
 
 class Expense(Base):
     __tablename__ = "expense"
+    __table_args__ = (
+        Index("ix_expense_group_id_paid_by_id", "group_id", "paid_by_id"), #group listing + paid totals grouped by payer
+        Index("ix_expense_group_id_occurred_at", "group_id", "occurred_at"), #newest first listings, latest N, since/until ranges
+    )
 
     id = Column(Integer, autoincrement=True, primary_key=True)
-    amount = Column(Float, nullable=False)
+    amount = Column(BigInteger, nullable=False) #minor units (cents); schemas.py converts at the api boundary
     description = Column(String)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # compact equal split: sorted participant ids, each owes an equal share (leftover cents to the lowest ids, see
+    # split_strategies.split_equal). When set the expense has no expense_split rows; NULL means the rows are the splits
+    equal_split_user_ids = Column(JSON(none_as_null=True))
+    occurred_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now()) #when it was spent; clients may backdate
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
 
     group_id = Column(Integer, ForeignKey("group.id"), nullable=False)
     paid_by_id = Column(Integer, ForeignKey("user.id"), nullable=False)
@@ -61,13 +78,17 @@ class Expense(Base):
 
     splits = relationship("ExpenseSplit", back_populates="expense", cascade="all, delete-orphan", single_parent=True)
 
+    # optimistic locking; every UPDATE/DELETE carries "WHERE version = <loaded version>" and raises StaleDataError when a
+    # concurrent writer got there first. Bumped by the service (not the mapper) so split-only edits count as changes too
+    __mapper_args__ = {"version_id_col": version, "version_id_generator": False}
+
 class ExpenseSplit(Base):
     __tablename__ = "expense_split"
     id = Column(Integer, autoincrement=True, primary_key=True)
-    expense_id = Column(Integer, ForeignKey("expense.id"), nullable=False)
-    user_id = Column(Integer, ForeignKey("user.id"), nullable=False)
+    expense_id = Column(Integer, ForeignKey("expense.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("user.id"), nullable=False, index=True)
 
-    amount = Column(Float, nullable=False)
+    amount = Column(BigInteger, nullable=False) #minor units (cents)
 
     expense = relationship("Expense", back_populates="splits")
     user = relationship("User")
@@ -85,4 +106,69 @@ class GroupInvite(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     group = relationship("Group", back_populates="invites")
-    created_by = relationship("User", back_populates="created_invites")
\ No newline at end of file
+    created_by = relationship("User", back_populates="created_invites")
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_key"
+    __table_args__ = (
+        UniqueConstraint("user_id", "key", name="uq_idempotency_key_user_id_key"), #lookup + makes concurrent retries wait on each other
+    )
+
+    id = Column(Integer, autoincrement=True, primary_key=True)
+    key = Column(String(255), nullable=False)
+    user_id = Column(Integer, ForeignKey("user.id"), nullable=False)
+    request_hash = Column(String(64), nullable=False) #sha256 of method + path + body; same key with another payload is rejected
+
+    # null until the response is stored
+    status_code = Column(Integer)
+    media_type = Column(String)
+    response_body = Column(LargeBinary)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True) #purge job range scan
+
+class MonthlyRollup(Base):
+    """Spending per group, member and month; kept current by the expense write paths, rebuilt by app.jobs.backfill_rollups"""
+    __tablename__ = "monthly_rollup"
+
+    # (group, month) leads so a group's analytics for a date range is one primary key range scan
+    group_id = Column(Integer, ForeignKey("group.id"), primary_key=True)
+    month = Column(Date, primary_key=True) #first day of the month the expense occurred in (utc)
+    user_id = Column(Integer, ForeignKey("user.id"), primary_key=True)
+
+    paid_total = Column(BigInteger, nullable=False, default=0) #cents
+    paid_count = Column(Integer, nullable=False, default=0) #expenses paid
+    owed_total = Column(BigInteger, nullable=False, default=0) #cents
+    owed_count = Column(Integer, nullable=False, default=0) #expenses with a share
+
+class ExpenseEvent(Base):
+    """
+        Append-only log of expense mutations, written by the expense write paths in the same transaction.
+        Never updated or deleted, and outlives the expense; balance_delta is what the mutation did to each member's balance
+    """
+    __tablename__ = "expense_event"
+    __table_args__ = (
+        Index("ix_expense_event_group_id_recorded_at", "group_id", "recorded_at"), #a group's events since a snapshot / up to a moment
+    )
+
+    id = Column(Integer, autoincrement=True, primary_key=True)
+    group_id = Column(Integer, ForeignKey("group.id"), nullable=False)
+    expense_id = Column(Integer, nullable=False, index=True) #no foreign key: deleted expenses keep their history
+    user_id = Column(Integer, ForeignKey("user.id")) #who made the change; null for backfilled events
+    kind = Column(String(16), nullable=False) #created / edited / deleted
+    recorded_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    data = Column(JSON, nullable=False) #the expense after the change (before it, for deletes): amount, description, paid_by_id, occurred_at, shares
+    balance_delta = Column(JSON, nullable=False) #{user_id: cents}; only members whose balance moved
+
+class BalanceSnapshot(Base):
+    """Every member's balance once a group's events recorded before as_of are applied; written by app.jobs.snapshot_balances"""
+    __tablename__ = "balance_snapshot"
+    __table_args__ = (
+        Index("ix_balance_snapshot_group_id_as_of", "group_id", "as_of"), #latest snapshot at or before a moment
+    )
+
+    group_id = Column(Integer, ForeignKey("group.id"), primary_key=True)
+    event_id = Column(Integer, primary_key=True) #highest expense_event id included
+    as_of = Column(DateTime(timezone=True), nullable=False) #covers every event recorded before this; later ones are replayed
+    balances = Column(JSON, nullable=False) #{user_id: cents}
@@ -1,6 +1,52 @@
 # pydantic models, validates request and response bodies
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, ConfigDict, TypeAdapter, BeforeValidator, AfterValidator, PlainSerializer, WithJsonSchema, Field, model_validator
+from typing import Optional, List, Any, Annotated, Literal, Union
+from datetime import date, datetime, timezone
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from fractions import Fraction
+
+
+# money is stored and summed as integer minor units (cents); clients keep sending and receiving decimal amounts (12.5 == 12.50)
+CENTS_PER_UNIT = 100
+
+_FAST_FLOAT_LIMIT = 1e9 #well inside the range where float noise on a whole number of cents stays far below half a cent
+
+def to_cents(value: Any) -> int:
+    """
+        Client amount -> cents, rounded half up; str() first so a js 0.1 + 0.2 is 30 cents, not float noise.
+        Whole units and floats already on a whole cent skip the Decimal round trip (most amounts are one or the other);
+        both give the same answer the Decimal path would
+    """
+    if type(value) is int: #not isinstance: bool is an int and isn't an amount
+        return value * CENTS_PER_UNIT
+    if type(value) is float and abs(value) < _FAST_FLOAT_LIMIT: #nan and inf fail the comparison and go the slow way
+        cents = value * CENTS_PER_UNIT
+        nearest = round(cents)
+        if abs(cents - nearest) < 1e-6:
+            return nearest
+    if isinstance(value, bool):
+        raise ValueError("amount must be a number")
+    try:
+        amount = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError("amount must be a number")
+    if not amount.is_finite():
+        raise ValueError("amount must be finite")
+    return int((amount * CENTS_PER_UNIT).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def from_cents(cents: int) -> float:
+    return cents / CENTS_PER_UNIT
+
+# request side: decimal amount in, cents on the model
+AmountIn = Annotated[int, BeforeValidator(to_cents), PlainSerializer(from_cents, return_type=float), WithJsonSchema({"type": "number"})]
+# response side: cents from the ORM / read model, decimal amount on the wire
+AmountOut = Annotated[int, PlainSerializer(from_cents, return_type=float), WithJsonSchema({"type": "number"})]
+
+# timestamps are stored and compared in utc; a client datetime without an offset is taken as utc
+def to_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+UtcDatetime = Annotated[datetime, AfterValidator(to_utc)]
 
 # new user signup; no reuse
 class UserCreate(BaseModel):
@@ -22,8 +68,7 @@ class UserOut(BaseModel):
     id: int
     name: str
     #limit this info as it gets re-used for public stuff
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class AuthOut(BaseModel):
     access_token: str
@@ -33,45 +78,99 @@ class AuthOut(BaseModel):
     
 class ExpenseSplitIn(BaseModel):
     user: UserIn
-    amount: float
+    amount: AmountIn
+
+# server-side split rules; the server turns them into per-user cents (see services/split_strategies.py)
+WEIGHT_PLACES = 4
+WEIGHT_MAX = 1_000_000
 
-# new expense
+def _bounded_weight(value: Decimal) -> Decimal:
+    """
+        At most WEIGHT_PLACES decimal places, counted on the digits themselves: pydantic's decimal_places looks at
+        the value rounded to 28 digits, so 100.000...1 gets through it. Unbounded exponents make the split math huge
+    """
+    _, digits, exponent = value.as_tuple()
+    trailing_zeros = len(digits) - len("".join(map(str, digits)).rstrip("0"))
+    if exponent + trailing_zeros < -WEIGHT_PLACES:
+        raise ValueError(f"weights can have at most {WEIGHT_PLACES} decimal places")
+    return value
+
+Weight = Annotated[Decimal, Field(gt=0, le=WEIGHT_MAX, allow_inf_nan=False), AfterValidator(_bounded_weight)]
+
+class EqualSplit(BaseModel):
+    kind: Literal["equal"]
+    user_ids: Optional[List[int]] = Field(default=None, min_length=1) #None = every group member
+
+class SharesSplit(BaseModel):
+    kind: Literal["shares"]
+    shares: dict[int, Weight] = Field(min_length=1) #user_id -> weight, e.g. {1: 2, 2: 1} is 2/3 and 1/3
+
+class PercentageSplit(BaseModel):
+    kind: Literal["percentage"]
+    percentages: dict[int, Weight] = Field(min_length=1)
+
+    @model_validator(mode="after")
+    def _adds_up(self):
+        if sum(map(Fraction, self.percentages.values())) != 100: #exact; Decimal addition rounds to 28 digits
+            raise ValueError("percentages must add up to 100")
+        return self
+
+class ExactSplit(BaseModel):
+    kind: Literal["exact"]
+    amounts: dict[int, AmountIn] = Field(min_length=1)
+
+SplitRule = Annotated[Union[EqualSplit, SharesSplit, PercentageSplit, ExactSplit], Field(discriminator="kind")]
+
+# new expense; either explicit splits or a split rule
 class ExpenseCreate(BaseModel):
     paid_by_id: int #can be any user id, so dont rely on jwt
-    amount: float
+    amount: AmountIn
     description: Optional[str]
-    splits: List[ExpenseSplitIn]
+    splits: Optional[List[ExpenseSplitIn]] = None
+    split: Optional[SplitRule] = None
+    occurred_at: Optional[UtcDatetime] = None #when the spending happened; defaults to now on create, unchanged on edit
+
+    @model_validator(mode="after")
+    def _one_split_source(self):
+        if (self.splits is None) == (self.split is None):
+            raise ValueError("send either splits or a split rule")
+        if isinstance(self.split, ExactSplit) and sum(self.split.amounts.values()) != self.amount:
+            raise ValueError("exact split amounts must add up to the expense amount")
+        return self
 
 class ExpenseUpdate(BaseModel):
     id: int
+    version: int #the version the client last read; a newer one on the server means someone else edited it -> 409
     expense: ExpenseCreate
 
 class ExpenseDelete(BaseModel):
     id: int
+    version: int
 
 # encapsulate splits in the expense_split table
 class ExpenseSplitOut(BaseModel):
     user: UserOut
-    amount: float
+    amount: AmountOut
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # list all splits for one expense
 class ExpenseOut(BaseModel):
     id: int
-    amount: float
+    version: int
+    amount: AmountOut
     description: Optional[str]
+    occurred_at: datetime
+    created_at: datetime
 
     paid_by: UserOut
     splits: List[ExpenseSplitOut]
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class ExpenseIn(BaseModel):
     id: int
-    amount: Optional[float] = None
+    amount: Optional[AmountIn] = None
     description: Optional[str] = None
     paid_by_id: Optional[int] = None
     splits: Optional[List[ExpenseSplitIn]] = None
@@ -96,7 +195,9 @@ class GroupJoinIn(BaseModel):
 class UserBalanceOut(BaseModel):
     id: int
     name: str
-    balance: float
+    balance: AmountOut
+
+    model_config = ConfigDict(from_attributes=True)
 
 #info received when you click on an actual group
 class GroupOut(BaseModel):
@@ -106,13 +207,83 @@ class GroupOut(BaseModel):
     members: List[UserBalanceOut]
     expenses: List[ExpenseOut]
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class GroupShortOut(BaseModel):
     id: int
     name: str
     emoji: Optional[str]
+    member_count: int
+    expense_count: int
+    total_spent: AmountOut
+    last_activity_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
 
 class GroupInviteOut(BaseModel):
-    token: str
\ No newline at end of file
+    token: str
+
+#one member's spending in one month, from the monthly_rollup table
+class MonthlyRollupOut(BaseModel):
+    month: date #first day of the month (utc)
+    user_id: int
+    paid: AmountOut = Field(validation_alias="paid_total")
+    paid_count: int
+    owed: AmountOut = Field(validation_alias="owed_total")
+    owed_count: int
+
+    model_config = ConfigDict(from_attributes=True)
+
+#a member's balance at some past point in time, replayed from the expense event log
+class MemberBalanceOut(BaseModel):
+    user_id: int
+    balance: AmountOut
+
+#one point of a member's balance chart
+class BalancePointOut(BaseModel):
+    at: datetime
+    balance: AmountOut
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+# admin / operational
+class SlowQueryOut(BaseModel):
+    statement: str
+    duration_ms: float
+    rowcount: int
+    param_shape: Any
+    call_site: Optional[str]
+    call_stack: List[str]
+    recorded_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+class SpanOut(BaseModel):
+    name: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: Optional[int]
+    duration_ms: float
+    status: str
+    attributes: dict[str, Any]
+
+    model_config = ConfigDict(from_attributes=True)
+
+class TraceOut(BaseModel):
+    trace_id: str
+    spans: List[SpanOut]
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+# prebuilt serializers for FastJSONResponse; building a TypeAdapter compiles the schema, so do it once at import
+GroupOutAdapter = TypeAdapter(GroupOut)
+GroupShortListAdapter = TypeAdapter(List[GroupShortOut])
+ExpenseOutAdapter = TypeAdapter(ExpenseOut)
+MonthlyRollupListAdapter = TypeAdapter(List[MonthlyRollupOut])
+BalancePointListAdapter = TypeAdapter(List[BalancePointOut])
+MemberBalanceListAdapter = TypeAdapter(List[MemberBalanceOut])
+SlowQueryListAdapter = TypeAdapter(List[SlowQueryOut])
+TraceListAdapter = TypeAdapter(List[TraceOut])
@@ -0,0 +1,28 @@
+# rebuilds the monthly_rollup rows from the expenses; run after a bulk import or if the rollups ever drift
+# usage (from backend/): python -m app.jobs.backfill_rollups [group_id ...]   (no ids: every group)
+import sys
+
+from sqlalchemy import select
+
+from app.db.models import Group
+from app.services.rollup_service import rebuild_group_rollups
+from app.core.logger import get_module_logger, setup_logging
+from app.db.session import SessionLocal
+
+
+logger = get_module_logger(__name__)
+
+
+def main(argv: list[str]):
+    setup_logging()
+    with SessionLocal() as db:
+        group_ids = [int(arg) for arg in argv] or list(db.scalars(select(Group.id).order_by(Group.id)))
+        rows = 0
+        for group_id in group_ids:
+            rows += rebuild_group_rollups(group_id, db)
+            db.commit() #one transaction per group keeps locks short on big installs
+    logger.info("rebuilt monthly rollups", extra={"groups": len(group_ids), "rows": rows})
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
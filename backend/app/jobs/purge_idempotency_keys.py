@@ -0,0 +1,20 @@
+# deletes expired Idempotency-Key rows; run periodically (cron / k8s CronJob)
+# usage (from backend/): python -m app.jobs.purge_idempotency_keys
+from app.core.idempotency import purge_expired_idempotency_keys
+from app.core.logger import get_module_logger, setup_logging
+from app.db.session import SessionLocal
+
+
+logger = get_module_logger(__name__)
+
+
+def main():
+    setup_logging()
+    with SessionLocal() as db:
+        purged = purge_expired_idempotency_keys(db)
+        db.commit()
+    logger.info("purged expired idempotency keys", extra={"purged": purged})
+
+
+if __name__ == "__main__":
+    main()
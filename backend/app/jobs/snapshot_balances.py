@@ -0,0 +1,34 @@
+# rolls every group's balance snapshot forward over its new expense events; run periodically (cron / k8s CronJob)
+# point-in-time balance queries replay at most the events recorded since the last run, plus the settle lag (balance_snapshot_lag_seconds)
+# usage (from backend/): python -m app.jobs.snapshot_balances [--min-events N]
+import argparse
+
+from sqlalchemy import select
+
+from app.db.models import ExpenseEvent
+from app.services.event_log import take_balance_snapshot
+from app.core.logger import get_module_logger, setup_logging
+from app.db.session import SessionLocal
+
+
+logger = get_module_logger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot group balances from the expense event log")
+    parser.add_argument("--min-events", type=int, default=100, help="skip groups with fewer new events than this")
+    args = parser.parse_args()
+
+    setup_logging()
+    with SessionLocal() as db:
+        group_ids = list(db.scalars(select(ExpenseEvent.group_id).distinct().order_by(ExpenseEvent.group_id)))
+        taken = 0
+        for group_id in group_ids:
+            if take_balance_snapshot(group_id, db, min_events=args.min_events) is not None:
+                taken += 1
+            db.commit() #one transaction per group
+    logger.info("took balance snapshots", extra={"groups": len(group_ids), "snapshots": taken})
+
+
+if __name__ == "__main__":
+    main()
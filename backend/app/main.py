@@ -1,11 +1,17 @@
 from fastapi import FastAPI, Request
 
 from fastapi.responses import JSONResponse
+from fastapi.exception_handlers import http_exception_handler
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.exc import IntegrityError
+from starlette.exceptions import HTTPException as StarletteHTTPException
 
-from app.core.logger import setup_logging
-from app.api import groups, expenses, auth
+from app.core.logger import setup_logging, RequestIdMiddleware
+from app.core.timing import ServerTimingMiddleware
+from app.core.tracing import TracingMiddleware
+from app.core.compression import CompressionMiddleware
+from app.core.metrics import MetricsMiddleware, metrics_endpoint, record_exception
+from app.api import groups, expenses, auth, admin
 
 
 app_logger = setup_logging()
@@ -25,17 +31,34 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Request-ID", "Idempotent-Replayed"],
 )
+# each add_middleware wraps the ones added before it, so this list runs inside out
+app.add_middleware(CompressionMiddleware) #inside the timing middleware so compression cpu shows up in Server-Timing total
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(ServerTimingMiddleware) #wraps everything but the request id, so its total includes metrics, tracing, compression and CORS
+app.add_middleware(RequestIdMiddleware) #outermost, so every log line of the request carries the id (the timing line too)
 
 app.include_router(groups.router, prefix="/groups", tags=["groups"])
 app.include_router(expenses.router, prefix="/expenses", tags=["expenses"])
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
+app.include_router(admin.router, prefix="/admin", tags=["admin"])
+app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
 
 
 # global exception handler; any IntegrityError (data/database) will only raise this response
 @app.exception_handler(IntegrityError)
 def integrity_error_handler(request: Request, exc: IntegrityError):
+    record_exception(exc)
     return JSONResponse(
         status_code=400,
         content={"detail": "Database integrity error"}
-    )
\ No newline at end of file
+    )
+
+
+# counts every HTTPException by the service exception that caused it, then defers to fastapi's default handler
+@app.exception_handler(StarletteHTTPException)
+async def counted_http_exception_handler(request: Request, exc: StarletteHTTPException):
+    record_exception(exc)
+    return await http_exception_handler(request, exc)
\ No newline at end of file
@@ -0,0 +1,126 @@
+# a member's balance over time in one group, downsampled for charts
+# the opening balance comes from the monthly rollups (a checkpoint per month), so only the requested window's expenses are read
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session
+
+from app.db.models import Expense, ExpenseSplit, MonthlyRollup
+from app.core.exceptions import GroupBalanceHistoryError
+from app.core.logger import get_module_logger
+from app.core.tracing import traced
+from app.services.group_read_model import occurred_between
+from app.services.rollup_service import month_of
+from app.services.split_strategies import split_equal
+
+
+logger = get_module_logger(__name__)
+
+
+class BalancePoint(NamedTuple):
+    at: datetime
+    balance: int #cents, after everything up to and including `at`
+
+
+def _utc(moment: datetime) -> datetime:
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment.astimezone(timezone.utc)
+
+
+def lttb(points: list[BalancePoint], threshold: int) -> list[BalancePoint]:
+    """
+        Largest-Triangle-Three-Buckets: keeps the first and last point and, from each of threshold - 2 equal buckets in
+        between, the point spanning the largest triangle with the previously kept point and the next bucket's average.
+        Peaks and troughs survive, which plain every-nth sampling drops. O(n); threshold must be at least 3
+    """
+    if threshold >= len(points):
+        return points
+
+    xs = [point.at.timestamp() for point in points]
+    ys = [point.balance for point in points]
+    kept = [points[0]]
+    bucket_size = (len(points) - 2) / (threshold - 2)
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = int(bucket * bucket_size) + 1, int((bucket + 1) * bucket_size) + 1
+        next_start, next_end = end, min(int((bucket + 2) * bucket_size) + 1, len(points))
+        average_x = sum(xs[next_start:next_end]) / (next_end - next_start)
+        average_y = sum(ys[next_start:next_end]) / (next_end - next_start)
+
+        best, best_area = start, -1.0
+        for i in range(start, end):
+            area = abs((xs[previous] - average_x) * (ys[i] - ys[previous]) - (xs[previous] - xs[i]) * (average_y - ys[previous]))
+            if area > best_area:
+                best, best_area = i, area
+        kept.append(points[best])
+        previous = best
+    kept.append(points[-1])
+    return kept
+
+
+def _opening_balance(group_id: int, user_id: int, before_month, db: Session) -> int:
+    """Balance from every whole month before `before_month`, summed from the rollups instead of the ledger"""
+    return db.scalar(
+        select(func.coalesce(func.sum(MonthlyRollup.paid_total - MonthlyRollup.owed_total), 0))
+        .where(MonthlyRollup.group_id == group_id, MonthlyRollup.month < before_month, MonthlyRollup.user_id == user_id)
+    )
+
+
+@traced
+def get_balance_history(
+    group_id: int,
+    user_id: int,
+    db: Session,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    points: int = 300,
+) -> list[BalancePoint]:
+    """
+        The member's running balance after each expense that changed it, in [since, until), downsampled to at most
+        `points` with lttb. With a since, the series opens with the balance at that moment: whole months before it
+        come from the rollups, the rest of since's month is read with the window, so the ledger before it isn't.
+        Two queries (opening balance, the window's expenses with this member's split row), one range read each
+    """
+    try:
+        balance, series = 0, []
+        start = None
+        if since is not None:
+            since = _utc(since)
+            month = month_of(since)
+            balance = opening = _opening_balance(group_id, user_id, month, db)
+            start = datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+
+        own_split = and_(ExpenseSplit.expense_id == Expense.id, ExpenseSplit.user_id == user_id)
+        rows = db.execute(
+            select(Expense.occurred_at, Expense.amount, Expense.paid_by_id, Expense.equal_split_user_ids, ExpenseSplit.amount)
+            .outerjoin(ExpenseSplit, own_split)
+            .where(
+                Expense.group_id == group_id,
+                *occurred_between(start, until),
+                or_(Expense.paid_by_id == user_id, ExpenseSplit.id.is_not(None), Expense.equal_split_user_ids.is_not(None)),
+            )
+            .order_by(Expense.occurred_at, Expense.id) #walks ix_expense_group_id_occurred_at forwards
+        )
+        for occurred_at, amount, paid_by_id, equal_user_ids, own_share in rows:
+            delta = amount if paid_by_id == user_id else 0
+            if equal_user_ids is not None:
+                if user_id in equal_user_ids:
+                    delta -= split_equal(amount, equal_user_ids)[user_id]
+            else:
+                delta -= own_share or 0
+            if not delta:
+                continue
+            balance += delta
+            occurred_at = _utc(occurred_at)
+            if since is not None and occurred_at < since:
+                opening = balance #rest of since's month, folded into the opening balance
+                continue
+            series.append(BalancePoint(occurred_at, balance))
+
+        if since is not None:
+            series.insert(0, BalancePoint(since, opening))
+        return lttb(series, points)
+
+    except Exception as e:
+        logger.error("Error loading balance history: %s", e)
+        raise GroupBalanceHistoryError from e
@@ -0,0 +1,127 @@
+# append-only expense history: one expense_event per create/edit/delete, plus per group balance snapshots
+# point-in-time balances start from the nearest snapshot and replay only the events recorded after it
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.db.models import Expense, ExpenseEvent, BalanceSnapshot
+from app.db.schemas import to_utc
+from app.core.config import settings
+from app.core.exceptions import GroupBalanceAtError
+from app.core.logger import get_module_logger
+from app.core.tracing import traced
+from app.services.rollup_service import Contribution
+
+
+logger = get_module_logger(__name__)
+
+
+def balance_delta(before: Contribution, after: Contribution) -> dict[int, int]:
+    """Per member balance change (paid - owed, cents) between two contributions; members left unchanged are dropped"""
+    delta: dict[int, int] = defaultdict(int)
+    for sign, contribution in ((-1, before), (1, after)):
+        for (user_id, _), (paid_total, _, owed_total, _) in contribution.items():
+            delta[user_id] += sign * (paid_total - owed_total)
+    return {user_id: cents for user_id, cents in delta.items() if cents}
+
+
+def record_expense_event(
+    kind: str,
+    expense: Expense,
+    shares: dict[int, int],
+    before: Contribution,
+    after: Contribution,
+    user_id: Optional[int],
+    db: Session,
+) -> ExpenseEvent:
+    """
+        Writes the event in the caller's transaction. `shares` is the expense's split (user_id -> cents) as of the
+        event: after a create/edit, before a delete. Deletes must be recorded before the expense is deleted
+    """
+    event = ExpenseEvent(
+        group_id=expense.group_id,
+        expense_id=expense.id,
+        user_id=user_id,
+        kind=kind,
+        data={
+            "amount": expense.amount,
+            "description": expense.description,
+            "paid_by_id": expense.paid_by_id,
+            "occurred_at": to_utc(expense.occurred_at).isoformat(),
+            "shares": {str(member_id): cents for member_id, cents in shares.items()}, #json keys are strings
+        },
+        balance_delta={str(member_id): cents for member_id, cents in balance_delta(before, after).items()},
+    )
+    db.add(event)
+    db.flush() #INSERT now, like the rest of the write path, so nothing is left pending for the caller's next query
+    return event
+
+
+def _apply(balances: dict[int, int], delta: dict[str, int]) -> None:
+    for member_id, cents in delta.items():
+        balances[int(member_id)] = balances.get(int(member_id), 0) + cents
+
+
+def _latest_snapshot(group_id: int, db: Session, at: Optional[datetime] = None) -> Optional[BalanceSnapshot]:
+    statement = select(BalanceSnapshot).where(BalanceSnapshot.group_id == group_id)
+    if at is not None:
+        statement = statement.where(BalanceSnapshot.as_of <= at)
+    return db.scalars(statement.order_by(BalanceSnapshot.as_of.desc()).limit(1)).first()
+
+
+@traced
+def take_balance_snapshot(group_id: int, db: Session, min_events: int = 1, until: Optional[datetime] = None) -> Optional[BalanceSnapshot]:
+    """
+        Rolls the group's latest snapshot forward over the events recorded since it, up to `until` (default: now minus
+        balance_snapshot_lag_seconds), if there are at least `min_events` of them. The cursor is recorded_at, not id:
+        ids are handed out before commit, so a lower id can become visible after a higher one, and recorded_at is the
+        transaction's start. Events older than the lag are settled (their transactions are over), so a snapshot never
+        freezes over one that hasn't committed yet. Reads only those events; the caller commits. None when not due
+    """
+    if until is None:
+        until = datetime.now(timezone.utc) - timedelta(seconds=settings.balance_snapshot_lag_seconds)
+    latest = _latest_snapshot(group_id, db)
+    if latest is not None and to_utc(latest.as_of) >= until:
+        return None
+    balances = {int(member_id): cents for member_id, cents in latest.balances.items()} if latest else {}
+    statement = select(ExpenseEvent.id, ExpenseEvent.balance_delta).where(ExpenseEvent.group_id == group_id, ExpenseEvent.recorded_at < until)
+    if latest is not None:
+        statement = statement.where(ExpenseEvent.recorded_at >= latest.as_of)
+    events = db.execute(statement).all()
+    if not events or len(events) < min_events:
+        return None
+
+    for _, delta in events:
+        _apply(balances, delta)
+    snapshot = BalanceSnapshot(
+        group_id=group_id,
+        event_id=max(event_id for event_id, _ in events),
+        as_of=until,
+        balances={str(member_id): cents for member_id, cents in balances.items() if cents},
+    )
+    db.add(snapshot)
+    return snapshot
+
+
+@traced
+def get_balances_at(group_id: int, at: datetime, db: Session) -> dict[int, int]:
+    """
+        Every member's balance (cents) as the ledger stood at `at`, edits and deletes since then undone.
+        Two queries: the latest snapshot taken at or before `at`, then the events recorded between it and `at`
+    """
+    try:
+        snapshot = _latest_snapshot(group_id, db, at)
+        balances = {int(member_id): cents for member_id, cents in snapshot.balances.items()} if snapshot else {}
+        statement = select(ExpenseEvent.balance_delta).where(ExpenseEvent.group_id == group_id, ExpenseEvent.recorded_at <= at)
+        if snapshot is not None:
+            statement = statement.where(ExpenseEvent.recorded_at >= snapshot.as_of) #everything before as_of is in the snapshot
+        for delta in db.scalars(statement): #sums, so the order doesn't matter
+            _apply(balances, delta)
+        return balances
+
+    except Exception as e:
+        logger.error("Error loading balances at a point in time: %s", e)
+        raise GroupBalanceAtError from e
@@ -1,16 +1,27 @@
+from typing import Optional
+
+from sqlalchemy import inspect
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 from fastapi import Depends
 
 from app.db.models import Group, Expense, ExpenseSplit, User
-from app.db.schemas import ExpenseCreate, ExpenseOut, ExpenseIn, ExpenseUpdate
-from app.core.exceptions import ExpenseCreationError, ExpenseEditError, ExpenseNotFoundError
+from app.db.schemas import ExpenseCreate, ExpenseOut, ExpenseIn, ExpenseUpdate, ExpenseDelete
+from app.core.exceptions import ExpenseCreationError, ExpenseEditError, ExpenseNotFoundError, ExpenseVersionConflictError, ExpenseSplitMemberError
 from app.db.session import get_db
 from app.core.logger import get_module_logger
+from app.core.tracing import traced
+from app.services.split_strategies import resolve_splits, equal_split_members, split_equal
+from app.services.rollup_service import apply_rollup_delta, expense_contribution, shares_of
+from app.services.event_log import record_expense_event
+from app.services.group_service import bump_group_counters
+from app.services.group_read_model import load_expense_view, ExpenseRecord
 
 
 logger = get_module_logger(__name__)
 
 
+@traced
 def create_expense_service(
         new_expense: ExpenseCreate, 
         user_id: int, 
@@ -29,21 +40,35 @@ def create_expense_service(
             paid_by_id=new_expense.paid_by_id,
             group_id=group_id, #already checked and found in security.py
             created_by_id=user_id,
+            occurred_at=new_expense.occurred_at, #None -> server default (now)
         )
 
-        # iterate over splits
-        for split in new_expense.splits:
-            expense.splits.append(
-                ExpenseSplit(user_id=split.user.id, amount=split.amount)
-            )
+        # equal splits are stored as the participant ids; explicit splits and the other rules become rows
+        equal_user_ids = equal_split_members(new_expense, group_id, db)
+        if equal_user_ids is not None:
+            expense.equal_split_user_ids = equal_user_ids
+            shares = split_equal(expense.amount, equal_user_ids)
+        else:
+            shares = resolve_splits(new_expense, group_id, db) or {}
+            for split_user_id, amount in shares.items():
+                expense.splits.append(
+                    ExpenseSplit(user_id=split_user_id, amount=amount)
+                )
 
         db.add(expense)
         db.flush()
         db.refresh(expense)
+        after = expense_contribution(expense.amount, expense.paid_by_id, expense.occurred_at, shares)
+        apply_rollup_delta(group_id, {}, after, db)
+        record_expense_event("created", expense, shares, {}, after, user_id, db)
+        bump_group_counters(group_id, db, expenses=1, spent=expense.amount)
         logger.info("expense object created")
 
         return expense
-    
+
+    except ExpenseSplitMemberError:
+        logger.info("expense split names non-members", extra={"group_id": group_id})
+        raise
     except Exception as e:
         logger.error(
             "expense object creation failed",
@@ -51,6 +76,46 @@ def create_expense_service(
         )
         raise ExpenseCreationError from e
 
+def _reconcile_splits(expense: Expense, wanted: dict[int, int]) -> bool:
+    """
+        Diffs the requested splits (user_id -> cents) against the stored ones by user_id: changed amounts are
+        updated in place, new users inserted, missing users deleted (delete-orphan).
+        Returns whether anything changed
+    """
+    changed = False
+    wanted = dict(wanted)
+    expense.equal_split_user_ids = None #switching from the compact form; it had no rows, so the loop below is a no-op
+
+    for split in list(expense.splits):
+        amount = wanted.pop(split.user_id, None)
+        if amount is None:
+            expense.splits.remove(split)
+            changed = True
+        elif split.amount != amount:
+            split.amount = amount
+            changed = True
+
+    for user_id, amount in wanted.items():
+        expense.splits.append(ExpenseSplit(user_id=user_id, amount=amount))
+    return changed or bool(wanted)
+
+
+def _store_equal_split(expense: Expense, user_ids: list[int]) -> bool:
+    """Switches the expense to (or keeps it in) the compact form; rows from earlier explicit splits are deleted"""
+    had_rows = False
+    if expense.equal_split_user_ids is None: #compact expenses have no rows, don't load the empty collection
+        had_rows = bool(expense.splits)
+        expense.splits.clear()
+    expense.equal_split_user_ids = user_ids
+    return had_rows
+
+
+def _columns_changed(expense: Expense) -> bool:
+    state = inspect(expense)
+    return any(state.attrs[name].history.has_changes() for name in ("amount", "description", "paid_by_id", "equal_split_user_ids", "occurred_at"))
+
+
+@traced
 def edit_expense_service(
     expense_update: ExpenseUpdate,
     user_id: int,
@@ -71,28 +136,91 @@ def edit_expense_service(
 
         if not expense:
             raise ExpenseNotFoundError
-        
+        if expense.version != expense_update.version:
+            raise ExpenseVersionConflictError
+        shares = shares_of(expense) #loads the split rows, which reconciling needs anyway
+        before = expense_contribution(expense.amount, expense.paid_by_id, expense.occurred_at, shares)
+        amount_before = expense.amount
+
         edited_expense = expense_update.expense
         expense.amount = edited_expense.amount
         expense.description = edited_expense.description
         expense.paid_by_id = edited_expense.paid_by_id
-
-
-        if edited_expense.splits is not None:
-            expense.splits.clear()
-            db.flush()
-
-            for split in edited_expense.splits:
-                expense.splits.append(
-                    ExpenseSplit(user_id=split.user.id, amount=split.amount)
-                )
-        db.flush()
-        logger.info("expense updated", extra={"expense_id": expense_update.id})
+        if edited_expense.occurred_at is not None:
+            expense.occurred_at = edited_expense.occurred_at
+
+
+        equal_user_ids = equal_split_members(edited_expense, group_id, db)
+        if equal_user_ids is not None:
+            splits_changed = _store_equal_split(expense, equal_user_ids)
+        else:
+            wanted = resolve_splits(edited_expense, group_id, db)
+            splits_changed = wanted is not None and _reconcile_splits(expense, wanted)
+        changed = splits_changed or _columns_changed(expense)
+        if changed:
+            expense.version += 1 #UPDATE expense SET version = v + 1 WHERE id = ? AND version = v
+            shares = shares_of(expense) #from the pending state, before the flush expires anything
+            after = expense_contribution(expense.amount, expense.paid_by_id, expense.occurred_at, shares)
+        db.flush() #only changed columns/rows are written; an unchanged edit is a no-op
+        if changed:
+            # after the version check passed; same transaction
+            apply_rollup_delta(group_id, before, after, db)
+            record_expense_event("edited", expense, shares, before, after, user_id, db)
+            bump_group_counters(group_id, db, spent=expense.amount - amount_before)
+        logger.info("expense updated", extra={"expense_id": expense_update.id, "version": expense.version})
         return expense
 
+    except ExpenseVersionConflictError:
+        logger.info("expense edit conflict", extra={"expense_id": expense_update.id, "expected_version": expense_update.version})
+        raise
+    except ExpenseSplitMemberError:
+        logger.info("expense split names non-members", extra={"group_id": group_id, "expense_id": expense_update.id})
+        raise
+    except StaleDataError as e:
+        # a concurrent edit committed between our read and the conditional UPDATE
+        logger.info("expense edit conflict", extra={"expense_id": expense_update.id, "expected_version": expense_update.version})
+        raise ExpenseVersionConflictError from e
+
     except Exception as e:
         logger.exception(
             "expense edit failed",
             extra={"group_id": group_id, "expense_id": expense_update.id},
         )
         raise ExpenseEditError from e
+
+
+@traced
+def delete_expense_service(expense_delete: ExpenseDelete, group_id: int, db: Session, user_id: Optional[int] = None) -> None:
+    expense = (
+        db.query(Expense)
+        .filter(Expense.id == expense_delete.id, Expense.group_id == group_id)
+        .first()
+    )
+    if not expense:
+        raise ExpenseNotFoundError
+    if expense.version != expense_delete.version:
+        raise ExpenseVersionConflictError
+
+    try:
+        shares = shares_of(expense)
+        before = expense_contribution(expense.amount, expense.paid_by_id, expense.occurred_at, shares)
+        record_expense_event("deleted", expense, shares, before, {}, user_id, db) #while the expense is still readable
+        db.delete(expense)
+        db.flush() #DELETE .. WHERE id = ? AND version = ?
+        apply_rollup_delta(group_id, before, {}, db)
+        bump_group_counters(group_id, db, expenses=-1, spent=-expense.amount)
+    except StaleDataError as e:
+        raise ExpenseVersionConflictError from e
+
+
+@traced
+def get_expense_details(expense_id: int, db: Session) -> ExpenseRecord:
+    """
+        Loads an expense with everything ExpenseOut serializes, compact equal splits expanded. Endpoints call
+        this after commit; it reads through the group read model, so nothing lazy loads off the expired instance
+    """
+    expense = load_expense_view(expense_id=expense_id, db=db)
+
+    if not expense:
+        raise ExpenseNotFoundError
+    return expense
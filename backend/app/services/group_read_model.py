@@ -0,0 +1,302 @@
+# read side of the group view; Core selects into slotted records instead of hydrating ORM instances
+# the records have the same attribute shape as the ORM models, so GroupOut validates them unchanged
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select, and_
+from sqlalchemy.orm import Session, aliased
+
+from app.db.models import Group, Expense, ExpenseSplit, User, GroupMembers
+from app.db.schemas import from_cents
+from app.core.exceptions import GroupFullDetailsError, GroupNotFoundError, GroupIncludeError
+from app.core.logger import get_module_logger
+from app.core.tracing import traced
+from app.services.split_strategies import split_equal
+
+
+logger = get_module_logger(__name__)
+
+
+# ******************************************************************************************************************************************************************************************
+# INCLUDE (sparse fieldsets)
+# ******************************************************************************************************************************************************************************************
+MAX_EXPENSE_LIMIT = 1000
+
+@dataclass(frozen=True)
+class GroupInclude:
+    """Which parts of the group view get loaded and returned; the default is everything (the view before include= existed)"""
+    members: bool = True
+    balances: bool = True #needs members; implied members when asked for on its own
+    expenses: bool = True
+    expense_limit: Optional[int] = None #only the latest N expenses
+    since: Optional[datetime] = None #expenses (and balances) that occurred in [since, until); utc
+    until: Optional[datetime] = None
+
+    def exclude(self) -> Optional[dict]:
+        """pydantic exclude spec that drops the unrequested GroupOut fields"""
+        exclude = {}
+        if not self.members:
+            exclude["members"] = True
+        elif not self.balances:
+            exclude["members"] = {"__all__": {"balance"}}
+        if not self.expenses:
+            exclude["expenses"] = True
+        return exclude or None
+
+FULL_GROUP = GroupInclude()
+
+
+def occurred_between(since: Optional[datetime], until: Optional[datetime]) -> list:
+    """Expense.occurred_at conditions for a [since, until) window; with the group_id condition they range scan ix_expense_group_id_occurred_at"""
+    conditions = []
+    if since is not None:
+        conditions.append(Expense.occurred_at >= since)
+    if until is not None:
+        conditions.append(Expense.occurred_at < until)
+    return conditions
+
+# newest first; id breaks ties between expenses booked at the same time
+EXPENSE_ORDER = (Expense.occurred_at.desc(), Expense.id.desc())
+
+_include_token = re.compile(r"\s*(\w+)\s*(?:\(([^()]*)\))?\s*(?:,|$)")
+
+
+def parse_group_include(value: Optional[str]) -> GroupInclude:
+    """
+        "members,balances,expenses(limit=20)" -> GroupInclude. None means the full view; an empty
+        string is just the group header (id, name, emoji)
+    """
+    if value is None:
+        return FULL_GROUP
+
+    parts: dict[str, Optional[str]] = {}
+    pos = 0
+    while pos < len(value):
+        match = _include_token.match(value, pos)
+        if match is None or match.end() == pos:
+            raise GroupIncludeError(f"Invalid include near {value[pos:]!r}")
+        name, params = match.groups()
+        if name not in ("members", "balances", "expenses"):
+            raise GroupIncludeError(f"Unknown include {name!r}; use members, balances or expenses")
+        if params is not None and name != "expenses":
+            raise GroupIncludeError(f"{name} takes no parameters")
+        parts[name] = params
+        pos = match.end()
+
+    expense_limit = None
+    for param in filter(None, (parts.get("expenses") or "").split(",")):
+        key, _, raw = (piece.strip() for piece in param.partition("="))
+        if key != "limit" or not raw.isdigit() or not 1 <= int(raw) <= MAX_EXPENSE_LIMIT:
+            raise GroupIncludeError(f"expenses takes limit=1..{MAX_EXPENSE_LIMIT}")
+        expense_limit = int(raw)
+
+    return GroupInclude(
+        members="members" in parts or "balances" in parts,
+        balances="balances" in parts,
+        expenses="expenses" in parts,
+        expense_limit=expense_limit,
+    )
+
+
+# ******************************************************************************************************************************************************************************************
+# RECORDS + QUERIES
+# ******************************************************************************************************************************************************************************************
+@dataclass(slots=True)
+class UserRecord:
+    id: int
+    name: str
+
+@dataclass(slots=True)
+class MemberRecord:
+    id: int
+    name: str
+    balance: int = 0 #cents; filled in by the caller
+
+@dataclass(slots=True)
+class SplitRecord:
+    user: UserRecord
+    amount: int #cents
+
+@dataclass(slots=True)
+class ExpenseRecord:
+    id: int
+    amount: int #cents
+    description: Optional[str]
+    paid_by: UserRecord
+    version: int = 1
+    occurred_at: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+    splits: list[SplitRecord] = field(default_factory=list)
+
+@dataclass(slots=True)
+class GroupRecord:
+    id: int
+    name: str
+    emoji: Optional[str]
+    members: list[MemberRecord] = field(default_factory=list)
+    expenses: list[ExpenseRecord] = field(default_factory=list)
+
+
+_payer = aliased(User)
+_split_user = aliased(User)
+
+_group_stmt = select(Group.id, Group.name, Group.emoji)
+
+# group + members in one go; outer joins so a group without members still comes back
+_group_members_stmt = (
+    select(Group.id, Group.name, Group.emoji, User.id, User.name)
+    .select_from(Group)
+    .outerjoin(GroupMembers, GroupMembers.group_id == Group.id)
+    .outerjoin(User, User.id == GroupMembers.user_id)
+)
+
+# one row per split (or per expense without splits); payer and split user names come along so no user lookups are needed
+# compact equal splits have no split rows; their participant ids come along instead and are expanded in _load_expenses
+_expense_splits_stmt = (
+    select(
+        Expense.id, Expense.amount, Expense.description, Expense.version, Expense.occurred_at, Expense.created_at, Expense.paid_by_id,
+        _payer.name, Expense.equal_split_user_ids, ExpenseSplit.user_id, _split_user.name, ExpenseSplit.amount,
+    )
+    .join(_payer, _payer.id == Expense.paid_by_id)
+    .outerjoin(ExpenseSplit, ExpenseSplit.expense_id == Expense.id)
+    .outerjoin(_split_user, _split_user.id == ExpenseSplit.user_id)
+)
+
+
+def _expenses_filter(group_id: int, include: GroupInclude):
+    in_range = [Expense.group_id == group_id, *occurred_between(include.since, include.until)]
+    if include.expense_limit is None:
+        return and_(*in_range)
+    latest = select(Expense.id).where(*in_range).order_by(*EXPENSE_ORDER).limit(include.expense_limit)
+    return Expense.id.in_(latest.scalar_subquery())
+
+
+@traced
+def load_group_view(group_id: int, db: Session, include: GroupInclude = FULL_GROUP) -> GroupRecord:
+    """
+        The group view every read path serves. Two queries, no identity map, and no members x splits
+        product like a single joinedload query would have. Parts left out of `include`
+        are never queried; they stay empty lists on the record
+    """
+    try:
+        statement = _group_members_stmt if include.members else _group_stmt
+        rows = db.execute(statement.where(Group.id == group_id)).all()
+    except Exception as e:
+        logger.error("Error loading group view: %s", e)
+        raise GroupFullDetailsError from e
+    if not rows:
+        logger.warning("group lookup failed", extra={"group_id": group_id})
+        raise GroupNotFoundError
+
+    group_id_, name, emoji = rows[0][:3]
+    group = GroupRecord(id=group_id_, name=name, emoji=emoji)
+    if include.members:
+        group.members = [MemberRecord(id=user_id, name=user_name) for *_, user_id, user_name in rows if user_id is not None]
+    if not include.expenses:
+        return group
+
+    try:
+        # members are the usual participants of compact splits; knowing their names saves the user lookup
+        users = {member.id: UserRecord(member.id, member.name) for member in group.members}
+        statement = _expense_splits_stmt.where(_expenses_filter(group_id, include))
+        if include.expense_limit is None:
+            group.expenses = _load_expenses(statement.order_by(*EXPENSE_ORDER), users, db) #walks ix_expense_group_id_occurred_at backwards
+        else:
+            # the limit subquery already picked them in order; sorting N records here beats a temp b-tree over their split rows
+            group.expenses = _load_expenses(statement, users, db)
+            group.expenses.sort(key=lambda expense: (expense.occurred_at, expense.id), reverse=True)
+    except Exception as e:
+        logger.error("Error loading group view: %s", e)
+        raise GroupFullDetailsError from e
+
+    logger.debug("group view loaded", extra={"group_id": group_id, "expenses": len(group.expenses)})
+    return group
+
+
+def _load_expenses(statement, users: dict[int, UserRecord], db: Session) -> list[ExpenseRecord]:
+    """
+        Runs an _expense_splits_stmt and groups its rows into expense records. `users` holds one record per
+        user, shared between every expense/split that references it. Compact equal splits are expanded here,
+        with one extra query for participant names not seen in the rows (or passed in)
+    """
+    expenses: dict[int, ExpenseRecord] = {}
+    compact: list[tuple[ExpenseRecord, list[int]]] = []
+    for (
+        expense_id, amount, description, version, occurred_at, created_at, paid_by_id, payer_name,
+        equal_user_ids, split_user_id, split_user_name, split_amount,
+    ) in db.execute(statement):
+        expense = expenses.get(expense_id)
+        if expense is None:
+            payer = users.get(paid_by_id) or users.setdefault(paid_by_id, UserRecord(paid_by_id, payer_name))
+            expense = expenses[expense_id] = ExpenseRecord(expense_id, amount, description, payer, version, occurred_at, created_at)
+            if equal_user_ids is not None:
+                compact.append((expense, equal_user_ids))
+        if split_user_id is not None:
+            user = users.get(split_user_id) or users.setdefault(split_user_id, UserRecord(split_user_id, split_user_name))
+            expense.splits.append(SplitRecord(user, split_amount))
+
+    missing = {user_id for _, user_ids in compact for user_id in user_ids if user_id not in users}
+    if missing:
+        users.update((user_id, UserRecord(user_id, name)) for user_id, name in db.execute(select(User.id, User.name).where(User.id.in_(missing))))
+    for expense, user_ids in compact:
+        expense.splits = [SplitRecord(users[user_id], share) for user_id, share in split_equal(expense.amount, user_ids).items() if user_id in users]
+        if len(expense.splits) != len(user_ids): #ids with no user row (stored before they were validated); show the rest
+            logger.warning("equal split names unknown users", extra={"expense_id": expense.id})
+    return list(expenses.values())
+
+
+@traced
+def load_expense_view(expense_id: int, db: Session) -> Optional[ExpenseRecord]:
+    """One expense as an ExpenseRecord (what ExpenseOut serializes), or None when it doesn't exist"""
+    expenses = _load_expenses(_expense_splits_stmt.where(Expense.id == expense_id), {}, db)
+    return expenses[0] if expenses else None
+
+
+@traced
+def to_columnar(group, include: GroupInclude = FULL_GROUP) -> dict:
+    """
+        Columnar form of a loaded group view (members need .balance set).
+        Users are stored once in `users` and referenced by index; expense i owns
+        splits[split_offsets[i]:split_offsets[i + 1]]. Parts left out of `include` are left out here too.
+        Amounts and balances are decimal units, same as the json view
+    """
+    user_ids: list[int] = []
+    user_names: list[str] = []
+    index: dict[int, int] = {}
+
+    def user_ref(user) -> int:
+        ref = index.get(user.id)
+        if ref is None:
+            ref = index[user.id] = len(user_ids)
+            user_ids.append(user.id)
+            user_names.append(user.name)
+        return ref
+
+    columnar = {"id": group.id, "name": group.name, "emoji": group.emoji, "users": {"id": user_ids, "name": user_names}}
+
+    if include.members:
+        columnar["members"] = {"user": [user_ref(member) for member in group.members]}
+        if include.balances:
+            columnar["members"]["balance"] = [from_cents(member.balance) for member in group.members]
+
+    if include.expenses:
+        expenses = {"id": [], "version": [], "amount": [], "description": [], "occurred_at": [], "created_at": [], "paid_by": [], "split_offsets": [0]}
+        splits = {"user": [], "amount": []}
+        for expense in group.expenses:
+            expenses["id"].append(expense.id)
+            expenses["version"].append(expense.version)
+            expenses["amount"].append(from_cents(expense.amount))
+            expenses["description"].append(expense.description)
+            expenses["occurred_at"].append(expense.occurred_at.isoformat()) #msgpack has no datetime; iso strings like the json view
+            expenses["created_at"].append(expense.created_at.isoformat())
+            expenses["paid_by"].append(user_ref(expense.paid_by))
+            for split in expense.splits:
+                splits["user"].append(user_ref(split.user))
+                splits["amount"].append(from_cents(split.amount))
+            expenses["split_offsets"].append(len(splits["user"]))
+        columnar["expenses"] = expenses
+        columnar["splits"] = splits
+
+    return columnar
@@ -1,50 +1,30 @@
 # logic for creating groups; eg. only unique users per group, max amount, etc.
+import json
 import secrets
 from datetime import datetime, timezone
+from typing import Optional
 
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import func
+from sqlalchemy import Integer, String, cast, func, select, update
 from urllib.parse import urlparse, parse_qs
 
 from app.db.models import Group, Expense, ExpenseSplit, User, GroupMembers, GroupInvite
-from app.db.schemas import GroupOut, GroupShortOut, GroupInviteOut
+from app.db.schemas import GroupShortOut, GroupInviteOut
 from app.core.exceptions import (
-    GroupFullDetailsError, GroupCalculateBalanceError, GroupCheckPwJoinError, GroupCheckLinkJoinError, 
+    GroupCalculateBalanceError, GroupCheckPwJoinError, GroupCheckLinkJoinError, 
     GroupAddUserError, GroupShortDetailsError, GroupInviteLinkCreateError, GroupNotFoundError, GroupUserAlreadyJoinedError
 )
 from app.core.logger import get_module_logger
+from app.core.tracing import traced
+from app.services.group_read_model import occurred_between
+from app.services.split_strategies import sum_equal_splits
 
 
 logger = get_module_logger(__name__)
 
 
-def get_full_group_details(group_id: int, db: Session) -> GroupOut:
-    try:
-        group_details = (
-            db.query(Group)
-            .options(
-                joinedload(Group.members),
-                joinedload(Group.expenses)
-                # .joinedload(Expense.paid_by)
-                    .joinedload(Expense.splits)
-                    .joinedload(ExpenseSplit.user)    
-            )
-            .filter(Group.id == group_id)
-            .first()
-        )
-
-        logger.debug("group details loaded", extra={"group_id": group_id})
-
-        if not group_details:
-            logger.warning("group lookup failed", extra={"group_id": group_id})
-            raise GroupNotFoundError from e
-
-        return group_details
-    except Exception as e:
-        logger.error(f"Error loading group details: {e}")
-        raise GroupFullDetailsError from e
-
+@traced
 def check_join_group(group_name: str, group_pw: str, db: Session) -> int:
     try:
         group = (
@@ -60,17 +40,18 @@ def check_join_group(group_name: str, group_pw: str, db: Session) -> int:
         return group.id
 
     except Exception as e:
-        logger.error(f"Error checking join group: {e}")
+        logger.error("Error checking join group: %s", e)
         raise GroupNotFoundError from e
     
 
+@traced
 def check_link_join(token_link: str, db: Session) -> int:
     try:
         parsed = urlparse(token_link)
         query_params = parse_qs(parsed.query)
         token = query_params.get("token", [None])[0]
 
-        logger.info(f"Token to check: {token}")
+        logger.debug("Token to check: %s", token)
 
         invite = (
             db.query(GroupInvite)
@@ -91,70 +72,163 @@ def check_link_join(token_link: str, db: Session) -> int:
 
     except Exception as e:
         db.rollback() #cause we change used field
-        logger.error(f"Error checking link join: {e}")
+        logger.error("Error checking link join: %s", e)
         raise GroupCheckLinkJoinError from e
 
-def add_user_group(group_id: int, user: User, db: Session) -> GroupOut:
+@traced
+def add_user_group(group_id: int, user: User, db: Session) -> GroupMembers:
+    """Adds the membership (one INSERT) and bumps the member count; callers load whatever view they need themselves"""
     try:
-        group = (
-            db.query(Group)
-            .filter(Group.id == group_id)
-            .first()
-        )
-        new_member = GroupMembers(user=user, group=group)
-        group.member_associations.append(new_member)
-
+        new_member = GroupMembers(user_id=user.id, group_id=group_id)
         db.add(new_member)
         db.flush() #best practice; only commit and rollback endpoint as it owns request lifecycle
-        db.refresh(new_member)
-        return get_full_group_details(group_id=group_id, db=db)
+        bump_group_counters(group_id, db, members=1) #after the insert, so a duplicate join doesn't count
+        return new_member
     except IntegrityError:
         logger.error("User already added to group")
         raise GroupUserAlreadyJoinedError
     except Exception as e:
-        logger.error(f"Error adding user to group: {e}")
+        logger.error("Error adding user to group: %s", e)
         raise GroupAddUserError from e
 
 
+def bump_group_counters(group_id: int, db: Session, members: int = 0, expenses: int = 0, spent: int = 0) -> None:
+    """
+        Adds to the group's denormalized counters and marks it active now, in one UPDATE .. SET x = x + ? that is
+        atomic per row, so concurrent writers don't lose counts. Call it from the mutation's own transaction
+    """
+    values = {"last_activity_at": func.now()} #any change counts as activity, eg. a renamed expense
+    for column, delta in ((Group.member_count, members), (Group.expense_count, expenses), (Group.total_spent, spent)):
+        if delta:
+            values[column.key] = column + delta
+    db.execute(
+        update(Group)
+        .where(Group.id == group_id)
+        .values(**values)
+        .execution_options(synchronize_session=False) #loaded Group instances go stale until the commit expires them
+    )
+
+
+def recount_group(group_id: int, db: Session) -> None:
+    """Recomputes the group's counters from group_members and expense; for bulk loads that bypass the write paths"""
+    db.execute(
+        update(Group)
+        .where(Group.id == group_id)
+        .values(
+            member_count=select(func.count()).select_from(GroupMembers).where(GroupMembers.group_id == group_id).scalar_subquery(),
+            expense_count=select(func.count()).select_from(Expense).where(Expense.group_id == group_id).scalar_subquery(),
+            total_spent=select(func.coalesce(func.sum(Expense.amount), 0)).where(Expense.group_id == group_id).scalar_subquery(),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+@traced
 def get_short_group_details(user_id: int, db: Session) -> list[GroupShortOut]:
+    """The caller's groups with their counters; one query, group_members primary key then group primary key"""
     try:
         logger.debug("group list request received")
         group_list = (
             db.query(Group)
-            .join(Group.members)
-            .filter(User.id == user_id)
+            .join(GroupMembers, GroupMembers.group_id == Group.id)
+            .filter(GroupMembers.user_id == user_id)
             .all()
         )
         logger.debug("group short list loaded", extra={"User_id": user_id})
         return group_list
     except Exception as e:
-        logger.error(f"Error getting short group list: {e}")
+        logger.error("Error getting short group list: %s", e)
         raise GroupShortDetailsError from e
 
-def calculate_balance(user: User, group_id: int, db: Session):
+@traced
+def calculate_balance(user: User, group_id: int, db: Session) -> int:
+    """Net balance in cents; exact, the sums run over integer columns"""
     try:
         #total paid by user_id in this group
         total_paid = (
-            db.query(func.coalesce(func.sum(Expense.amount), 0.0))
+            db.query(func.coalesce(func.sum(Expense.amount), 0))
             .filter(Expense.group_id == group_id, Expense.paid_by_id == user.id)
             .scalar()
         )
 
         #total owed by the user in this group (splits)
         total_owed = (
-            db.query(func.coalesce(func.sum(ExpenseSplit.amount), 0.0))
+            db.query(func.coalesce(func.sum(ExpenseSplit.amount), 0))
             .join(Expense)
             .filter(Expense.group_id == group_id, ExpenseSplit.user_id == user.id)
             .scalar()
         )
 
-        balance = float(total_paid) - float(total_owed)
-        return balance
+        total_owed = int(total_owed) + sum_equal_splits(_equal_split_rows(group_id, db)).get(user.id, 0)
+
+        return int(total_paid) - total_owed #postgres SUM(bigint) comes back as Decimal
+
+    except Exception as e:
+        logger.error("Error in calculate balance service: %s", e)
+        raise GroupCalculateBalanceError from e
+
+def _equal_split_rows(group_id: int, db: Session, window: list = ()):
+    """
+        The group's compact equal splits grouped by participant list, sign and leftover cents (see sum_equal_splits), so
+        rows scale with distinct lists, not expenses. Grouped on the json text: postgres json has no equality operator,
+        and the lists are written sorted by the app, so equal lists have equal text
+    """
+    user_ids = cast(Expense.equal_split_user_ids, String)
+    participants = func.json_array_length(Expense.equal_split_user_ids, type_=Integer) #typed, so // is integer division, not FLOOR(a / b)
+    cents = func.abs(Expense.amount)
+    negative = Expense.amount < 0
+    remainder = cents % participants
+    rows = (
+        db.query(user_ids, negative, remainder, func.sum(cents // participants), func.count())
+        .filter(Expense.group_id == group_id, Expense.equal_split_user_ids.is_not(None), *window)
+        .group_by(user_ids, negative, remainder)
+        .all()
+    )
+    decoded: dict[str, list[int]] = {}
+    return [
+        (decoded.get(text) or decoded.setdefault(text, json.loads(text)), bool(is_negative), int(leftover), share_total, count)
+        for text, is_negative, leftover, share_total, count in rows
+    ]
+
+def combine_balances(paid_rows, owed_rows) -> dict[int, int]:
+    """(user_id, total cents) rows for paid and owed -> net balance in cents per user"""
+    balances: dict[int, int] = {}
+    for user_id, total_paid in paid_rows:
+        balances[user_id] = balances.get(user_id, 0) + int(total_paid)
+    for user_id, total_owed in owed_rows:
+        balances[user_id] = balances.get(user_id, 0) - int(total_owed)
+    return balances
+
+@traced
+def calculate_balances(group_id: int, db: Session, since: Optional[datetime] = None, until: Optional[datetime] = None) -> dict[int, int]:
+    """
+        Balances (cents) for every member in three grouped queries (paid, owed split rows, compact equal splits), instead of
+        per member queries. since/until limit it to expenses that occurred in [since, until), eg. what this month added
+    """
+    window = occurred_between(since, until)
+    try:
+        paid_rows = (
+            db.query(Expense.paid_by_id, func.sum(Expense.amount))
+            .filter(Expense.group_id == group_id, *window)
+            .group_by(Expense.paid_by_id)
+            .all()
+        )
+
+        owed_rows = (
+            db.query(ExpenseSplit.user_id, func.sum(ExpenseSplit.amount))
+            .join(Expense)
+            .filter(Expense.group_id == group_id, *window)
+            .group_by(ExpenseSplit.user_id)
+            .all()
+        )
+
+        return combine_balances(paid_rows, [*owed_rows, *sum_equal_splits(_equal_split_rows(group_id, db, window)).items()])
 
     except Exception as e:
-        logger.error(f"Error in calculate balance service: {e}")
+        logger.error("Error in calculate balances service: %s", e)
         raise GroupCalculateBalanceError from e
 
+@traced
 def create_group_invite_service(user_id: int, group_id: int, db: Session, expires_at=None) -> GroupInviteOut:
     try:
         token = secrets.token_urlsafe(16)
@@ -171,6 +245,6 @@ def create_group_invite_service(user_id: int, group_id: int, db: Session, expire
 
     except Exception as e:
         db.rollback()
-        logger.error(f"Error in group invite service: {e}")
+        logger.error("Error in group invite service: %s", e)
         raise GroupInviteLinkCreateError from e
 
@@ -0,0 +1,136 @@
+# per group / member / month spending rollups; analytics read these instead of scanning expense + expense_split
+# every write path turns the expense into its contribution (before and after) and applies the difference
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from typing import Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.db.models import Expense, ExpenseSplit, MonthlyRollup
+from app.core.exceptions import GroupAnalyticsError
+from app.core.logger import get_module_logger
+from app.core.tracing import traced
+from app.services.split_strategies import split_equal
+
+
+logger = get_module_logger(__name__)
+
+# (user_id, month) -> [paid_total, paid_count, owed_total, owed_count]
+Contribution = dict[tuple[int, date], list[int]]
+_FIELDS = ("paid_total", "paid_count", "owed_total", "owed_count")
+
+
+def month_of(moment: date) -> date:
+    if isinstance(moment, datetime) and moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc) #postgres hands timestamptz back in the session time zone; sqlite naive utc
+    return date(moment.year, moment.month, 1)
+
+
+def expense_contribution(amount: int, paid_by_id: int, occurred_at: datetime, shares: dict[int, int]) -> Contribution:
+    """What one expense adds to the rollups; `shares` is user_id -> owed cents"""
+    month = month_of(occurred_at)
+    contribution: Contribution = defaultdict(lambda: [0, 0, 0, 0])
+    paid = contribution[(paid_by_id, month)]
+    paid[0] += amount
+    paid[1] += 1
+    for user_id, share in shares.items():
+        owed = contribution[(user_id, month)]
+        owed[2] += share
+        owed[3] += 1
+    return dict(contribution)
+
+
+def shares_of(expense: Expense) -> dict[int, int]:
+    """user_id -> owed cents for a stored expense, either split form; compact ones don't touch expense.splits"""
+    if expense.equal_split_user_ids is not None:
+        return split_equal(expense.amount, expense.equal_split_user_ids)
+    shares: dict[int, int] = {}
+    for split in expense.splits:
+        shares[split.user_id] = shares.get(split.user_id, 0) + split.amount
+    return shares
+
+
+def _upsert(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(MonthlyRollup)
+    if dialect == "sqlite":
+        return sqlite.insert(MonthlyRollup)
+    raise NotImplementedError(f"rollup upsert not implemented for {dialect}")
+
+
+def apply_rollup_delta(group_id: int, before: Contribution, after: Contribution, db: Session) -> int:
+    """
+        Adds after - before to the group's rollups in one INSERT .. ON CONFLICT DO UPDATE SET x = x + excluded.x,
+        atomic per row, so concurrent writers to the same month don't lose updates. Unchanged keys are skipped;
+        an edit that doesn't move money (description only) writes nothing. Returns the number of rows touched
+    """
+    rows = []
+    for key in before.keys() | after.keys():
+        old, new = before.get(key, (0, 0, 0, 0)), after.get(key, (0, 0, 0, 0))
+        delta = [n - o for n, o in zip(new, old)]
+        if any(delta):
+            user_id, month = key
+            rows.append({"group_id": group_id, "month": month, "user_id": user_id, **dict(zip(_FIELDS, delta))})
+    if not rows:
+        return 0
+
+    statement = _upsert(db)
+    statement = statement.on_conflict_do_update(
+        index_elements=[MonthlyRollup.group_id, MonthlyRollup.month, MonthlyRollup.user_id],
+        set_={field: getattr(MonthlyRollup, field) + getattr(statement.excluded, field) for field in _FIELDS},
+    )
+    db.execute(statement, rows)
+    return len(rows)
+
+
+@traced
+def rebuild_group_rollups(group_id: int, db: Session) -> int:
+    """
+        Recomputes a group's rollups from its expenses with the same contribution math as the write paths.
+        Two reads (expenses, split rows) and one write; the caller commits. Returns the number of rollup rows
+    """
+    expenses = db.execute(
+        select(Expense.id, Expense.amount, Expense.paid_by_id, Expense.occurred_at, Expense.equal_split_user_ids)
+        .where(Expense.group_id == group_id)
+    ).all()
+    split_rows: dict[int, dict[int, int]] = defaultdict(dict)
+    for expense_id, user_id, amount in db.execute(
+        select(ExpenseSplit.expense_id, ExpenseSplit.user_id, ExpenseSplit.amount)
+        .join(Expense, Expense.id == ExpenseSplit.expense_id)
+        .where(Expense.group_id == group_id)
+    ):
+        shares = split_rows[expense_id]
+        shares[user_id] = shares.get(user_id, 0) + amount
+
+    totals: Contribution = defaultdict(lambda: [0, 0, 0, 0])
+    for expense_id, amount, paid_by_id, occurred_at, equal_user_ids in expenses:
+        shares = split_equal(amount, equal_user_ids) if equal_user_ids is not None else split_rows.get(expense_id, {})
+        for key, values in expense_contribution(amount, paid_by_id, occurred_at, shares).items():
+            totals[key] = [total + value for total, value in zip(totals[key], values)]
+
+    db.execute(delete(MonthlyRollup).where(MonthlyRollup.group_id == group_id))
+    apply_rollup_delta(group_id, {}, dict(totals), db)
+    return len(totals)
+
+
+@traced
+def get_group_rollups(group_id: int, db: Session, since: Optional[date] = None, until: Optional[date] = None) -> list[MonthlyRollup]:
+    """
+        A group's rollup rows for the months overlapping [since, until), oldest month first, by user id.
+        One primary key range read of O(months x members) rows, no matter how many expenses they cover
+    """
+    try:
+        statement = select(MonthlyRollup).where(MonthlyRollup.group_id == group_id)
+        if since is not None:
+            statement = statement.where(MonthlyRollup.month >= month_of(since))
+        if until is not None:
+            statement = statement.where(MonthlyRollup.month < until)
+        # rows whose expenses were all deleted or moved stay behind as zeros; not worth a delete on the write path
+        statement = statement.where((MonthlyRollup.paid_count > 0) | (MonthlyRollup.owed_count > 0))
+        return list(db.scalars(statement.order_by(MonthlyRollup.month, MonthlyRollup.user_id)))
+    except Exception as e:
+        logger.error("Error loading group rollups: %s", e)
+        raise GroupAnalyticsError from e
@@ -0,0 +1,130 @@
+# turns an expense's split rule (or explicit splits) into per-user cents
+# every result adds up to the expense amount exactly; leftover cents are handed out deterministically
+import heapq
+from fractions import Fraction
+from math import lcm
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.db.models import GroupMembers
+from app.core.exceptions import ExpenseSplitMemberError
+from app.db.schemas import ExpenseCreate, ExpenseSplitIn, EqualSplit, SharesSplit, PercentageSplit, ExactSplit
+
+
+def split_equal(amount: int, user_ids: list[int]) -> dict[int, int]:
+    """Same share for everyone; the remainder cents go one each to the lowest user ids"""
+    ordered = sorted(set(user_ids))
+    share, remainder = divmod(abs(amount), len(ordered))
+    sign = -1 if amount < 0 else 1
+    return {user_id: sign * (share + (1 if i < remainder else 0)) for i, user_id in enumerate(ordered)}
+
+
+def split_weighted(amount: int, weights: dict[int, Fraction]) -> dict[int, int]:
+    """
+        Largest remainder: everyone gets floor(amount * weight / total), then the leftover cents (fewer than
+        there are users) go to the largest fractional parts, ties to the lowest user id.
+        Weights are scaled to integers first so the whole thing is integer divmod, no float rounding
+    """
+    scale = lcm(*(weight.denominator for weight in weights.values()))
+    scaled = {user_id: int(weight * scale) for user_id, weight in weights.items()}
+    total = sum(scaled.values())
+
+    cents = abs(amount)
+    floors, remainders = {}, []
+    for user_id, weight in scaled.items():
+        floors[user_id], remainder = divmod(cents * weight, total)
+        remainders.append((-remainder, user_id))
+
+    leftover = cents - sum(floors.values())
+    for _, user_id in heapq.nsmallest(leftover, remainders):
+        floors[user_id] += 1
+
+    sign = -1 if amount < 0 else 1
+    return {user_id: sign * share for user_id, share in floors.items()}
+
+
+def merge_splits(splits: list[ExpenseSplitIn]) -> dict[int, int]:
+    """Explicit splits as user_id -> cents; a user listed twice gets the sum"""
+    merged: dict[int, int] = {}
+    for split in splits:
+        merged[split.user.id] = merged.get(split.user.id, 0) + split.amount
+    return merged
+
+
+def sum_equal_splits(rows) -> dict[int, int]:
+    """
+        Cents owed per user from compact equal splits, aggregated per participant list instead of per expense.
+        rows are (sorted user_ids, negative, remainder, share total, expense count): for every list and sign, the
+        expenses whose abs(amount) % len(user_ids) is `remainder`, with the sum of their abs(amount) // len(user_ids).
+        Each of those expenses also gives one leftover cent to the first `remainder` ids (see split_equal)
+    """
+    shares: dict[tuple, int] = {}
+    leftovers: dict[tuple, dict[int, int]] = {} #(user_ids, sign) -> remainder -> expenses
+    for user_ids, negative, remainder, share_total, count in rows:
+        key = (tuple(user_ids), -1 if negative else 1)
+        shares[key] = shares.get(key, 0) + int(share_total)
+        histogram = leftovers.setdefault(key, {})
+        histogram[remainder] = histogram.get(remainder, 0) + count
+
+    owed: dict[int, int] = {}
+    for (user_ids, sign), share in shares.items():
+        histogram = leftovers[(user_ids, sign)]
+        extra = sum(histogram.values()) #expenses with a leftover cent for position i: remainder > i
+        for i, user_id in enumerate(user_ids):
+            extra -= histogram.get(i, 0)
+            owed[user_id] = owed.get(user_id, 0) + sign * (share + extra)
+    return owed
+
+
+def _group_member_ids(group_id: int, db: Session) -> list[int]:
+    return list(db.scalars(select(GroupMembers.user_id).where(GroupMembers.group_id == group_id)))
+
+
+def _check_members(user_ids, member_ids: list[int]) -> None:
+    outsiders = set(user_ids).difference(member_ids)
+    if outsiders:
+        raise ExpenseSplitMemberError(f"not members of the group: {sorted(outsiders)}")
+
+
+def equal_split_members(expense: ExpenseCreate, group_id: int, db: Session) -> Optional[list[int]]:
+    """
+        Sorted participant ids when the expense uses the equal rule, which is stored compactly on the expense; else None.
+        The ids go into a column without a foreign key, so they are checked against the group's members first
+    """
+    rule = expense.split
+    if not isinstance(rule, EqualSplit):
+        return None
+    member_ids = _group_member_ids(group_id, db)
+    if rule.user_ids:
+        _check_members(rule.user_ids, member_ids)
+    return sorted(set(rule.user_ids or member_ids))
+
+
+def resolve_splits(expense: ExpenseCreate, group_id: int, db: Session) -> Optional[dict[int, int]]:
+    """
+        user_id -> cents for the expense, or None when it carries neither splits nor a rule.
+        One select of the group's member ids; every user the result names must be one of them
+    """
+    rule = expense.split
+    if rule is None and expense.splits is None:
+        return None
+    if isinstance(rule, EqualSplit):
+        return split_equal(expense.amount, equal_split_members(expense, group_id, db)) #checked there
+
+    if rule is None:
+        named = merge_splits(expense.splits)
+    elif isinstance(rule, SharesSplit):
+        named = rule.shares
+    elif isinstance(rule, PercentageSplit):
+        named = rule.percentages
+    elif isinstance(rule, ExactSplit):
+        named = rule.amounts
+    else:
+        raise ValueError(f"unknown split rule {rule.kind}")
+    _check_members(named, _group_member_ids(group_id, db)) #before any arithmetic on the weights
+
+    if isinstance(rule, (SharesSplit, PercentageSplit)):
+        return split_weighted(expense.amount, {user_id: Fraction(weight) for user_id, weight in named.items()})
+    return dict(named) #explicit splits, or exact amounts whose sum the schema already checked
@@ -0,0 +1,168 @@
+# seeded synthetic data generator; bulk loads users, groups, memberships, expenses, splits and invites, then builds the monthly rollups and group counters
+# usage (from backend/): python -m benchmarks.datagen --database-url postgresql+psycopg2://... --groups 200 --manifest bench.json
+import argparse
+import json
+import random
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta, timezone
+
+from passlib.context import CryptContext
+from sqlalchemy import create_engine, insert, select, func
+from sqlalchemy.orm import Session
+
+from app.db.base import Base
+from app.db.models import User, Group, GroupMembers, Expense, ExpenseSplit, GroupInvite
+from app.services.rollup_service import rebuild_group_rollups
+from app.services.group_service import recount_group
+
+
+BENCH_PASSWORD = "bench-password"
+BATCH_SIZE = 5_000
+
+
+@dataclass
+class GeneratorConfig:
+    seed: int = 42
+    users: int = 500
+    groups: int = 100
+    members_per_group: tuple[int, int] = (2, 12) #uniform range, inclusive
+    expenses_per_group: tuple[int, int] = (10, 300)
+    split_all_ratio: float = 0.7 #share of expenses split between every member; the rest use a random subset
+    amount_range: tuple[float, float] = (1.0, 500.0)
+    history_days: int = 365 #expenses occur uniformly over the last N days
+    invites_per_group: int = 5
+    group_pw: str = "bench"
+
+
+def _parse_range(value: str) -> tuple[int, int]:
+    low, _, high = value.partition(":")
+    return int(low), int(high or low)
+
+
+def _even_splits(cents: int, user_ids: list[int]) -> list[int]:
+    # splits add up to the amount exactly; leftover cents go to the first members
+    share, remainder = divmod(cents, len(user_ids))
+    return [share + (1 if i < remainder else 0) for i in range(len(user_ids))]
+
+
+def _insert_batched(session: Session, model, rows: list[dict]) -> list[int]:
+    """Bulk ORM insert; returns the generated ids in row order (ids are never set by hand, so sequences stay valid)"""
+    ids = []
+    statement = insert(model).returning(model.id, sort_by_parameter_order=True) if hasattr(model, "id") else None
+    for start in range(0, len(rows), BATCH_SIZE):
+        batch = rows[start:start + BATCH_SIZE]
+        if statement is None:
+            session.execute(insert(model), batch)
+        else:
+            ids += session.scalars(statement, batch).all()
+    return ids
+
+
+def generate(session: Session, config: GeneratorConfig) -> dict:
+    """
+        Generates the dataset next to any existing rows, so it can be loaded into a database that already
+        has data. Returns a manifest the load driver uses to pick users/groups
+    """
+    rng = random.Random(config.seed)
+    pw_hash = CryptContext(schemes=["argon2"]).hash(BENCH_PASSWORD) #one hash for everyone; argon2 per user would dominate load time
+
+    run = f"{config.seed}-{session.scalar(select(func.count(User.id)))}" #keeps emails/group names unique across repeated loads
+
+    user_ids = _insert_batched(session, User, [
+        {"name": f"Bench User {n}", "email": f"bench-{run}-{n}@example.com", "pw": pw_hash} for n in range(config.users)
+    ])
+    emails = {uid: f"bench-{run}-{n}@example.com" for n, uid in enumerate(user_ids)}
+
+    group_names = [f"bench-{run}-group-{n}" for n in range(config.groups)]
+    group_ids = _insert_batched(session, Group, [
+        {"name": name, "pw": config.group_pw, "emoji": rng.choice(["🏠", "✈️", "🍕", "🎿", None])} for name in group_names
+    ])
+
+    memberships: dict[int, list[int]] = {}
+    for gid in group_ids:
+        size = min(rng.randint(*config.members_per_group), len(user_ids))
+        memberships[gid] = rng.sample(user_ids, size)
+    _insert_batched(session, GroupMembers, [{"user_id": uid, "group_id": gid} for gid, members in memberships.items() for uid in members])
+
+    now = datetime.now(timezone.utc)
+    expenses, participants_per_expense = [], []
+    for gid, members in memberships.items():
+        for _ in range(rng.randint(*config.expenses_per_group)):
+            amount = round(rng.uniform(*config.amount_range) * 100) #stored in cents
+            payer = rng.choice(members)
+            # split between everyone is what the equal rule stores compactly (participant ids, no split rows)
+            split_all = rng.random() < config.split_all_ratio
+            participants = [] if split_all else rng.sample(members, rng.randint(1, len(members)))
+            expenses.append({
+                "amount": amount, "description": "bench expense", "group_id": gid, "paid_by_id": payer, "created_by_id": payer,
+                "equal_split_user_ids": sorted(members) if split_all else None,
+                "occurred_at": now - timedelta(seconds=rng.randrange(config.history_days * 86400)),
+            })
+            participants_per_expense.append(participants)
+    expense_ids = _insert_batched(session, Expense, expenses)
+
+    splits = [
+        {"expense_id": expense_id, "user_id": uid, "amount": share}
+        for expense_id, expense, participants in zip(expense_ids, expenses, participants_per_expense) if participants
+        for uid, share in zip(participants, _even_splits(expense["amount"], participants))
+    ]
+    _insert_batched(session, ExpenseSplit, splits)
+    # bulk inserts bypass the write paths that maintain the rollups and group counters
+    rollups = sum(rebuild_group_rollups(gid, session) for gid in group_ids)
+    for gid in group_ids:
+        recount_group(gid, session)
+
+    expires_at = datetime.now(timezone.utc) + timedelta(days=7)
+    invites = [
+        {"token": f"{rng.getrandbits(128):032x}", "group_id": gid, "created_by_id": memberships[gid][0], "expires_at": expires_at, "used": False}
+        for gid in group_ids for _ in range(config.invites_per_group)
+    ]
+    _insert_batched(session, GroupInvite, invites)
+
+    return {
+        "config": asdict(config),
+        "password": BENCH_PASSWORD,
+        "users": [{"id": uid, "email": email} for uid, email in emails.items()],
+        "groups": [
+            {"id": gid, "name": name, "pw": config.group_pw, "members": memberships[gid]}
+            for gid, name in zip(group_ids, group_names)
+        ],
+        "invites": [invite["token"] for invite in invites],
+        "counts": {"users": len(user_ids), "groups": len(group_ids), "expenses": len(expenses), "splits": len(splits), "rollups": rollups, "invites": len(invites)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a database with synthetic benchmark data")
+    parser.add_argument("--database-url", required=True)
+    parser.add_argument("--seed", type=int, default=GeneratorConfig.seed)
+    parser.add_argument("--users", type=int, default=GeneratorConfig.users)
+    parser.add_argument("--groups", type=int, default=GeneratorConfig.groups)
+    parser.add_argument("--members-per-group", type=_parse_range, default="2:12", help="min:max")
+    parser.add_argument("--expenses-per-group", type=_parse_range, default="10:300", help="min:max")
+    parser.add_argument("--split-all-ratio", type=float, default=GeneratorConfig.split_all_ratio)
+    parser.add_argument("--invites-per-group", type=int, default=GeneratorConfig.invites_per_group)
+    parser.add_argument("--history-days", type=int, default=GeneratorConfig.history_days)
+    parser.add_argument("--create-schema", action="store_true", help="create missing tables first (empty databases)")
+    parser.add_argument("--manifest", default="bench_manifest.json")
+    args = parser.parse_args()
+
+    config = GeneratorConfig(
+        seed=args.seed, users=args.users, groups=args.groups, members_per_group=args.members_per_group,
+        expenses_per_group=args.expenses_per_group, split_all_ratio=args.split_all_ratio, invites_per_group=args.invites_per_group,
+        history_days=args.history_days,
+    )
+    engine = create_engine(args.database_url)
+    if args.create_schema:
+        Base.metadata.create_all(engine)
+
+    with Session(engine) as session, session.begin():
+        manifest = generate(session, config)
+
+    with open(args.manifest, "w") as f:
+        json.dump(manifest, f)
+    print(json.dumps(manifest["counts"]))
+
+
+if __name__ == "__main__":
+    main()
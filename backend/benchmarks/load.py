@@ -0,0 +1,244 @@
+# local load driver; replays signup/login, view-group, create-expense and join flows against a running backend
+# and reports throughput + p50/p95/p99 latency per flow as json, so runs can be compared between commits
+# usage (from backend/):
+#   python -m benchmarks.datagen --database-url ... --manifest bench_manifest.json
+#   python -m benchmarks.load --base-url http://127.0.0.1:8000 --manifest bench_manifest.json --concurrency 32 --duration 30 --out run.json
+#   python -m benchmarks.load ... --compare previous_run.json
+import argparse
+import asyncio
+import json
+import math
+import random
+import subprocess
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from itertools import count
+
+import httpx
+
+
+DEFAULT_MIX = "view_group=60,create_expense=25,login=10,signup=3,join=2"
+
+
+def _parse_mix(value: str) -> dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        flow, _, weight = part.partition("=")
+        if flow not in FLOWS:
+            raise argparse.ArgumentTypeError(f"unknown flow {flow!r}; choose from {sorted(FLOWS)}")
+        mix[flow] = float(weight)
+    return mix
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class LoadRun:
+    def __init__(self, client: httpx.AsyncClient, manifest: dict, seed: int):
+        self.client = client
+        self.manifest = manifest
+        self.rng = random.Random(seed)
+        self.password = manifest["password"]
+        self.emails = {user["id"]: user["email"] for user in manifest["users"]}
+        self.groups = [group for group in manifest["groups"] if group["members"]]
+        self.invites = list(manifest["invites"])
+        self.tokens: dict[int, str] = {} #user id -> jwt, filled by setup()
+        self.signups = count()
+        self.samples: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+
+    async def _timed(self, flow: str, method: str, url: str, **kwargs) -> httpx.Response | None:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[flow] += 1
+            return None
+        elapsed = (time.perf_counter() - started) * 1000
+        if response.status_code >= 400:
+            self.errors[flow] += 1
+        else:
+            self.samples[flow].append(elapsed)
+        return response
+
+    def _headers(self, user_id: int) -> dict[str, str]:
+        return {"Authorization": f"Bearer {self.tokens[user_id]}"}
+
+    async def setup(self, pool_size: int) -> None:
+        """Logs in a pool of group members up front so the measured flows don't all start with a login"""
+        members = sorted({uid for group in self.groups for uid in group["members"]})
+        for user_id in self.rng.sample(members, min(pool_size, len(members))):
+            response = await self.client.post("/auth/login", json={"email": self.emails[user_id], "pw": self.password})
+            response.raise_for_status()
+            self.tokens[user_id] = response.json()["access_token"]
+        self.groups = [group for group in self.groups if any(uid in self.tokens for uid in group["members"])]
+
+    def _member_and_group(self) -> tuple[int, dict]:
+        group = self.rng.choice(self.groups)
+        user_id = self.rng.choice([uid for uid in group["members"] if uid in self.tokens])
+        return user_id, group
+
+    # ******************************************************************************************************************************************************************************************
+    # FLOWS
+    # ******************************************************************************************************************************************************************************************
+    async def login(self) -> None:
+        user_id = self.rng.choice(list(self.tokens))
+        await self._timed("login", "POST", "/auth/login", json={"email": self.emails[user_id], "pw": self.password})
+
+    async def signup(self) -> str | None:
+        email = f"load-{time.time_ns()}-{next(self.signups)}@example.com"
+        response = await self._timed("signup", "POST", "/auth/signup", json={"name": "Load User", "email": email, "pw": self.password})
+        return response.json()["access_token"] if response is not None and response.status_code == 200 else None
+
+    async def view_group(self) -> None:
+        user_id, group = self._member_and_group()
+        await self._timed("view_group", "GET", f"/groups/{group['id']}", headers=self._headers(user_id))
+
+    async def create_expense(self) -> None:
+        user_id, group = self._member_and_group()
+        members = group["members"]
+        amount = round(self.rng.uniform(1, 200), 2)
+        cents, remainder = divmod(round(amount * 100), len(members))
+        payload = {
+            "paid_by_id": user_id,
+            "amount": amount,
+            "description": "load test",
+            "splits": [
+                {"user": {"id": uid, "name": "member"}, "amount": (cents + (1 if i < remainder else 0)) / 100}
+                for i, uid in enumerate(members)
+            ],
+        }
+        await self._timed("create_expense", "POST", f"/expenses/{group['id']}/create-expense", headers=self._headers(user_id), json=payload)
+
+    async def join(self) -> None:
+        # a fresh user every time, otherwise the second join is a 400 "already in group"
+        token = await self.signup()
+        if token is None:
+            return
+        if self.invites:
+            body = {"link_auth": f"http://localhost/join?token={self.invites.pop()}"}
+        else:
+            group = self.rng.choice(self.groups)
+            body = {"pw_auth": {"group_name": group["name"], "group_pw": group["pw"]}}
+        await self._timed("join", "POST", "/groups/join", headers={"Authorization": f"Bearer {token}"}, json=body)
+
+    async def worker(self, mix: dict[str, float], deadline: float) -> None:
+        flows, weights = list(mix), list(mix.values())
+        while time.perf_counter() < deadline:
+            flow = self.rng.choices(flows, weights)[0]
+            await getattr(self, flow)()
+
+    def report(self, elapsed: float) -> dict:
+        flows = {}
+        for flow in sorted(set(self.samples) | set(self.errors)):
+            values = sorted(self.samples[flow])
+            flows[flow] = {
+                "requests": len(values) + self.errors[flow],
+                "errors": self.errors[flow],
+                "throughput_rps": round(len(values) / elapsed, 2),
+                "mean_ms": round(sum(values) / len(values), 2) if values else 0.0,
+                "p50_ms": round(percentile(values, 50), 2),
+                "p95_ms": round(percentile(values, 95), 2),
+                "p99_ms": round(percentile(values, 99), 2),
+            }
+        every = sorted(v for values in self.samples.values() for v in values)
+        flows["all"] = {
+            "requests": len(every) + sum(self.errors.values()),
+            "errors": sum(self.errors.values()),
+            "throughput_rps": round(len(every) / elapsed, 2),
+            "p50_ms": round(percentile(every, 50), 2),
+            "p95_ms": round(percentile(every, 95), 2),
+            "p99_ms": round(percentile(every, 99), 2),
+        }
+        return flows
+
+
+FLOWS = {"login", "signup", "view_group", "create_expense", "join"}
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, previous: dict) -> dict:
+    """Percentage change per flow; positive latency deltas / negative throughput deltas are regressions"""
+    deltas = {}
+    for flow, stats in current["flows"].items():
+        before = previous["flows"].get(flow)
+        if not before:
+            continue
+        deltas[flow] = {
+            key: round((stats[key] - before[key]) / before[key] * 100, 1) if before[key] else None
+            for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+        }
+    return {"against": previous["meta"].get("git_commit"), "percent_change": deltas}
+
+
+async def run(args) -> dict:
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        load = LoadRun(client, manifest, seed=args.seed)
+        await load.setup(pool_size=args.user_pool)
+
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(load.worker(args.mix, deadline) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "meta": {
+            "git_commit": _git_commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "base_url": args.base_url,
+            "concurrency": args.concurrency,
+            "duration_s": round(elapsed, 2),
+            "mix": args.mix,
+            "seed": args.seed,
+            "dataset": manifest.get("counts"),
+        },
+        "flows": load.report(elapsed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive concurrent load against a running backend")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--manifest", default="bench_manifest.json", help="written by benchmarks.datagen")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--mix", type=_parse_mix, default=DEFAULT_MIX, help=f"flow=weight,... (default {DEFAULT_MIX})")
+    parser.add_argument("--user-pool", type=int, default=50, help="members logged in during setup")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="write the json report here as well as stdout")
+    parser.add_argument("--compare", help="previous json report to diff against")
+    args = parser.parse_args()
+    if isinstance(args.mix, str):
+        args.mix = _parse_mix(args.mix)
+
+    result = asyncio.run(run(args))
+    if args.compare:
+        with open(args.compare) as f:
+            result["comparison"] = compare(result, json.load(f))
+
+    output = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
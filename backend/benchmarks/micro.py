@@ -0,0 +1,253 @@
+# microbenchmarks for the pure-python hot paths; jwt, request validation, group loading, response serialization, balance arithmetic
+# runs offline against an in-memory sqlite db and compares time per call + peak allocations against stored baselines
+# usage (from backend/):
+#   python -m benchmarks.micro                    compare against benchmarks/baselines.json, exit 1 on regression
+#   python -m benchmarks.micro --update-baseline  record new baselines (do this on the machine you compare on)
+#   python -m benchmarks.micro -k serialize       only benchmarks whose name contains "serialize"
+#   python -m benchmarks.micro --sizes            response payload sizes, raw and per compression codec
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+
+# same trick as tests/conftest.py: settings need env vars, and app.db.session connects on import
+for key, value in {
+    "database_user": "bench", "database_pw": "bench", "database_name": "bench", "jwt_secret_key": "bench-secret",
+    "jwt_algorithm": "HS256", "jwt_expiration_minutes": "60", "log_format": "%(message)s", "base_logger_name": "bench",
+}.items():
+    os.environ.setdefault(key, value)
+
+from app.core import config as config_module
+
+config_module.Settings.database_url = property(lambda self: "sqlite://")
+
+import msgpack
+from sqlalchemy.orm import Session
+
+from app.db.session import engine
+from app.db.models import User, Group, GroupMembers, Expense, ExpenseSplit
+from app.db.schemas import ExpenseCreate, GroupOutAdapter
+from app.core.security import create_access_token, decode_access_token
+from app.core.compression import _Gzip, _Brotli, _Zstd, brotli, zstandard
+from app.core.responses import FastJSONResponse, ColumnarResponse, COLUMNAR_JSON, COLUMNAR_MSGPACK
+from app.services.group_service import combine_balances, calculate_balances
+from app.services.group_read_model import load_group_view, to_columnar
+
+
+BASELINE_PATH = Path(__file__).with_name("baselines.json")
+DEFAULT_THRESHOLD = 0.25 #fail when more than 25% slower than baseline; microbenchmarks are noisy
+SEED = 99
+
+
+def _expense_payload(splits: int) -> dict:
+    return {
+        "paid_by_id": 1,
+        "amount": splits * 10.0,
+        "description": "bench",
+        "splits": [{"user": {"id": i, "name": f"user{i}"}, "amount": 10.0} for i in range(1, splits + 1)],
+    }
+
+
+def _seed_group(session: Session, members: int, expenses: int) -> int:
+    rng = random.Random(SEED)
+    users = [User(name=f"user{i}", email=f"user{i}@example.com", pw="hashed") for i in range(members)]
+    group = Group(name=f"bench-{members}-{expenses}", pw="pw", emoji="🏠")
+    session.add_all(users + [group])
+    session.flush()
+    session.add_all([GroupMembers(user_id=user.id, group_id=group.id) for user in users])
+    for _ in range(expenses):
+        payer = rng.choice(users)
+        expense = Expense(amount=members * 1000, description="bench", group_id=group.id, paid_by_id=payer.id, created_by_id=payer.id)
+        expense.splits = [ExpenseSplit(user_id=user.id, amount=1000) for user in users]
+        session.add(expense)
+    session.flush()
+    return group.id
+
+
+def _seed_compact_group(session: Session, members: int, expenses: int) -> int:
+    """Compact equal splits only; most over the whole group, the rest over one of a few subsets, as groups tend to split"""
+    rng = random.Random(SEED)
+    users = [User(name=f"compact{i}", email=f"compact{i}@example.com", pw="hashed") for i in range(members)]
+    group = Group(name=f"bench-compact-{members}-{expenses}", pw="pw", emoji=None)
+    session.add_all(users + [group])
+    session.flush()
+    session.add_all([GroupMembers(user_id=user.id, group_id=group.id) for user in users])
+    everyone = sorted(user.id for user in users)
+    subsets = [everyone] * 4 + [sorted(rng.sample(everyone, rng.randint(2, members))) for _ in range(16)]
+    for _ in range(expenses):
+        payer = rng.choice(users)
+        session.add(Expense(
+            amount=rng.randint(100, 100_000), description="bench", group_id=group.id, paid_by_id=payer.id, created_by_id=payer.id,
+            equal_split_user_ids=rng.choice(subsets),
+        ))
+    session.flush()
+    return group.id
+
+
+def _loaded_group(session: Session, members: int, expenses: int):
+    group = load_group_view(group_id=_seed_group(session, members, expenses), db=session)
+    for member in group.members:
+        member.balance = 0
+    return group
+
+
+def _compress(factory, body: bytes):
+    compressor = factory()
+    return compressor.compress(body) + compressor.finish()
+
+
+def _codecs() -> dict:
+    """gzip at fast/default/small levels, plus brotli and zstd when installed"""
+    codecs = {"gzip_l1": lambda: _Gzip(1), "gzip_l6": lambda: _Gzip(6), "gzip_l9": lambda: _Gzip(9)}
+    if brotli is not None:
+        codecs |= {"br_q4": lambda: _Brotli(4), "br_q9": lambda: _Brotli(9)}
+    if zstandard is not None:
+        codecs |= {"zstd_l3": lambda: _Zstd(3), "zstd_l9": lambda: _Zstd(9)}
+    return codecs
+
+
+def _compression_benchmarks(bodies: dict[str, bytes]) -> dict:
+    return {
+        f"compress_{body_name}_{codec}": (lambda factory=factory, body=body: _compress(factory, body))
+        for body_name, body in bodies.items() for codec, factory in _codecs().items()
+    }
+
+
+def print_sizes(payloads: dict[str, bytes]) -> None:
+    """Bandwidth side of the compression trade-off; wire size per payload and codec"""
+    codecs = _codecs()
+    print(f"{'payload':<26}{'raw':>10}" + "".join(f"{codec:>10}" for codec in codecs))
+    for name, body in payloads.items():
+        print(f"{name:<26}{len(body):>10}" + "".join(f"{len(_compress(factory, body)):>10}" for factory in codecs.values()))
+
+
+def build_benchmarks(session: Session) -> tuple[dict, dict[str, bytes]]:
+    """(name -> zero-arg callable, response payloads); setup (seeding, loading) happens here and is not timed"""
+    token = create_access_token(user_id=123)
+    payload_10, payload_100, payload_1000 = (_expense_payload(n) for n in (10, 100, 1000))
+    small_group = _loaded_group(session, members=5, expenses=20)
+    big_group = _loaded_group(session, members=20, expenses=500)
+
+    compact_group_id = _seed_compact_group(session, members=50, expenses=10_000)
+
+    # what a client downloads and parses for the big group, nested vs columnar
+    nested_json = FastJSONResponse(big_group, GroupOutAdapter).body
+    columnar_json = ColumnarResponse(to_columnar(big_group), COLUMNAR_JSON).body
+    columnar_msgpack = ColumnarResponse(to_columnar(big_group), COLUMNAR_MSGPACK).body
+
+    rng = random.Random(SEED)
+    paid_rows = [(user_id, rng.uniform(0, 10_000)) for user_id in range(200)]
+    owed_rows = [(user_id, rng.uniform(0, 10_000)) for user_id in range(200)]
+
+    payloads = {"group_out_20x500": nested_json, "columnar_json_20x500": columnar_json, "columnar_msgpack_20x500": columnar_msgpack}
+    return {
+        "jwt_encode": lambda: create_access_token(user_id=123),
+        "jwt_decode": lambda: decode_access_token(token),
+        "validate_expense_create_10_splits": lambda: ExpenseCreate.model_validate(payload_10),
+        "validate_expense_create_100_splits": lambda: ExpenseCreate.model_validate(payload_100),
+        "validate_expense_create_1000_splits": lambda: ExpenseCreate.model_validate(payload_1000),
+        "load_group_read_model_20x500": lambda: load_group_view(group_id=big_group.id, db=session),
+        "serialize_group_out_5x20": lambda: FastJSONResponse(small_group, GroupOutAdapter).body,
+        "serialize_group_out_20x500": lambda: FastJSONResponse(big_group, GroupOutAdapter).body,
+        "serialize_group_columnar_json_20x500": lambda: ColumnarResponse(to_columnar(big_group), COLUMNAR_JSON).body,
+        "serialize_group_columnar_msgpack_20x500": lambda: ColumnarResponse(to_columnar(big_group), COLUMNAR_MSGPACK).body,
+        "parse_group_out_json_20x500": lambda: json.loads(nested_json),
+        "parse_group_columnar_json_20x500": lambda: json.loads(columnar_json),
+        "parse_group_columnar_msgpack_20x500": lambda: msgpack.unpackb(columnar_msgpack),
+        "combine_balances_200_members": lambda: combine_balances(paid_rows, owed_rows),
+        "calculate_balances_compact_50x10000": lambda: calculate_balances(group_id=compact_group_id, db=session),
+        **_compression_benchmarks({"group_out_20x500": nested_json, "columnar_json_20x500": columnar_json}),
+    }, payloads
+
+
+def measure(func, repeat: int, min_time: float) -> float:
+    """Best of `repeat` runs, in microseconds per call; loop count is picked so one run takes >= min_time"""
+    timer = timeit.Timer(func)
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+
+
+def peak_memory(func) -> float:
+    """Peak KiB allocated during one call, including whatever the result keeps alive"""
+    func() #warm caches (compiled sql, schema) so they aren't billed to the call
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the microbenchmark suite")
+    parser.add_argument("-k", dest="filter", help="only run benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.1, help="seconds per timed run")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown / memory growth, 0.25 = 25%%")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--json", action="store_true", help="print results as json")
+    parser.add_argument("--sizes", action="store_true", help="only print payload sizes per compression codec")
+    args = parser.parse_args()
+
+    baselines = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    results = {}
+    with Session(engine) as session:
+        benchmarks, payloads = build_benchmarks(session)
+        if args.sizes:
+            print_sizes(payloads)
+            return
+        for name, func in benchmarks.items():
+            if args.filter and args.filter not in name:
+                continue
+            results[name] = {
+                "us_per_call": round(measure(func, args.repeat, args.min_time), 3),
+                "peak_kib": round(peak_memory(func), 1),
+            }
+        session.rollback()
+
+    regressions = []
+    report = {}
+    for name, result in results.items():
+        baseline = baselines.get(name, {})
+        row = report[name] = {}
+        for metric, value in result.items():
+            before = baseline.get(metric)
+            change = (value - before) / before if before else None
+            row[metric] = {"value": value, "baseline": before, "change": round(change, 3) if change is not None else None}
+            if change is not None and change > args.threshold:
+                regressions.append(f"{name} ({metric})")
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{'benchmark':<38}{'us/call':>14}{'baseline':>14}{'change':>9}{'peak KiB':>12}{'baseline':>12}{'change':>9}")
+        for name, row in report.items():
+            cells = []
+            for metric, width in (("us_per_call", 14), ("peak_kib", 12)):
+                cell = row[metric]
+                cells.append(f"{cell['value']:>{width}.1f}")
+                cells.append(f"{cell['baseline']:>{width}.1f}" if cell["baseline"] else f"{'-':>{width}}")
+                cells.append(f"{cell['change']:>+9.1%}" if cell["change"] is not None else f"{'-':>9}")
+            print(f"{name:<38}{''.join(cells)}")
+
+    if args.update_baseline:
+        baselines.update(results)
+        BASELINE_PATH.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        print(f"baselines written to {BASELINE_PATH}")
+        return
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
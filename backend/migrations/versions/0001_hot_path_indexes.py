@@ -0,0 +1,41 @@
+"""hot path indexes
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# if_not_exists: databases created by create_all on startup already have these
+INDEXES = [
+    ("ix_user_email", "user", ["email"]),
+    ("ix_group_name", "group", ["name"]),
+    ("ix_group_members_group_id", "group_members", ["group_id"]),
+    ("ix_expense_group_id_paid_by_id", "expense", ["group_id", "paid_by_id"]),
+    ("ix_expense_split_expense_id", "expense_split", ["expense_id"]),
+    ("ix_expense_split_user_id", "expense_split", ["user_id"]),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,28 @@
+"""expense (group_id, id) index for limited expense listings
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("ix_expense_group_id_id", "expense", ["group_id", "id"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_expense_group_id_id", table_name="expense", if_exists=True)
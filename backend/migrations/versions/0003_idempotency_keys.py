@@ -0,0 +1,43 @@
+"""idempotency keys for mutation endpoints
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "idempotency_key",
+        sa.Column("id", sa.Integer(), autoincrement=True, primary_key=True),
+        sa.Column("key", sa.String(255), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("user.id"), nullable=False),
+        sa.Column("request_hash", sa.String(64), nullable=False),
+        sa.Column("status_code", sa.Integer()),
+        sa.Column("media_type", sa.String()),
+        sa.Column("response_body", sa.LargeBinary()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        sa.UniqueConstraint("user_id", "key", name="uq_idempotency_key_user_id_key"),
+        if_not_exists=True,
+    )
+    op.create_index("ix_idempotency_key_expires_at", "idempotency_key", ["expires_at"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_idempotency_key_expires_at", table_name="idempotency_key", if_exists=True)
+    op.drop_table("idempotency_key", if_exists=True)
@@ -0,0 +1,29 @@
+"""expense version column for optimistic concurrency control
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # server default fills existing rows without rewriting them one by one (postgres 11+ stores it as metadata)
+    op.add_column("expense", sa.Column("version", sa.Integer(), nullable=False, server_default="1"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("expense", "version")
@@ -0,0 +1,46 @@
+"""store money as integer minor units (cents)
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+AMOUNT_COLUMNS = [("expense", "amount"), ("expense_split", "amount")]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # rewrites both tables once; round() so 0.1 + 0.2 style float noise lands on the intended cent
+    for table, column in AMOUNT_COLUMNS:
+        op.alter_column(
+            table, column,
+            type_=sa.BigInteger(),
+            existing_type=sa.Float(),
+            existing_nullable=False,
+            postgresql_using=f"round({column} * 100)::bigint",
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, column in AMOUNT_COLUMNS:
+        op.alter_column(
+            table, column,
+            type_=sa.Float(),
+            existing_type=sa.BigInteger(),
+            existing_nullable=False,
+            postgresql_using=f"{column} / 100.0",
+        )
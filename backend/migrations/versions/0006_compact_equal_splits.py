@@ -0,0 +1,40 @@
+"""compact storage for equal splits
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, Sequence[str], None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # nullable, no default: existing expenses keep their expense_split rows
+    op.add_column("expense", sa.Column("equal_split_user_ids", sa.JSON(none_as_null=True)))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # expand compact splits back into rows before the column goes, or those expenses would lose their splits
+    bind = op.get_bind()
+    expense = sa.table("expense", sa.column("id"), sa.column("amount"), sa.column("equal_split_user_ids", sa.JSON(none_as_null=True)))
+    expense_split = sa.table("expense_split", sa.column("expense_id"), sa.column("user_id"), sa.column("amount"))
+    rows = []
+    for expense_id, amount, user_ids in bind.execute(sa.select(expense.c.id, expense.c.amount, expense.c.equal_split_user_ids).where(expense.c.equal_split_user_ids.is_not(None))):
+        share, remainder = divmod(abs(amount), len(user_ids))
+        sign = -1 if amount < 0 else 1
+        rows += [{"expense_id": expense_id, "user_id": user_id, "amount": sign * (share + (1 if i < remainder else 0))} for i, user_id in enumerate(user_ids)]
+    if rows:
+        op.bulk_insert(expense_split, rows)
+    op.drop_column("expense", "equal_split_user_ids")
@@ -0,0 +1,37 @@
+"""expense created_at / occurred_at and the (group_id, occurred_at) index
+
+Listings are ordered by occurred_at now, so (group_id, occurred_at) replaces (group_id, id).
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, Sequence[str], None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # existing expenses have no recorded time; they all get the migration time (server default, no row rewrite on postgres 11+)
+    op.add_column("expense", sa.Column("occurred_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()))
+    op.add_column("expense", sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()))
+    op.create_index("ix_expense_group_id_occurred_at", "expense", ["group_id", "occurred_at"], if_not_exists=True)
+    op.drop_index("ix_expense_group_id_id", table_name="expense", if_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index("ix_expense_group_id_id", "expense", ["group_id", "id"], if_not_exists=True)
+    op.drop_index("ix_expense_group_id_occurred_at", table_name="expense", if_exists=True)
+    op.drop_column("expense", "created_at")
+    op.drop_column("expense", "occurred_at")
@@ -0,0 +1,82 @@
+"""monthly_rollup: paid/owed totals and counts per group, month and member
+
+Filled here from the existing expenses; afterwards the expense write paths keep it current and
+app.jobs.backfill_rollups rebuilds it if it ever drifts.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from collections import defaultdict
+from datetime import date, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, Sequence[str], None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    monthly_rollup = op.create_table(
+        "monthly_rollup",
+        sa.Column("group_id", sa.Integer(), sa.ForeignKey("group.id"), primary_key=True),
+        sa.Column("month", sa.Date(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("user.id"), primary_key=True),
+        sa.Column("paid_total", sa.BigInteger(), nullable=False),
+        sa.Column("paid_count", sa.Integer(), nullable=False),
+        sa.Column("owed_total", sa.BigInteger(), nullable=False),
+        sa.Column("owed_count", sa.Integer(), nullable=False),
+    )
+
+    # same math as app.services.rollup_service, inlined so the migration doesn't depend on app code
+    bind = op.get_bind()
+    expense = sa.table("expense", sa.column("id"), sa.column("group_id"), sa.column("amount"), sa.column("paid_by_id"),
+                       sa.column("occurred_at", sa.DateTime(timezone=True)), sa.column("equal_split_user_ids", sa.JSON(none_as_null=True)))
+    expense_split = sa.table("expense_split", sa.column("expense_id"), sa.column("user_id"), sa.column("amount"))
+
+    # merged per user like rollup_service.shares_of; data from before splits were reconciled can list a user twice
+    split_rows = defaultdict(dict)
+    for expense_id, user_id, amount in bind.execute(sa.select(expense_split.c.expense_id, expense_split.c.user_id, expense_split.c.amount)):
+        shares = split_rows[expense_id]
+        shares[user_id] = shares.get(user_id, 0) + amount
+
+    totals = defaultdict(lambda: [0, 0, 0, 0])
+    for expense_id, group_id, amount, paid_by_id, occurred_at, user_ids in bind.execute(
+        sa.select(expense.c.id, expense.c.group_id, expense.c.amount, expense.c.paid_by_id, expense.c.occurred_at, expense.c.equal_split_user_ids)
+    ):
+        if occurred_at.tzinfo is not None:
+            occurred_at = occurred_at.astimezone(timezone.utc)
+        month = date(occurred_at.year, occurred_at.month, 1)
+        paid = totals[(group_id, month, paid_by_id)]
+        paid[0] += amount
+        paid[1] += 1
+        if user_ids is not None:
+            share, remainder = divmod(abs(amount), len(user_ids))
+            sign = -1 if amount < 0 else 1
+            shares = {user_id: sign * (share + (1 if i < remainder else 0)) for i, user_id in enumerate(sorted(user_ids))}
+        else:
+            shares = split_rows.get(expense_id, {})
+        for user_id, share in shares.items():
+            owed = totals[(group_id, month, user_id)]
+            owed[2] += share
+            owed[3] += 1
+
+    rows = [
+        {"group_id": group_id, "month": month, "user_id": user_id, "paid_total": paid_total, "paid_count": paid_count, "owed_total": owed_total, "owed_count": owed_count}
+        for (group_id, month, user_id), (paid_total, paid_count, owed_total, owed_count) in totals.items()
+    ]
+    if rows:
+        op.bulk_insert(monthly_rollup, rows)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("monthly_rollup")
@@ -0,0 +1,91 @@
+"""expense_event (append-only log of expense mutations) and balance_snapshot
+
+Every existing expense gets a "created" event at its created_at, carrying its current state, so point-in-time
+balances are right from here on and approximate (edits made before this revision are unknown) before it.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from collections import defaultdict
+from datetime import timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, Sequence[str], None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    expense_event = op.create_table(
+        "expense_event",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("group_id", sa.Integer(), sa.ForeignKey("group.id"), nullable=False),
+        sa.Column("expense_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("user.id")),
+        sa.Column("kind", sa.String(16), nullable=False),
+        sa.Column("recorded_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.Column("data", sa.JSON(), nullable=False),
+        sa.Column("balance_delta", sa.JSON(), nullable=False),
+    )
+    op.create_index("ix_expense_event_group_id_id", "expense_event", ["group_id", "id"])
+    op.create_index("ix_expense_event_expense_id", "expense_event", ["expense_id"])
+    op.create_table(
+        "balance_snapshot",
+        sa.Column("group_id", sa.Integer(), sa.ForeignKey("group.id"), primary_key=True),
+        sa.Column("event_id", sa.Integer(), primary_key=True),
+        sa.Column("as_of", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("balances", sa.JSON(), nullable=False),
+    )
+
+    # same shares as app.services.split_strategies, inlined so the migration doesn't depend on app code
+    bind = op.get_bind()
+    expense = sa.table("expense", sa.column("id"), sa.column("group_id"), sa.column("amount"), sa.column("description"), sa.column("paid_by_id"),
+                       sa.column("created_by_id"), sa.column("occurred_at", sa.DateTime(timezone=True)), sa.column("created_at", sa.DateTime(timezone=True)),
+                       sa.column("equal_split_user_ids", sa.JSON(none_as_null=True)))
+    expense_split = sa.table("expense_split", sa.column("expense_id"), sa.column("user_id"), sa.column("amount"))
+
+    split_rows = defaultdict(dict)
+    for expense_id, user_id, amount in bind.execute(sa.select(expense_split.c.expense_id, expense_split.c.user_id, expense_split.c.amount)):
+        split_rows[expense_id][user_id] = split_rows[expense_id].get(user_id, 0) + amount
+
+    events = []
+    rows = bind.execute(sa.select(
+        expense.c.id, expense.c.group_id, expense.c.amount, expense.c.description, expense.c.paid_by_id, expense.c.created_by_id,
+        expense.c.occurred_at, expense.c.created_at, expense.c.equal_split_user_ids,
+    ).order_by(expense.c.created_at, expense.c.id))
+    for expense_id, group_id, amount, description, paid_by_id, created_by_id, occurred_at, created_at, user_ids in rows:
+        if user_ids is not None:
+            share, remainder = divmod(abs(amount), len(user_ids))
+            sign = -1 if amount < 0 else 1
+            shares = {user_id: sign * (share + (1 if i < remainder else 0)) for i, user_id in enumerate(sorted(user_ids))}
+        else:
+            shares = split_rows.get(expense_id, {})
+        delta = defaultdict(int, {paid_by_id: amount})
+        for user_id, cents in shares.items():
+            delta[user_id] -= cents
+        occurred_at = occurred_at.replace(tzinfo=timezone.utc) if occurred_at.tzinfo is None else occurred_at.astimezone(timezone.utc)
+        events.append({
+            "group_id": group_id, "expense_id": expense_id, "user_id": created_by_id, "kind": "created", "recorded_at": created_at,
+            "data": {"amount": amount, "description": description, "paid_by_id": paid_by_id, "occurred_at": occurred_at.isoformat(),
+                     "shares": {str(user_id): cents for user_id, cents in shares.items()}},
+            "balance_delta": {str(user_id): cents for user_id, cents in delta.items() if cents},
+        })
+    if events:
+        op.bulk_insert(expense_event, events)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("balance_snapshot")
+    op.drop_index("ix_expense_event_expense_id", table_name="expense_event")
+    op.drop_index("ix_expense_event_group_id_id", table_name="expense_event")
+    op.drop_table("expense_event")
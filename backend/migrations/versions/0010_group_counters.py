@@ -0,0 +1,53 @@
+"""denormalized group counters: member_count, expense_count, total_spent, last_activity_at
+
+Filled from group_members / expense / expense_event here; afterwards the write paths keep them current.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, Sequence[str], None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("group", sa.Column("member_count", sa.Integer(), nullable=False, server_default="0"))
+    op.add_column("group", sa.Column("expense_count", sa.Integer(), nullable=False, server_default="0"))
+    op.add_column("group", sa.Column("total_spent", sa.BigInteger(), nullable=False, server_default="0"))
+    op.add_column("group", sa.Column("last_activity_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()))
+
+    group = sa.table("group", sa.column("id"), sa.column("member_count"), sa.column("expense_count"), sa.column("total_spent"), sa.column("last_activity_at"))
+    group_members = sa.table("group_members", sa.column("group_id"))
+    expense = sa.table("expense", sa.column("group_id"), sa.column("amount"))
+    expense_event = sa.table("expense_event", sa.column("group_id"), sa.column("recorded_at"))
+    op.execute(
+        group.update().values(
+            member_count=sa.select(sa.func.count()).select_from(group_members).where(group_members.c.group_id == group.c.id).scalar_subquery(),
+            expense_count=sa.select(sa.func.count()).select_from(expense).where(expense.c.group_id == group.c.id).scalar_subquery(),
+            total_spent=sa.select(sa.func.coalesce(sa.func.sum(expense.c.amount), 0)).where(expense.c.group_id == group.c.id).scalar_subquery(),
+            # groups without any expense history keep the migration time
+            last_activity_at=sa.func.coalesce(
+                sa.select(sa.func.max(expense_event.c.recorded_at)).where(expense_event.c.group_id == group.c.id).scalar_subquery(),
+                group.c.last_activity_at,
+            ),
+        )
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("group", "last_activity_at")
+    op.drop_column("group", "total_spent")
+    op.drop_column("group", "expense_count")
+    op.drop_column("group", "member_count")
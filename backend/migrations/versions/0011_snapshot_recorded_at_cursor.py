@@ -0,0 +1,37 @@
+"""balance snapshots cover events by recorded_at instead of id
+
+Snapshots taken so far covered every event up to their event_id, which can miss a lower id that committed late.
+They are derived data, so they are dropped here; the next app.jobs.snapshot_balances run takes them again.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19 23:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0011'
+down_revision: Union[str, Sequence[str], None] = '0010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(sa.text("DELETE FROM balance_snapshot"))
+    op.drop_index("ix_expense_event_group_id_id", table_name="expense_event")
+    op.create_index("ix_expense_event_group_id_recorded_at", "expense_event", ["group_id", "recorded_at"])
+    op.create_index("ix_balance_snapshot_group_id_as_of", "balance_snapshot", ["group_id", "as_of"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(sa.text("DELETE FROM balance_snapshot")) #as_of no longer means what the old code expects
+    op.drop_index("ix_balance_snapshot_group_id_as_of", table_name="balance_snapshot")
+    op.drop_index("ix_expense_event_group_id_recorded_at", table_name="expense_event")
+    op.create_index("ix_expense_event_group_id_id", "expense_event", ["group_id", "id"])
@@ -0,0 +1,32 @@
+# max queries per API call, enforced by the BudgetedTestClient in tests/conftest.py
+# savepoints from the test harness aren't counted. Users already in the test session's identity map are
+# also free (Session.get), so auth lookups often cost 0 here. Keep these tight so new N+1 patterns fail loudly
+# mutations sent with an Idempotency-Key cost 3 more (key lookup, reservation insert, stored response update)
+QUERY_BUDGETS = {
+    # auth
+    "POST /auth/signup": 2,
+    "POST /auth/login": 1,
+
+    # groups; the group view is two reads (group + members, expenses + splits), see services/group_read_model.py,
+    # and three balance sums (paid, owed split rows, compact equal splits)
+    "POST /groups/create": 10,
+    "POST /groups/join": 11, #membership insert + counter bump, then the same view as GET /groups/{group_id}
+    "GET /groups/view-short": 2,
+    "GET /groups/{group_id}": 7,
+    "GET /groups/{group_id}/create-invite": 4,
+    "GET /groups/{group_id}/analytics": 2,
+    "GET /groups/{group_id}/balance-history": 3, #opening balance from the rollups + the window's expenses
+    "GET /groups/{group_id}/balances-at": 3, #nearest snapshot + the events after it
+
+    # expenses; sqlite can't batch INSERT .. RETURNING, so every split is its own insert here (postgres batches them).
+    # each write also upserts the monthly rollups (one statement however many rows move), appends an expense_event
+    # and bumps the group's counters. Creates and edits that carry splits read the member ids to check them
+    "POST /expenses/{group_id}/create-expense": 13,
+    "POST /expenses/{group_id}/edit-expense": 10,
+    "POST /expenses/{group_id}/delete-expense": 12,
+
+    # operational
+    "GET /metrics": 0,
+    "GET /admin/slow-queries": 0,
+    "GET /admin/traces": 0,
+}
@@ -68,6 +68,74 @@ def test_create_expense_success(client, db_session):
     assert stored is not None
 
 
+def test_create_expense_amounts_are_exact_cents(client, db_session):
+    user = _create_user(db_session, "Penny", "penny@example.com")
+    group = Group(name="Cents", pw="pw", emoji=None)
+    db_session.add(group)
+    db_session.flush()
+    _ensure_membership(db_session, group, user)
+    headers = _auth_headers_for_user(user)
+
+    payload = {
+        "paid_by_id": user.id,
+        "amount": 0.1 + 0.2, #0.30000000000000004 from a js client
+        "description": "Gum",
+        "splits": [{"user": {"id": user.id, "name": user.name}, "amount": "0.305"}],
+    }
+    response = client.post(f"/expenses/{group.id}/create-expense", headers=headers, json=payload)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["amount"] == 0.3
+    assert body["splits"][0]["amount"] == 0.31 #half up
+    stored = db_session.query(Expense).filter(Expense.group_id == group.id).one()
+    assert (stored.amount, stored.splits[0].amount) == (30, 31)
+
+    for bad in ["NaN", "twelve", True]:
+        response = client.post(f"/expenses/{group.id}/create-expense", headers=headers, json={**payload, "amount": bad})
+        assert response.status_code == 422
+
+
+def test_create_expense_with_equal_split_rule(client, db_session):
+    user = _create_user(db_session, "Splitter", "splitter@example.com")
+    others = [_create_user(db_session, f"Member{i}", f"member{i}@example.com") for i in range(2)]
+    group = Group(name="Rules", pw="pw", emoji=None)
+    db_session.add(group)
+    db_session.flush()
+    for member in [user, *others]:
+        _ensure_membership(db_session, group, member)
+
+    # no per-member payload: the server splits over the group's members
+    payload = {"paid_by_id": user.id, "amount": 10.0, "description": "Pizza", "split": {"kind": "equal"}}
+    response = client.post(f"/expenses/{group.id}/create-expense", headers=_auth_headers_for_user(user), json=payload)
+
+    assert response.status_code == 200
+    amounts = {split["user"]["id"]: split["amount"] for split in response.json()["splits"]}
+    assert amounts == {user.id: 3.34, others[0].id: 3.33, others[1].id: 3.33}
+    stored = db_session.query(Expense).filter(Expense.group_id == group.id).one()
+    assert stored.splits == [] #kept as the participant ids, see test_expense_service
+
+    both = {**payload, "splits": [{"user": {"id": user.id, "name": user.name}, "amount": 10.0}]}
+    assert client.post(f"/expenses/{group.id}/create-expense", headers=_auth_headers_for_user(user), json=both).status_code == 422
+
+
+def test_create_expense_rejects_non_member_equal_split(client, db_session):
+    user = _create_user(db_session, "Gatekeeper", "gatekeeper@example.com")
+    group = Group(name="Members only", pw="pw", emoji=None)
+    db_session.add(group)
+    db_session.flush()
+    _ensure_membership(db_session, group, user)
+    db_session.commit() #releases the savepoint, so the endpoint's rollback keeps the group
+    headers = _auth_headers_for_user(user)
+
+    payload = {"paid_by_id": user.id, "amount": 10.0, "description": "Ghost", "split": {"kind": "equal", "user_ids": [user.id, 99999]}}
+    response = client.post(f"/expenses/{group.id}/create-expense", headers=headers, json=payload)
+
+    assert response.status_code == 400
+    assert db_session.query(Expense).filter(Expense.group_id == group.id).count() == 0
+    assert client.get(f"/groups/{group.id}", headers=headers).status_code == 200
+
+
 def test_create_expense_failure(client, auth_header, db_session, monkeypatch):
     user = _create_user(db_session, "Tester", "tester@example.com")
     group = Group(name="GhostGroup", pw="pw", emoji=None)
@@ -108,6 +176,7 @@ def test_edit_expense_success(client, db_session):
     headers = _auth_headers_for_user(user)
     update_payload = {
         "id": expense.id,
+        "version": 1,
         "expense": {
             "paid_by_id": roommate.id,
             "amount": 50.0,
@@ -126,6 +195,49 @@ def test_edit_expense_success(client, db_session):
     assert body["amount"] == 50.0
     assert body["description"] == "Updated Utilities"
     assert body["paid_by"]["id"] == roommate.id
+    assert body["version"] == 2
+
+
+def test_edit_expense_rejects_non_member_split(client, db_session):
+    user = _create_user(db_session, "Bouncer", "bouncer@example.com")
+    outsider = _create_user(db_session, "Outsider", "outsider@example.com")
+    group = Group(name="Closed", pw="pw", emoji=None)
+    db_session.add(group)
+    db_session.flush()
+    _ensure_membership(db_session, group, user)
+    expense = _create_expense(db_session, group, user, splits=[(user, 10.0)], amount=10.0)
+
+    payload = {
+        "id": expense.id,
+        "version": 1,
+        "expense": {"paid_by_id": user.id, "amount": 10.0, "description": None, "split": {"kind": "shares", "shares": {user.id: 1, outsider.id: 1}}},
+    }
+    response = client.post(f"/expenses/{group.id}/edit-expense", headers=_auth_headers_for_user(user), json=payload)
+
+    assert response.status_code == 400
+
+
+def test_edit_and_delete_with_stale_version_conflict(client, db_session):
+    user = _create_user(db_session, "Racer", "racer@example.com")
+    group = Group(name="Busy", pw="pw", emoji=None)
+    db_session.add(group)
+    db_session.flush()
+    _ensure_membership(db_session, group, user)
+    expense = _create_expense(db_session, group, user, splits=[(user, 10.0)], amount=10.0, description="Lunch")
+    headers = _auth_headers_for_user(user)
+
+    def edit(version: int, description: str):
+        payload = {"paid_by_id": user.id, "amount": 10.0, "description": description, "splits": [{"user": {"id": user.id, "name": user.name}, "amount": 10.0}]}
+        return client.post(f"/expenses/{group.id}/edit-expense", headers=headers, json={"id": expense.id, "version": version, "expense": payload})
+
+    # two clients both read version 1; the second write loses instead of overwriting the first
+    assert edit(1, "First").status_code == 200
+    conflict = edit(1, "Second")
+    assert conflict.status_code == 409
+
+    stale_delete = client.post(f"/expenses/{group.id}/delete-expense", headers=headers, json={"id": expense.id, "version": 1})
+    assert stale_delete.status_code == 409
+    assert db_session.get(Expense, expense.id).description == "First"
 
 
 def test_edit_expense_not_found(client, db_session, auth_header, monkeypatch):
@@ -144,7 +256,7 @@ def test_edit_expense_not_found(client, db_session, auth_header, monkeypatch):
     response = client.post(
         f"/expenses/{group.id}/edit-expense",
         headers=headers,
-        json={"id": 999, "expense": {"paid_by_id": user.id, "amount": 10.0, "description": "", "splits": []}},
+        json={"id": 999, "version": 1, "expense": {"paid_by_id": user.id, "amount": 10.0, "description": "", "splits": []}},
     )
 
     assert response.status_code == 404
@@ -167,7 +279,7 @@ def test_edit_expense_failure(client, db_session, auth_header, monkeypatch):
     response = client.post(
         f"/expenses/{group.id}/edit-expense",
         headers=headers,
-        json={"id": 1, "expense": {"paid_by_id": user.id, "amount": 10.0, "description": "", "splits": []}},
+        json={"id": 1, "version": 1, "expense": {"paid_by_id": user.id, "amount": 10.0, "description": "", "splits": []}},
     )
 
     assert response.status_code == 500
@@ -187,7 +299,7 @@ def test_delete_expense_success(client, db_session):
     expense = _create_expense(db_session, group, user, splits=[(user, 15.0), (roommate, 15.0)], amount=30.0, description="Snacks")
 
     headers = _auth_headers_for_user(user)
-    payload = {"id": expense.id}
+    payload = {"id": expense.id, "version": 1}
 
     response = client.post(f"/expenses/{group.id}/delete-expense", headers=headers, json=payload)
 
@@ -212,7 +324,7 @@ def test_delete_expense_not_found(client, db_session, auth_header):
     response = client.post(
         f"/expenses/{group.id}/delete-expense",
         headers=headers,
-        json={"id": 999},
+        json={"id": 999, "version": 1},
     )
 
     assert response.status_code == 404
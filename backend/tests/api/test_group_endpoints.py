@@ -1,5 +1,7 @@
+import re
 from datetime import datetime, timedelta, timezone
 
+import msgpack
 import pytest
 
 from app.db.models import Group, GroupMembers, User, GroupInvite
@@ -14,6 +16,7 @@ from app.core.exceptions import (
 from app.services.expense_service import create_expense_service
 from app.db.schemas import ExpenseCreate, ExpenseSplitIn, UserIn
 from app.core.security import create_access_token, hash_password
+from app.core.responses import COLUMNAR_JSON, COLUMNAR_MSGPACK
 
 
 def _create_user(db_session, name: str, email: str) -> User:
@@ -57,7 +60,7 @@ def test_create_group_full_details_failure(client, auth_header, monkeypatch):
     def broken_group_details(*args, **kwargs):
         raise GroupFullDetailsError
 
-    monkeypatch.setattr("app.api.groups.get_full_group_details", broken_group_details)
+    monkeypatch.setattr("app.api.groups.load_group_view", broken_group_details)
 
     response = client.post(
         "/groups/create",
@@ -75,7 +78,7 @@ def test_create_group_not_found(client, auth_header, monkeypatch):
     def not_found(*args, **kwargs):
         raise GroupNotFoundError
 
-    monkeypatch.setattr("app.api.groups.get_full_group_details", not_found)
+    monkeypatch.setattr("app.api.groups.load_group_view", not_found)
 
     response = client.post(
         "/groups/create",
@@ -213,6 +216,22 @@ def test_view_all_groups_success(client, db_session):
     assert len(body) == 2
 
 
+def test_view_all_groups_counters(client, db_session):
+    user = _create_user(db_session, "Dash", "dash@example.com")
+    headers = _auth_headers_for_user(user)
+    group_id = client.post("/groups/create", headers=headers, json={"name": "Dashboard", "group_pw": "pw", "emoji": None}).json()["id"]
+    expense = {"paid_by_id": user.id, "amount": 12.5, "description": "Cake", "split": {"kind": "equal"}}
+    for _ in range(2):
+        assert client.post(f"/expenses/{group_id}/create-expense", headers=headers, json=expense).status_code == 200
+
+    response = client.get("/groups/view-short", headers=headers)
+
+    assert response.status_code == 200
+    (group,) = [group for group in response.json() if group["id"] == group_id]
+    assert (group["member_count"], group["expense_count"], group["total_spent"]) == (1, 2, 25.0)
+    assert group["last_activity_at"]
+
+
 def test_view_all_groups_failure(client, auth_header, monkeypatch):
     headers, _ = auth_header
 
@@ -273,6 +292,222 @@ def test_view_group_failure(client, auth_header, monkeypatch):
     # This ensures the endpoint doesnt even get called if the user isnt a member, and therefore I return a 403 (forbidden) response
 
 
+def _group_with_shared_expense(db_session) -> tuple[Group, User, User]:
+    user = _create_user(db_session, "Ledger", "ledger@example.com")
+    friend = _create_user(db_session, "Pal", "pal@example.com")
+    group = Group(name="Ledger", pw="pw", emoji=None)
+    db_session.add(group)
+    db_session.flush()
+    _ensure_membership(db_session, group, user)
+    _ensure_membership(db_session, group, friend)
+    expense_payload = ExpenseCreate(
+        paid_by_id=user.id,
+        amount=30.0,
+        description="Groceries",
+        splits=[
+            ExpenseSplitIn(user=UserIn(id=user.id, name=user.name), amount=10.0),
+            ExpenseSplitIn(user=UserIn(id=friend.id, name=friend.name), amount=20.0),
+        ],
+    )
+    create_expense_service(new_expense=expense_payload, user_id=user.id, group_id=group.id, db=db_session)
+    return group, user, friend
+
+
+def test_view_group_columnar_json(client, db_session):
+    group, user, friend = _group_with_shared_expense(db_session)
+
+    response = client.get(f"/groups/{group.id}", headers={**_auth_headers_for_user(user), "Accept": COLUMNAR_JSON})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith(COLUMNAR_JSON)
+    assert response.headers["vary"] == "Accept"
+    body = response.json()
+    users = body["users"]
+    assert sorted(users["id"]) == sorted([user.id, friend.id]) #each user listed once
+    assert body["expenses"]["description"] == ["Groceries"]
+    assert users["id"][body["expenses"]["paid_by"][0]] == user.id
+    start, end = body["expenses"]["split_offsets"]
+    split_users = [users["name"][ref] for ref in body["splits"]["user"][start:end]]
+    assert sorted(zip(split_users, body["splits"]["amount"][start:end])) == [("Ledger", 10.0), ("Pal", 20.0)]
+    balances = dict(zip((users["id"][ref] for ref in body["members"]["user"]), body["members"]["balance"]))
+    assert balances == {user.id: 20.0, friend.id: -20.0}
+
+
+def test_view_group_columnar_msgpack(client, db_session):
+    group, user, _ = _group_with_shared_expense(db_session)
+
+    response = client.get(f"/groups/{group.id}", headers={**_auth_headers_for_user(user), "Accept": COLUMNAR_MSGPACK})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == COLUMNAR_MSGPACK
+    body = msgpack.unpackb(response.content)
+    assert body["name"] == "Ledger"
+    assert body["expenses"]["amount"] == [30.0]
+
+
+def test_view_group_defaults_to_json(client, db_session):
+    group, user, _ = _group_with_shared_expense(db_session)
+
+    response = client.get(f"/groups/{group.id}", headers={**_auth_headers_for_user(user), "Accept": "application/json, */*;q=0.5"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert response.json()["expenses"][0]["paid_by"]["name"] == "Ledger"
+
+
+def _expense_statements(client) -> list[str]:
+    # the expense / expense_split tables, not the group's expense_count column
+    return [statement for statement in client.query_counter.statements if re.search(r"\bexpense(_split)?\b", statement.lower())]
+
+
+def test_view_group_include_header_and_balances(client, db_session):
+    group, user, friend = _group_with_shared_expense(db_session)
+
+    response = client.get(f"/groups/{group.id}", params={"include": "balances"}, headers=_auth_headers_for_user(user))
+
+    assert response.status_code == 200
+    body = response.json()
+    assert "expenses" not in body
+    assert {member["id"]: member["balance"] for member in body["members"]} == {user.id: 20.0, friend.id: -20.0}
+
+
+def test_view_group_include_members_skips_expense_queries(client, db_session):
+    group, user, _ = _group_with_shared_expense(db_session)
+
+    response = client.get(f"/groups/{group.id}", params={"include": "members"}, headers=_auth_headers_for_user(user))
+
+    assert response.status_code == 200
+    body = response.json()
+    assert set(body) == {"id", "name", "emoji", "members"}
+    assert all(set(member) == {"id", "name"} for member in body["members"])
+    assert _expense_statements(client) == [] #neither the expense list nor the balance sums were queried
+
+
+def test_view_group_include_expense_limit(client, db_session):
+    group, user, friend = _group_with_shared_expense(db_session)
+    for n in range(3):
+        expense_payload = ExpenseCreate(
+            paid_by_id=friend.id,
+            amount=5.0,
+            description=f"Later {n}",
+            splits=[ExpenseSplitIn(user=UserIn(id=user.id, name=user.name), amount=5.0)],
+        )
+        create_expense_service(new_expense=expense_payload, user_id=friend.id, group_id=group.id, db=db_session)
+
+    response = client.get(f"/groups/{group.id}", params={"include": "expenses(limit=2)"}, headers=_auth_headers_for_user(user))
+
+    assert response.status_code == 200
+    body = response.json()
+    assert set(body) == {"id", "name", "emoji", "expenses"}
+    assert [expense["description"] for expense in body["expenses"]] == ["Later 2", "Later 1"]
+
+
+def test_view_group_time_range(client, db_session):
+    group, user, friend = _group_with_shared_expense(db_session) #occurred now
+    for day, amount in [(datetime(2025, 9, 30, 23, 0), 7.0), (datetime(2025, 10, 1, 9, 30), 3.0), (datetime(2025, 10, 31, 12, 0), 1.0)]:
+        expense_payload = ExpenseCreate(
+            paid_by_id=friend.id,
+            amount=amount,
+            description=f"{day:%b %d}",
+            splits=[ExpenseSplitIn(user=UserIn(id=user.id, name=user.name), amount=amount)],
+            occurred_at=day, #no offset -> utc
+        )
+        create_expense_service(new_expense=expense_payload, user_id=friend.id, group_id=group.id, db=db_session)
+
+    october = {"since": "2025-10-01T00:00:00Z", "until": "2025-11-01T00:00:00Z"}
+    response = client.get(f"/groups/{group.id}", params={"include": "balances,expenses", **october}, headers=_auth_headers_for_user(user))
+
+    assert response.status_code == 200
+    body = response.json()
+    # newest first, september and the "now" expense left out
+    assert [expense["description"] for expense in body["expenses"]] == ["Oct 31", "Oct 01"]
+    assert body["expenses"][0]["occurred_at"].startswith("2025-10-31T12:00:00")
+    # balances only count what happened in the window
+    assert {member["id"]: member["balance"] for member in body["members"]} == {user.id: -4.0, friend.id: 4.0}
+
+    # offsets are honoured: 2025-10-01T03:00+02:00 is 01:00 utc, before the oct 1st expense
+    response = client.get(f"/groups/{group.id}", params={"include": "expenses", "until": "2025-10-01T03:00:00+02:00"}, headers=_auth_headers_for_user(user))
+    assert [expense["description"] for expense in response.json()["expenses"]] == ["Sep 30"]
+
+
+def test_group_analytics(client, db_session):
+    group, user, friend = _group_with_shared_expense(db_session) #occurred now, outside the range below
+    for day, amount in [(datetime(2025, 1, 5), 7.0), (datetime(2025, 1, 20), 3.0), (datetime(2025, 2, 1), 1.0)]:
+        expense_payload = ExpenseCreate(
+            paid_by_id=friend.id,
+            amount=amount,
+            description=f"{day:%b %d}",
+            splits=[ExpenseSplitIn(user=UserIn(id=user.id, name=user.name), amount=amount)],
+            occurred_at=day,
+        )
+        create_expense_service(new_expense=expense_payload, user_id=friend.id, group_id=group.id, db=db_session)
+
+    response = client.get(f"/groups/{group.id}/analytics", params={"since": "2025-01-01", "until": "2025-03-01"}, headers=_auth_headers_for_user(user))
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {"month": "2025-01-01", "user_id": user.id, "paid": 0.0, "paid_count": 0, "owed": 10.0, "owed_count": 2},
+        {"month": "2025-01-01", "user_id": friend.id, "paid": 10.0, "paid_count": 2, "owed": 0.0, "owed_count": 0},
+        {"month": "2025-02-01", "user_id": user.id, "paid": 0.0, "paid_count": 0, "owed": 1.0, "owed_count": 1},
+        {"month": "2025-02-01", "user_id": friend.id, "paid": 1.0, "paid_count": 1, "owed": 0.0, "owed_count": 0},
+    ]
+
+    outsider = _create_user(db_session, "Nosy", "nosy@example.com")
+    assert client.get(f"/groups/{group.id}/analytics", headers=_auth_headers_for_user(outsider)).status_code == 403
+
+
+def test_balance_history(client, db_session):
+    group, user, friend = _group_with_shared_expense(db_session) #now: friend owes user 20
+    for day in range(1, 41):
+        expense_payload = ExpenseCreate(
+            paid_by_id=friend.id,
+            amount=1.0,
+            description="Coffee",
+            splits=[ExpenseSplitIn(user=UserIn(id=user.id, name=user.name), amount=1.0)],
+            occurred_at=datetime(2025, 1, 1) + timedelta(days=day),
+        )
+        create_expense_service(new_expense=expense_payload, user_id=friend.id, group_id=group.id, db=db_session)
+
+    headers = _auth_headers_for_user(user)
+    response = client.get(f"/groups/{group.id}/balance-history", params={"points": 10}, headers=headers)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body) == 10 #41 points downsampled
+    assert body[0] == {"at": "2025-01-02T00:00:00Z", "balance": -1.0}
+    assert body[-1]["balance"] == -20.0 #-40 in coffees, +20 from the groceries
+
+    response = client.get(f"/groups/{group.id}/balance-history", params={"user_id": friend.id, "since": "2025-02-01T00:00:00Z", "until": "2025-02-03T00:00:00Z"}, headers=headers)
+    assert response.json() == [
+        {"at": "2025-02-01T00:00:00Z", "balance": 30.0}, #jan 2-31 from the rollups
+        {"at": "2025-02-01T00:00:00Z", "balance": 31.0},
+        {"at": "2025-02-02T00:00:00Z", "balance": 32.0},
+    ]
+    assert client.get(f"/groups/{group.id}/balance-history", params={"points": 2}, headers=headers).status_code == 422
+
+
+def test_balances_at(client, db_session):
+    group, user, friend = _group_with_shared_expense(db_session) #user paid 30, friend owes 20
+    headers = _auth_headers_for_user(user)
+    later = "2100-01-01T00:00:00Z"
+
+    response = client.get(f"/groups/{group.id}/balances-at", params={"at": later}, headers=headers)
+
+    assert response.status_code == 200
+    assert response.json() == sorted([{"user_id": user.id, "balance": 20.0}, {"user_id": friend.id, "balance": -20.0}], key=lambda row: row["user_id"])
+    assert client.get(f"/groups/{group.id}/balances-at", params={"at": "2000-01-01T00:00:00Z"}, headers=headers).json() == []
+    assert client.get(f"/groups/{group.id}/balances-at", headers=headers).status_code == 422
+
+
+def test_view_group_include_invalid(client, db_session):
+    group, user, _ = _group_with_shared_expense(db_session)
+
+    response = client.get(f"/groups/{group.id}", params={"include": "invites"}, headers=_auth_headers_for_user(user))
+
+    assert response.status_code == 400
+    assert "invites" in response.json()["detail"]
+
+
 def test_view_group_full_details_failure(client, db_session, auth_header, monkeypatch):
     headers, user = auth_header
     group = Group(name="Failure", pw="pw", emoji=None)
@@ -283,7 +518,7 @@ def test_view_group_full_details_failure(client, db_session, auth_header, monkey
     def boom(*args, **kwargs):
         raise GroupFullDetailsError
 
-    monkeypatch.setattr("app.api.groups.get_full_group_details", boom)
+    monkeypatch.setattr("app.api.groups.load_group_view", boom)
 
     response = client.get(f"/groups/{group.id}", headers=headers)
 
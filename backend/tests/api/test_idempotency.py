@@ -0,0 +1,136 @@
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+
+from app.core.config import settings
+from app.core.idempotency import purge_expired_idempotency_keys
+from app.core.security import create_access_token, hash_password
+from app.db.models import Group, GroupMembers, User, Expense, IdempotencyKey
+
+
+def _member_of_new_group(db_session) -> tuple[User, Group, dict]:
+    user = User(name="Retry", email="retry@example.com", pw=hash_password("password"))
+    group = Group(name="Flaky Network", pw="pw", emoji=None)
+    db_session.add_all([user, group])
+    db_session.flush()
+    db_session.add(GroupMembers(user_id=user.id, group_id=group.id))
+    db_session.flush()
+    return user, group, {"Authorization": f"Bearer {create_access_token(user.id)}"}
+
+
+def _expense_payload(user: User, amount: float = 12.0) -> dict:
+    return {
+        "paid_by_id": user.id,
+        "amount": amount,
+        "description": "Taxi",
+        "splits": [{"user": {"id": user.id, "name": user.name}, "amount": amount}],
+    }
+
+
+def test_retried_create_expense_is_replayed(client, db_session):
+    user, group, headers = _member_of_new_group(db_session)
+    headers = {**headers, "Idempotency-Key": "create-1"}
+
+    first = client.post(f"/expenses/{group.id}/create-expense", headers=headers, json=_expense_payload(user))
+    retry = client.post(f"/expenses/{group.id}/create-expense", headers=headers, json=_expense_payload(user))
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.content == first.content
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+    assert db_session.query(Expense).filter(Expense.group_id == group.id).count() == 1
+    # the retry is a lookup, not a write
+    assert not any(statement.lstrip().upper().startswith(("INSERT", "UPDATE", "DELETE")) for statement in client.query_counter.statements)
+
+
+def test_key_reused_with_other_payload_is_rejected(client, db_session):
+    user, group, headers = _member_of_new_group(db_session)
+    headers = {**headers, "Idempotency-Key": "create-2"}
+
+    client.post(f"/expenses/{group.id}/create-expense", headers=headers, json=_expense_payload(user))
+    response = client.post(f"/expenses/{group.id}/create-expense", headers=headers, json=_expense_payload(user, amount=99.0))
+
+    assert response.status_code == 422
+    assert db_session.query(Expense).filter(Expense.group_id == group.id).count() == 1
+
+
+def test_without_key_every_request_writes(client, db_session):
+    user, group, headers = _member_of_new_group(db_session)
+
+    client.post(f"/expenses/{group.id}/create-expense", headers=headers, json=_expense_payload(user))
+    client.post(f"/expenses/{group.id}/create-expense", headers=headers, json=_expense_payload(user))
+
+    assert db_session.query(Expense).filter(Expense.group_id == group.id).count() == 2
+
+
+def test_retried_delete_and_join_are_replayed(client, db_session):
+    user, group, headers = _member_of_new_group(db_session)
+    created = client.post(f"/expenses/{group.id}/create-expense", headers=headers, json=_expense_payload(user)).json()
+
+    delete_headers = {**headers, "Idempotency-Key": "delete-1"}
+    client.post(f"/expenses/{group.id}/delete-expense", headers=delete_headers, json={"id": created["id"], "version": created["version"]})
+    retry = client.post(f"/expenses/{group.id}/delete-expense", headers=delete_headers, json={"id": created["id"], "version": created["version"]})
+    assert retry.status_code == 200 #not 404, the expense is already gone
+    assert retry.json() == {"msg": "Expense deleted"}
+
+    joiner = User(name="Joiner", email="joiner@example.com", pw="hashed")
+    db_session.add(joiner)
+    db_session.flush()
+    join_headers = {"Authorization": f"Bearer {create_access_token(joiner.id)}", "Idempotency-Key": "join-1"}
+    join_payload = {"pw_auth": {"group_name": group.name, "group_pw": group.pw}}
+    first = client.post("/groups/join", headers=join_headers, json=join_payload)
+    retry = client.post("/groups/join", headers=join_headers, json=join_payload)
+    assert first.status_code == retry.status_code == 200 #not "already in this group"
+    assert retry.json() == first.json()
+
+
+def test_expired_key_runs_again_and_is_purged(client, db_session, monkeypatch):
+    user, group, headers = _member_of_new_group(db_session)
+    headers = {**headers, "Idempotency-Key": "create-3"}
+    client.post(f"/expenses/{group.id}/create-expense", headers=headers, json=_expense_payload(user))
+    db_session.query(IdempotencyKey).filter(IdempotencyKey.user_id == user.id).update({"expires_at": datetime.now(timezone.utc) - timedelta(minutes=1)})
+    db_session.flush()
+
+    client.post(f"/expenses/{group.id}/create-expense", headers=headers, json=_expense_payload(user))
+    assert db_session.query(Expense).filter(Expense.group_id == group.id).count() == 2
+
+    assert db_session.query(IdempotencyKey).filter(IdempotencyKey.user_id == user.id).count() == 1 #the expired row was replaced
+    assert purge_expired_idempotency_keys(db_session, now=datetime.now(timezone.utc) + timedelta(hours=settings.idempotency_ttl_hours + 1)) >= 1
+    assert db_session.query(IdempotencyKey).filter(IdempotencyKey.user_id == user.id).count() == 0
+
+
+def test_unfinished_key_times_out(client, db_session, monkeypatch):
+    monkeypatch.setattr(settings, "idempotency_wait_seconds", 0.0)
+    user, group, headers = _member_of_new_group(db_session)
+    path = f"/expenses/{group.id}/create-expense"
+    body = json.dumps(_expense_payload(user)).encode()
+    # committed together with a write whose response never got stored
+    request_hash = hashlib.sha256(f"POST {path}\n".encode() + body).hexdigest()
+    db_session.add(IdempotencyKey(key="stuck", user_id=user.id, request_hash=request_hash, expires_at=datetime.now(timezone.utc) + timedelta(hours=1)))
+    db_session.flush()
+
+    response = client.post(path, headers={**headers, "Idempotency-Key": "stuck", "Content-Type": "application/json"}, content=body)
+
+    assert response.status_code == 409
+    assert db_session.query(Expense).filter(Expense.group_id == group.id).count() == 0
+
+
+def test_failed_create_group_releases_key(client, db_session, monkeypatch):
+    user, _, headers = _member_of_new_group(db_session)
+    db_session.commit() #releases the savepoint, so the failed request's rollback keeps the user
+    headers = {**headers, "Idempotency-Key": "group-1"}
+    payload = {"name": "Half Made", "group_pw": "pw", "emoji": None}
+
+    def broken_balances(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr("app.api.groups.calculate_balances", broken_balances)
+    assert client.post("/groups/create", headers=headers, json=payload).status_code == 500
+    monkeypatch.undo()
+    db_session.refresh(user) #the rollback expired it; loaded again so auth stays free, as on the first request
+
+    # nothing of the failed attempt was committed: the retry runs again instead of waiting for a response that never comes
+    retry = client.post("/groups/create", headers=headers, json=payload)
+    assert retry.status_code == 200
+    assert "idempotent-replayed" not in retry.headers
+    assert db_session.query(Group).filter(Group.name == "Half Made").count() == 1
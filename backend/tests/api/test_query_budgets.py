@@ -0,0 +1,99 @@
+from itertools import count
+
+from app.core.security import create_access_token, hash_password
+from app.db.models import Group, GroupMembers, User, Expense, ExpenseSplit
+
+
+_emails = count()
+
+
+def _create_user(db_session, name: str = "Member") -> User:
+    user = User(name=name, email=f"budget{next(_emails)}@example.com", pw=hash_password("password"))
+    db_session.add(user)
+    db_session.flush()
+    return user
+
+
+def _auth_headers_for_user(user: User) -> dict[str, str]:
+    token = create_access_token(user.id)
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _ensure_membership(db_session, group: Group, user: User) -> None:
+    db_session.add(GroupMembers(user_id=user.id, group_id=group.id))
+    db_session.flush()
+
+
+def _group_with_owner(db_session, name: str = "Budget") -> tuple[Group, User]:
+    owner = _create_user(db_session, "Owner")
+    group = Group(name=name, pw="pw", emoji=None)
+    db_session.add(group)
+    db_session.flush()
+    _ensure_membership(db_session, group, owner)
+    return group, owner
+
+
+def _grow_group(db_session, group: Group, payer: User, members: int = 3, expenses: int = 3) -> None:
+    """Adds members and expenses split between everyone in the group"""
+    for _ in range(members):
+        _ensure_membership(db_session, group, _create_user(db_session))
+
+    member_ids = [row.user_id for row in db_session.query(GroupMembers).filter(GroupMembers.group_id == group.id)]
+    for _ in range(expenses):
+        expense = Expense(amount=len(member_ids) * 1000, description="Grow", group_id=group.id, paid_by_id=payer.id, created_by_id=payer.id)
+        expense.splits = [ExpenseSplit(user_id=user_id, amount=1000) for user_id in member_ids]
+        db_session.add(expense)
+    db_session.flush()
+
+
+def test_view_group_queries_constant(client, db_session, assert_constant_queries):
+    group, owner = _group_with_owner(db_session)
+    headers = _auth_headers_for_user(owner)
+
+    assert_constant_queries(
+        call=lambda: client.get(f"/groups/{group.id}", headers=headers),
+        grow=lambda: _grow_group(db_session, group, owner),
+    )
+
+
+def test_view_short_queries_constant(client, db_session, assert_constant_queries):
+    user = _create_user(db_session, "Viewer")
+    headers = _auth_headers_for_user(user)
+
+    def grow():
+        group = Group(name="Another", pw="pw", emoji=None)
+        db_session.add(group)
+        db_session.flush()
+        _ensure_membership(db_session, group, user)
+
+    assert_constant_queries(call=lambda: client.get("/groups/view-short", headers=headers), grow=grow)
+
+
+def test_join_group_queries_constant(client, db_session, assert_constant_queries):
+    group, owner = _group_with_owner(db_session, name="Joinable")
+
+    def join():
+        joiner = _create_user(db_session, "Joiner")
+        client.post(
+            "/groups/join",
+            headers=_auth_headers_for_user(joiner),
+            json={"pw_auth": {"group_name": "Joinable", "group_pw": "pw"}},
+        )
+
+    assert_constant_queries(call=join, grow=lambda: _grow_group(db_session, group, owner))
+
+
+def test_create_expense_queries_constant(client, db_session, assert_constant_queries):
+    group, owner = _group_with_owner(db_session)
+    headers = _auth_headers_for_user(owner)
+    payload = {
+        "paid_by_id": owner.id,
+        "amount": 10.0,
+        "description": "Coffee",
+        "splits": [{"user": {"id": owner.id, "name": owner.name}, "amount": 10.0}],
+    }
+
+    assert_constant_queries(
+        call=lambda: client.post(f"/expenses/{group.id}/create-expense", headers=headers, json=payload),
+        grow=lambda: _grow_group(db_session, group, owner),
+    )
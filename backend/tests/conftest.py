@@ -24,6 +24,7 @@ if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
 from fastapi.testclient import TestClient
+from starlette.routing import Match
 
 from app.db.base import Base
 from app.core import config as config_module
@@ -39,6 +40,7 @@ import app.db.session as session_module
 from app.db.session import get_db
 from app.core.logger import setup_logging, get_request_logger
 from app.main import app
+from tests.api.query_budgets import QUERY_BUDGETS
 
 
 engine = create_engine(
@@ -55,6 +57,10 @@ session_module.SessionLocal = TestingSessionLocal
 Base.metadata.create_all(bind=engine)
 
 
+def pytest_configure(config):
+    config.addinivalue_line("markers", "perf: query plan / performance checks against large synthetic datasets (deselect with -m 'not perf')")
+
+
 @pytest.fixture()
 def db_session():
     connection = engine.connect()
@@ -78,8 +84,102 @@ def db_session():
         connection.close()
 
 
+# ******************************************************************************************************************************************************************************************
+# QUERY BUDGETS (N+1 guard)
+# ******************************************************************************************************************************************************************************************
+# savepoint statements come from the db_session harness above, not from app code
+_HARNESS_STATEMENTS = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+
+class QueryCounter:
+    """Counts statements sent through the shared test engine"""
+
+    def __init__(self):
+        self.statements: list[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def reset(self) -> None:
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith(_HARNESS_STATEMENTS):
+            self.statements.append(statement)
+
+
+def _route_key(method: str, path: str) -> str:
+    scope = {"type": "http", "path": path, "method": method.upper()}
+    for route in app.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return f"{method.upper()} {route.path}"
+    return f"{method.upper()} {path}"
+
+
+class BudgetedTestClient(TestClient):
+    """
+        TestClient that records the query count of every API call and fails the test when the route
+        has no budget in tests/api/query_budgets.py or goes over it
+    """
+
+    def __init__(self, *args, query_counter: QueryCounter, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.query_counter = query_counter
+        self.query_counts: list[tuple[str, int]] = []
+
+    @property
+    def last_query_count(self) -> int:
+        return self.query_counts[-1][1]
+
+    def request(self, method, url, *args, **kwargs):
+        self.query_counter.reset()
+        response = super().request(method, url, *args, **kwargs)
+        key = _route_key(method, self.base_url.join(url).path)
+        count = self.query_counter.count
+        self.query_counts.append((key, count))
+
+        if key not in QUERY_BUDGETS:
+            pytest.fail(f"No query budget declared for {key}; add one to tests/api/query_budgets.py")
+        if count > QUERY_BUDGETS[key]:
+            statements = "\n".join(self.query_counter.statements)
+            pytest.fail(f"{key} ran {count} queries, budget is {QUERY_BUDGETS[key]}:\n{statements}")
+        return response
+
+
+@pytest.fixture()
+def query_counter():
+    counter = QueryCounter()
+    event.listen(engine, "before_cursor_execute", counter)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", counter)
+
+
+@pytest.fixture()
+def assert_constant_queries(client, db_session):
+    """
+        Calls `call` once per fixture size, running `grow` in between to add rows.
+        Fails if the query count changes, ie. the endpoint issues queries per row (N+1).
+        The session is expired before every call so the identity map can't hide lazy loads
+    """
+    def check(call, grow, rounds: int = 2):
+        counts = []
+        for round_number in range(rounds + 1):
+            if round_number:
+                grow()
+            db_session.expire_all()
+            call()
+            counts.append(client.last_query_count)
+        assert len(set(counts)) == 1, f"query count scales with fixture size: {counts}"
+
+    return check
+
+
 @pytest.fixture()
-def client(db_session):
+def client(db_session, query_counter):
     logger = setup_logging()
     app.state.logger = logger
 
@@ -95,7 +195,7 @@ def client(db_session):
     app.dependency_overrides[get_db] = override_get_db
     app.dependency_overrides[get_request_logger] = override_get_request_logger
 
-    with TestClient(app) as test_client:
+    with BudgetedTestClient(app, query_counter=query_counter) as test_client:
         yield test_client
 
     app.dependency_overrides.clear()
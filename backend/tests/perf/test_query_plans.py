@@ -0,0 +1,265 @@
+"""
+    Query plan regression suite. Seeds a large synthetic dataset (one group with 10k expenses / 100k splits
+    plus a few hundred smaller groups), records the SQL the hot service/dependency/endpoint code actually
+    emits, and checks its EXPLAIN output for sequential scans and temp sorts on tables that should be indexed.
+
+    Runs on SQLite's EXPLAIN QUERY PLAN by default; set PERF_POSTGRES_URL to also check a local Postgres
+    (the database is reset, don't point it at anything you care about).
+"""
+import os
+import random
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy import create_engine, event, insert, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db.base import Base
+from app.db.models import User, Group, GroupMembers, Expense, ExpenseSplit, GroupInvite, MonthlyRollup, ExpenseEvent
+from app.core.security import create_access_token, get_current_user, get_current_group
+from app.services.group_service import (
+    check_join_group, check_link_join, get_short_group_details, calculate_balance, calculate_balances,
+)
+from app.services.expense_service import get_expense_details
+from app.services.group_read_model import load_group_view, GroupInclude
+from app.services.rollup_service import get_group_rollups
+from app.services.balance_history import get_balance_history
+from app.services.event_log import get_balances_at
+
+
+pytestmark = pytest.mark.perf
+
+BIG_GROUP_EXPENSES = 10_000
+SPLITS_PER_EXPENSE = 10
+SMALL_GROUPS = 300
+USERS = 2_000
+SEED = 1234
+
+TABLES = set(Base.metadata.tables)
+
+
+def _seed(engine) -> dict:
+    rng = random.Random(SEED)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": i, "name": f"user{i}", "email": f"user{i}@example.com", "pw": "hashed"} for i in range(1, USERS + 1)
+        ])
+        conn.execute(insert(Group), [
+            {"id": i, "name": f"group{i}", "pw": "pw", "emoji": None} for i in range(1, SMALL_GROUPS + 2)
+        ])
+
+        # group 1 is the big one; members 1..SPLITS_PER_EXPENSE
+        big_members = list(range(1, SPLITS_PER_EXPENSE + 1))
+        members = [{"user_id": u, "group_id": 1} for u in big_members]
+        for group_id in range(2, SMALL_GROUPS + 2):
+            members += [{"user_id": u, "group_id": group_id} for u in rng.sample(range(1, USERS + 1), 4)]
+        conn.execute(insert(GroupMembers), members)
+
+        expenses, splits = [], []
+        split_id = 1
+        for expense_id in range(1, BIG_GROUP_EXPENSES + 1):
+            payer = rng.choice(big_members)
+            expenses.append({"id": expense_id, "amount": 10000, "description": "big", "group_id": 1, "paid_by_id": payer, "created_by_id": payer})
+            for user_id in big_members:
+                splits.append({"id": split_id, "expense_id": expense_id, "user_id": user_id, "amount": 1000})
+                split_id += 1
+
+        # a handful of expenses per small group so the big group is a minority of expense rows too
+        expense_id = BIG_GROUP_EXPENSES
+        for member in members[SPLITS_PER_EXPENSE:]:
+            for _ in range(10):
+                expense_id += 1
+                expenses.append({"id": expense_id, "amount": 2000, "description": "small", "group_id": member["group_id"], "paid_by_id": member["user_id"], "created_by_id": member["user_id"]})
+                splits.append({"id": split_id, "expense_id": expense_id, "user_id": member["user_id"], "amount": 2000})
+                split_id += 1
+
+        conn.execute(insert(Expense), expenses)
+        conn.execute(insert(ExpenseSplit), splits)
+        # the big group's history, one event per expense, spread over the rollups' three years
+        conn.execute(insert(ExpenseEvent), [
+            {"group_id": e["group_id"], "expense_id": e["id"], "user_id": e["paid_by_id"], "kind": "created", "data": {},
+             "balance_delta": {str(e["paid_by_id"]): e["amount"]}, "recorded_at": datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(days=e["id"] % 1000)}
+            for e in expenses if e["group_id"] == 1
+        ])
+        # three years of rollups for every group, so the analytics range read has neighbours on both sides
+        months = [date(year, month, 1) for year in (2024, 2025, 2026) for month in range(1, 13)]
+        conn.execute(insert(MonthlyRollup), [
+            {"group_id": member["group_id"], "month": month, "user_id": member["user_id"], "paid_total": 2000, "paid_count": 1, "owed_total": 2000, "owed_count": 1}
+            for member in members for month in months
+        ])
+        conn.execute(insert(GroupInvite), [{
+            "id": 1, "token": "perf-token", "group_id": 2, "created_by_id": members[SPLITS_PER_EXPENSE]["user_id"],
+            "expires_at": None, "used": False, #sqlite hands back naive datetimes, which can't be compared to the aware now()
+        }])
+
+    return {"big_group_id": 1, "small_group_id": 2, "member_id": 1, "expense_id": 1}
+
+
+def _analyze(engine) -> None:
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+
+
+class StatementRecorder:
+    def __init__(self):
+        self.statements: list[tuple[str, object]] = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            self.statements.append((statement, parameters))
+
+
+def _record_hot_queries(engine, ids) -> dict[str, list[tuple[str, object]]]:
+    """Runs each hot code path once and keeps the SELECTs it sent, keyed by code path"""
+    Session = sessionmaker(bind=engine, autoflush=False)
+    recorded = {}
+
+    def record(name, call):
+        recorder = StatementRecorder()
+        event.listen(engine, "before_cursor_execute", recorder)
+        session = Session()
+        try:
+            call(session)
+        finally:
+            session.rollback()
+            session.close()
+            event.remove(engine, "before_cursor_execute", recorder)
+        recorded[name] = recorder.statements
+
+    big, member = ids["big_group_id"], ids["member_id"]
+    creds = HTTPAuthorizationCredentials(scheme="Bearer", credentials=create_access_token(member))
+
+    # security.py
+    record("get_current_user", lambda db: get_current_user(creds=creds, db=db))
+    record("get_current_group", lambda db: get_current_group(group_id=big, db=db, current_user=db.get(User, member)))
+    # group_read_model.py
+    record("load_group_view", lambda db: load_group_view(group_id=big, db=db))
+    latest = GroupInclude(members=False, balances=False, expense_limit=20)
+    record("load_group_view_latest", lambda db: load_group_view(group_id=big, db=db, include=latest))
+    month = {"since": datetime(2026, 10, 1, tzinfo=timezone.utc), "until": datetime(2026, 11, 1, tzinfo=timezone.utc)}
+    record("load_group_view_month", lambda db: load_group_view(group_id=big, db=db, include=GroupInclude(members=False, balances=False, **month)))
+    record("check_join_group", lambda db: check_join_group(group_name="group2", group_pw="pw", db=db))
+    record("check_link_join", lambda db: check_link_join(token_link="https://example.com/join?token=perf-token", db=db))
+    record("get_short_group_details", lambda db: get_short_group_details(user_id=member, db=db))
+    record("calculate_balance", lambda db: calculate_balance(user=db.get(User, member), group_id=big, db=db))
+    record("calculate_balances", lambda db: calculate_balances(group_id=big, db=db))
+    record("calculate_balances_month", lambda db: calculate_balances(group_id=big, db=db, **month))
+    # services/rollup_service.py
+    record("get_group_rollups", lambda db: get_group_rollups(group_id=big, db=db, since=date(2025, 1, 1), until=date(2026, 1, 1)))
+    # services/balance_history.py
+    record("get_balance_history", lambda db: get_balance_history(group_id=big, user_id=member, db=db))
+    record("get_balance_history_month", lambda db: get_balance_history(group_id=big, user_id=member, db=db, **month))
+    # services/event_log.py
+    record("get_balances_at", lambda db: get_balances_at(group_id=big, at=month["since"], db=db))
+    # api/expenses.py
+    record("get_expense_details", lambda db: get_expense_details(expense_id=ids["expense_id"], db=db))
+    record("expense_by_id_in_group", lambda db: db.query(Expense).filter(Expense.id == ids["expense_id"], Expense.group_id == big).first())
+    # api/auth.py
+    record("login_lookup", lambda db: db.query(User).filter(User.email == "user1@example.com").first())
+
+    return recorded
+
+
+# temp b-trees that can't be avoided: grouping split rows by user after joining them to a group's expenses, and
+# grouping compact equal splits by participant list (an expression over the json column, no index can order it)
+ALLOWED_TEMP_BTREES = {
+    "calculate_balance": {"GROUP BY"},
+    "calculate_balances": {"GROUP BY"},
+    "calculate_balances_month": {"GROUP BY"},
+}
+
+
+@pytest.fixture(scope="module")
+def sqlite_plans():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    ids = _seed(engine)
+    _analyze(engine)
+
+    recorded = _record_hot_queries(engine, ids)
+    plans = {}
+    with engine.connect() as conn:
+        for name, statements in recorded.items():
+            plans[name] = [
+                (statement, [row[3] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)])
+                for statement, parameters in statements
+            ]
+    yield plans
+    engine.dispose()
+
+
+def _sqlite_violations(name: str, plan_rows: list[str]) -> list[str]:
+    violations = []
+    for detail in plan_rows:
+        words = detail.split()
+        # "SCAN <table>" is a full table (or full index) scan; subqueries show up as SCAN anon_1 and are fine
+        if words[0] == "SCAN" and words[1].strip('"') in TABLES:
+            violations.append(detail)
+        if detail.startswith("USE TEMP B-TREE FOR"):
+            clause = detail.removeprefix("USE TEMP B-TREE FOR ").replace("LAST TERM OF ", "")
+            if clause not in ALLOWED_TEMP_BTREES.get(name, set()):
+                violations.append(detail)
+    return violations
+
+
+HOT_PATHS = [
+    "get_current_user", "get_current_group", "load_group_view", "load_group_view_latest",
+    "load_group_view_month", "check_join_group", "check_link_join",
+    "get_short_group_details", "calculate_balance", "calculate_balances", "calculate_balances_month", "get_expense_details",
+    "expense_by_id_in_group", "login_lookup", "get_group_rollups",
+    "get_balance_history", "get_balance_history_month", "get_balances_at",
+]
+
+
+@pytest.mark.parametrize("name", HOT_PATHS)
+def test_sqlite_hot_query_plans(sqlite_plans, name):
+    assert sqlite_plans[name], f"{name} issued no SELECT; recorder or code path changed"
+    for statement, plan_rows in sqlite_plans[name]:
+        violations = _sqlite_violations(name, plan_rows)
+        assert not violations, f"{name}: {violations}\n{statement}\nfull plan: {plan_rows}"
+
+
+# ******************************************************************************************************************************************************************************************
+# OPTIONAL POSTGRES
+# ******************************************************************************************************************************************************************************************
+POSTGRES_URL = os.environ.get("PERF_POSTGRES_URL")
+
+
+def _pg_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _pg_nodes(child)
+
+
+@pytest.fixture(scope="module")
+def postgres_plans():
+    if not POSTGRES_URL:
+        pytest.skip("PERF_POSTGRES_URL not set")
+    engine = create_engine(POSTGRES_URL)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    ids = _seed(engine)
+    _analyze(engine)
+
+    recorded = _record_hot_queries(engine, ids)
+    plans = {}
+    with engine.connect() as conn:
+        for name, statements in recorded.items():
+            plans[name] = [
+                (statement, conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()[0]["Plan"])
+                for statement, parameters in statements
+            ]
+    yield plans
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+@pytest.mark.parametrize("name", HOT_PATHS)
+def test_postgres_hot_query_plans(postgres_plans, name):
+    # small tables (group_members, group_invite, user) are legitimately seq scanned by postgres; only the big ones matter
+    big_tables = {"expense", "expense_split"}
+    for statement, plan in postgres_plans[name]:
+        seq_scans = [node for node in _pg_nodes(plan) if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in big_tables]
+        assert not seq_scans, f"{name}: seq scan on {[n['Relation Name'] for n in seq_scans]}\n{statement}"
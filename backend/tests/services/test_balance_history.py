@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta, timezone
+
+from app.db.models import Group, GroupMembers, User
+from app.db.schemas import ExpenseCreate
+from app.services.expense_service import create_expense_service
+from app.services.balance_history import BalancePoint, lttb, get_balance_history
+
+
+def _utc(*args) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def test_lttb_keeps_ends_and_spikes():
+    start = _utc(2025, 1, 1)
+    points = [BalancePoint(start + timedelta(days=i), 0) for i in range(1000)]
+    points[417] = BalancePoint(points[417].at, 5000)
+
+    sampled = lttb(points, 50)
+
+    assert len(sampled) == 50
+    assert sampled[0] == points[0] and sampled[-1] == points[-1]
+    assert points[417] in sampled #every-nth sampling would almost always miss it
+    assert [point.at for point in sampled] == sorted(point.at for point in sampled)
+    assert lttb(points[:10], 50) == points[:10]
+
+
+def test_balance_history(db_session):
+    users = [User(name=f"Hist{i}", email=f"hist{i}@example.com", pw="hashed") for i in range(3)]
+    group = Group(name="History", pw="pw", emoji=None)
+    db_session.add_all(users + [group])
+    db_session.flush()
+    db_session.add_all([GroupMembers(user_id=user.id, group_id=group.id) for user in users])
+    db_session.flush()
+    alice, bob, cara = users
+
+    def add(paid_by: User, amount: float, occurred_at: datetime, **fields):
+        payload = ExpenseCreate.model_validate({"paid_by_id": paid_by.id, "amount": amount, "description": None, "occurred_at": occurred_at, **fields})
+        create_expense_service(new_expense=payload, user_id=paid_by.id, group_id=group.id, db=db_session)
+
+    add(alice, 30, _utc(2025, 1, 10), split={"kind": "equal"}) #alice +20
+    add(bob, 10, _utc(2025, 2, 3), split={"kind": "exact", "amounts": {str(alice.id): 10}}) #alice -10
+    add(bob, 5, _utc(2025, 2, 20), split={"kind": "equal", "user_ids": [bob.id, cara.id]}) #doesn't involve alice
+    add(cara, 1, _utc(2025, 3, 1), split={"kind": "equal", "user_ids": [alice.id, cara.id]}) #alice -0.50
+
+    history = get_balance_history(group.id, alice.id, db_session)
+    assert [(point.at, point.balance) for point in history] == [
+        (_utc(2025, 1, 10), 2000), (_utc(2025, 2, 3), 1000), (_utc(2025, 3, 1), 950),
+    ]
+
+    # january from the rollups, feb 1-14 from the window's month; opens at since, until is exclusive
+    window = get_balance_history(group.id, alice.id, db_session, since=_utc(2025, 2, 15), until=_utc(2025, 3, 1))
+    assert [(point.at, point.balance) for point in window] == [(_utc(2025, 2, 15), 1000)]
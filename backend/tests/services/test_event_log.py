@@ -0,0 +1,109 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import func, select, update
+
+from app.db.models import Group, GroupMembers, User, ExpenseEvent, BalanceSnapshot
+from app.db.schemas import ExpenseCreate, ExpenseUpdate, ExpenseDelete
+from app.services.expense_service import create_expense_service, edit_expense_service, delete_expense_service
+from app.services.group_service import calculate_balances
+from app.services.event_log import get_balances_at, take_balance_snapshot
+
+
+def _utc(*args) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def _group(db_session) -> tuple[Group, list[User]]:
+    users = [User(name=f"Audit{i}", email=f"audit{i}@example.com", pw="hashed") for i in range(3)]
+    group = Group(name="Audit", pw="pw", emoji=None)
+    db_session.add_all(users + [group])
+    db_session.flush()
+    db_session.add_all([GroupMembers(user_id=user.id, group_id=group.id) for user in users])
+    db_session.flush()
+    return group, users
+
+
+def _recorded(db_session, group_id: int, *moments: datetime) -> None:
+    """Backdates the group's events in order; recorded_at is the server's now() otherwise"""
+    event_ids = db_session.scalars(select(ExpenseEvent.id).where(ExpenseEvent.group_id == group_id).order_by(ExpenseEvent.id)).all()
+    for event_id, moment in zip(event_ids, moments):
+        db_session.execute(update(ExpenseEvent).where(ExpenseEvent.id == event_id).values(recorded_at=moment))
+
+
+def test_write_paths_append_events(db_session):
+    group, (alice, bob, _) = _group(db_session)
+    payload = {"paid_by_id": alice.id, "amount": 30, "description": "Dinner", "split": {"kind": "equal"}}
+    expense = create_expense_service(new_expense=ExpenseCreate.model_validate(payload), user_id=alice.id, group_id=group.id, db=db_session)
+    expense_id = expense.id
+    edit = ExpenseCreate.model_validate({**payload, "description": "Dinner + tip"})
+    edit_expense_service(ExpenseUpdate(id=expense_id, version=1, expense=edit), user_id=bob.id, group_id=group.id, db=db_session)
+    delete_expense_service(ExpenseDelete(id=expense_id, version=2), group_id=group.id, db=db_session, user_id=bob.id)
+
+    events = db_session.scalars(select(ExpenseEvent).where(ExpenseEvent.expense_id == expense_id).order_by(ExpenseEvent.id)).all()
+
+    assert [(event.kind, event.user_id) for event in events] == [("created", alice.id), ("edited", bob.id), ("deleted", bob.id)]
+    assert events[1].data["description"] == "Dinner + tip"
+    assert events[1].balance_delta == {} #renamed, no money moved
+    assert events[0].balance_delta == {k: -v for k, v in events[2].balance_delta.items()} #the delete undoes the create
+
+
+def test_balances_at_replays_from_snapshot(db_session):
+    group, (alice, bob, cara) = _group(db_session)
+
+    def payload(paid_by: User, amount: float, **split) -> ExpenseCreate:
+        return ExpenseCreate.model_validate({"paid_by_id": paid_by.id, "amount": amount, "description": None, "split": split})
+
+    rent = create_expense_service(new_expense=payload(alice, 30, kind="equal"), user_id=alice.id, group_id=group.id, db=db_session)
+    rent_id = rent.id
+    create_expense_service(new_expense=payload(bob, 10, kind="exact", amounts={str(cara.id): 10}), user_id=bob.id, group_id=group.id, db=db_session)
+    edit_expense_service(ExpenseUpdate(id=rent_id, version=1, expense=payload(alice, 60, kind="equal")), user_id=alice.id, group_id=group.id, db=db_session)
+    _recorded(db_session, group.id, _utc(2025, 5, 1), _utc(2025, 5, 20), _utc(2025, 6, 10))
+
+    june_1 = {alice.id: 2000, bob.id: 0, cara.id: -2000} #before rent went up
+    assert get_balances_at(group.id, _utc(2025, 6, 1), db_session) == june_1
+    now = get_balances_at(group.id, _utc(2026, 1, 1), db_session)
+    assert now == {alice.id: 4000, bob.id: -1000, cara.id: -3000} == {k: v for k, v in calculate_balances(group.id, db_session).items() if v}
+
+    # snapshot after all three events; june 1st is before it, so it still replays from the start
+    assert take_balance_snapshot(group.id, db_session, min_events=4) is None
+    snapshot = take_balance_snapshot(group.id, db_session)
+    db_session.flush()
+    assert snapshot.balances == {str(k): v for k, v in now.items()}
+    assert take_balance_snapshot(group.id, db_session) is None #nothing new
+
+    delete_expense_service(ExpenseDelete(id=rent_id, version=2), group_id=group.id, db=db_session, user_id=bob.id)
+    assert get_balances_at(group.id, _utc(2025, 6, 1), db_session) == june_1
+    # the delete is recorded now(), after every date above: from the snapshot it's one event
+    assert get_balances_at(group.id, _utc(2100, 1, 1), db_session) == {alice.id: 0, bob.id: 1000, cara.id: -1000}
+    assert db_session.scalars(select(BalanceSnapshot).where(BalanceSnapshot.group_id == group.id)).all() == [snapshot]
+
+
+def test_snapshot_keeps_events_that_commit_late(db_session):
+    group, (alice, bob, _) = _group(db_session)
+    first = db_session.scalar(select(func.coalesce(func.max(ExpenseEvent.id), 0))) + 1
+
+    def event(event_id: int, recorded_at: datetime, cents: int) -> ExpenseEvent:
+        return ExpenseEvent(id=event_id, group_id=group.id, expense_id=0, kind="created", data={}, recorded_at=recorded_at,
+                            balance_delta={str(alice.id): cents, str(bob.id): -cents})
+
+    # the second id is handed out first but its transaction commits after the third one's, and after the snapshot
+    db_session.add_all([event(first, _utc(2025, 5, 1), 100), event(first + 2, _utc(2025, 5, 31, 23, 59), 300)])
+    db_session.flush()
+    snapshot = take_balance_snapshot(group.id, db_session, until=_utc(2025, 6, 1))
+    db_session.flush()
+    assert snapshot.balances == {str(alice.id): 400, str(bob.id): -400}
+    db_session.add(event(first + 1, _utc(2025, 6, 1, 0, 0, 5), 20)) #transaction started after the cutoff
+    db_session.flush()
+
+    assert get_balances_at(group.id, _utc(2026, 1, 1), db_session) == {alice.id: 420, bob.id: -420}
+    assert take_balance_snapshot(group.id, db_session, until=_utc(2025, 6, 2)).balances == {str(alice.id): 420, str(bob.id): -420}
+
+
+def test_snapshot_leaves_out_recent_events(db_session):
+    group, (alice, bob, _) = _group(db_session)
+    payload = {"paid_by_id": alice.id, "amount": 20, "description": None, "split": {"kind": "equal", "user_ids": [alice.id, bob.id]}}
+    create_expense_service(new_expense=ExpenseCreate.model_validate(payload), user_id=alice.id, group_id=group.id, db=db_session)
+
+    # recorded now(): its transaction may still be open elsewhere, so it waits for the lag to pass
+    assert take_balance_snapshot(group.id, db_session) is None
+    assert get_balances_at(group.id, _utc(2100, 1, 1), db_session) == {alice.id: 1000, bob.id: -1000}
@@ -1,9 +1,11 @@
 import pytest
+from sqlalchemy import update
 
-from app.db.models import Group, User
-from app.db.schemas import ExpenseCreate, ExpenseSplitIn, UserIn, ExpenseUpdate
-from app.services.expense_service import create_expense_service, edit_expense_service
-from app.core.exceptions import ExpenseCreationError, ExpenseEditError
+from app.db.models import Group, GroupMembers, User, Expense, ExpenseSplit
+from app.db.schemas import ExpenseCreate, ExpenseSplitIn, UserIn, ExpenseUpdate, ExpenseDelete
+from app.services.expense_service import create_expense_service, edit_expense_service, delete_expense_service, get_expense_details
+from app.services.group_service import calculate_balance, calculate_balances
+from app.core.exceptions import ExpenseCreationError, ExpenseEditError, ExpenseVersionConflictError, ExpenseSplitMemberError
 
 
 def _user_in(user: User) -> UserIn:
@@ -26,13 +28,15 @@ def test_create_expense_service_success(db_session):
 
     db_session.add_all([group, payer, partner])
     db_session.flush()
+    db_session.add_all([GroupMembers(user_id=user.id, group_id=group.id) for user in (payer, partner)])
+    db_session.flush()
 
     payload = _expense_payload(paid_by=payer, splits=[(payer, 50.0), (partner, 50.0)], amount=100.0, description="Dinner")
 
     expense = create_expense_service(new_expense=payload, user_id=payer.id, group_id=group.id, db=db_session)
 
     assert expense.id is not None
-    assert expense.amount == 100.0
+    assert expense.amount == 10000 #stored in cents
     assert expense.description == "Dinner"
     assert expense.group_id == group.id
     assert len(expense.splits) == 2
@@ -63,20 +67,22 @@ def test_edit_expense_service_success(db_session):
 
     db_session.add_all([group, creator, attendee])
     db_session.flush()
+    db_session.add_all([GroupMembers(user_id=user.id, group_id=group.id) for user in (creator, attendee)])
+    db_session.flush()
 
     original_payload = _expense_payload(paid_by=creator, splits=[(creator, 30.0), (attendee, 30.0)], amount=60.0, description="Taxi")
     expense = create_expense_service(new_expense=original_payload, user_id=creator.id, group_id=group.id, db=db_session)
 
     updated_payload = _expense_payload(paid_by=attendee, splits=[(creator, 20.0), (attendee, 20.0)], amount=40.0, description="Updated Taxi")
-    update = ExpenseUpdate(id=expense.id, expense=updated_payload)
+    update = ExpenseUpdate(id=expense.id, version=1, expense=updated_payload)
 
     updated_expense = edit_expense_service(expense_update=update, user_id=creator.id, group_id=group.id, db=db_session)
 
-    assert updated_expense.amount == 40.0
+    assert updated_expense.amount == 4000
     assert updated_expense.description == "Updated Taxi"
     assert updated_expense.paid_by_id == attendee.id
     assert len(updated_expense.splits) == 2
-    assert {split.amount for split in updated_expense.splits} == {20.0}
+    assert {split.amount for split in updated_expense.splits} == {2000}
 
 
 def test_edit_expense_service_not_found(db_session):
@@ -86,7 +92,199 @@ def test_edit_expense_service_not_found(db_session):
     db_session.flush()
 
     payload = _expense_payload(paid_by=user, splits=[(user, 10.0)], amount=10.0)
-    update = ExpenseUpdate(id=9999, expense=payload)
+    update = ExpenseUpdate(id=9999, version=1, expense=payload)
 
     with pytest.raises(ExpenseEditError):
         edit_expense_service(expense_update=update, user_id=user.id, group_id=group.id, db=db_session)
+
+
+# split reconciliation; statements are counted after expire_all so the expense is loaded the way a request loads it
+def _writes(query_counter) -> list[str]:
+    return [statement.split("(")[0].split(" WHERE")[0].strip() for statement in query_counter.statements if statement.lstrip().upper().startswith(("INSERT", "UPDATE", "DELETE"))]
+
+
+def _seed_split_expense(db_session, n_users: int = 3):
+    group = Group(name="Reconcile", pw="pw", emoji=None)
+    users = [User(name=f"User {n}", email=f"reconcile{n}@example.com", pw="hashed") for n in range(n_users)]
+    db_session.add_all([group, *users])
+    db_session.flush()
+    db_session.add_all([GroupMembers(user_id=user.id, group_id=group.id) for user in users])
+    db_session.flush()
+    payload = _expense_payload(paid_by=users[0], splits=[(user, 10.0) for user in users], amount=10.0 * n_users, description="Shared")
+    expense = create_expense_service(new_expense=payload, user_id=users[0].id, group_id=group.id, db=db_session)
+    ids = (expense.id, group.id, [user.id for user in users]) #read before expire_all, which would refresh them
+    db_session.expire_all()
+    return users, *ids
+
+
+def _edit(db_session, expense_id: int, group_id: int, payer_id: int, splits: list[tuple[int, float]], description: str = "Shared"):
+    payload = ExpenseCreate(
+        paid_by_id=payer_id,
+        amount=sum(amount for _, amount in splits),
+        description=description,
+        splits=[ExpenseSplitIn(user=UserIn(id=user_id, name="x"), amount=amount) for user_id, amount in splits],
+    )
+    return edit_expense_service(expense_update=ExpenseUpdate(id=expense_id, version=1, expense=payload), user_id=payer_id, group_id=group_id, db=db_session)
+
+
+def test_edit_expense_unchanged_writes_nothing(db_session, query_counter):
+    _, expense_id, group_id, user_ids = _seed_split_expense(db_session)
+
+    query_counter.reset()
+    _edit(db_session, expense_id, group_id, user_ids[0], [(user_id, 10.0) for user_id in user_ids])
+
+    assert _writes(query_counter) == []
+
+
+def test_edit_expense_description_only_keeps_splits(db_session, query_counter):
+    _, expense_id, group_id, user_ids = _seed_split_expense(db_session, n_users=50)
+
+    query_counter.reset()
+    _edit(db_session, expense_id, group_id, user_ids[0], [(user_id, 10.0) for user_id in user_ids], description="Renamed")
+
+    # no money moved: no rollup upsert, the group only gets its last_activity_at
+    assert _writes(query_counter) == ["UPDATE expense SET description=?, version=?", "INSERT INTO expense_event", 'UPDATE "group" SET last_activity_at=CURRENT_TIMESTAMP']
+    assert query_counter.count == 6 #expense, its splits, the member ids, the update, the event, the group
+
+
+def test_edit_expense_reconciles_splits_by_user(db_session, query_counter):
+    _, expense_id, group_id, user_ids = _seed_split_expense(db_session, n_users=3)
+    newcomer = User(name="Newcomer", email="reconcile-new@example.com", pw="hashed")
+    db_session.add(newcomer)
+    db_session.flush()
+    db_session.add(GroupMembers(user_id=newcomer.id, group_id=group_id))
+    db_session.flush()
+    newcomer_id = newcomer.id
+    db_session.expire_all()
+
+    # user 0 unchanged, user 1 changed, user 2 removed, newcomer added; total stays 30
+    query_counter.reset()
+    expense = _edit(db_session, expense_id, group_id, user_ids[0], [(user_ids[0], 10.0), (user_ids[1], 5.0), (newcomer_id, 15.0)])
+
+    assert sorted(_writes(query_counter)) == [
+        "DELETE FROM expense_split", "INSERT INTO expense_event", "INSERT INTO expense_split", "INSERT INTO monthly_rollup", #one upsert for all moved rollup rows
+        'UPDATE "group" SET last_activity_at=CURRENT_TIMESTAMP', "UPDATE expense SET version=?", "UPDATE expense_split SET amount=?",
+    ]
+    assert {(split.user_id, split.amount) for split in expense.splits} == {(user_ids[0], 1000), (user_ids[1], 500), (newcomer_id, 1500)}
+
+
+def test_splits_must_name_group_members(db_session):
+    users, expense_id, group_id, user_ids = _seed_split_expense(db_session, n_users=2)
+    outsider = User(name="Outsider", email="reconcile-out@example.com", pw="hashed")
+    db_session.add(outsider)
+    db_session.flush()
+
+    rules = [
+        {"kind": "shares", "shares": {user_ids[0]: 1, outsider.id: 1}},
+        {"kind": "percentage", "percentages": {user_ids[0]: 50, outsider.id: 50}},
+        {"kind": "exact", "amounts": {user_ids[0]: 10.0, outsider.id: 10.0}},
+    ]
+    for rule in rules:
+        payload = ExpenseCreate(paid_by_id=user_ids[0], amount=20.0, description="Gatecrash", split=rule)
+        with pytest.raises(ExpenseSplitMemberError):
+            create_expense_service(new_expense=payload, user_id=user_ids[0], group_id=group_id, db=db_session)
+    with pytest.raises(ExpenseSplitMemberError):
+        _edit(db_session, expense_id, group_id, user_ids[0], [(user_ids[0], 10.0), (outsider.id, 10.0)])
+    assert _split_rows(db_session, expense_id) == 2
+
+
+def test_edit_expense_merges_repeated_users(db_session):
+    _, expense_id, group_id, user_ids = _seed_split_expense(db_session, n_users=2)
+
+    expense = _edit(db_session, expense_id, group_id, user_ids[0], [(user_ids[0], 5.0), (user_ids[0], 5.0), (user_ids[1], 10.0)])
+
+    assert sorted((split.user_id, split.amount) for split in expense.splits) == [(user_ids[0], 1000), (user_ids[1], 1000)]
+
+
+def test_edit_expense_bumps_version_only_on_change(db_session):
+    _, expense_id, group_id, user_ids = _seed_split_expense(db_session, n_users=2)
+
+    unchanged = _edit(db_session, expense_id, group_id, user_ids[0], [(user_id, 10.0) for user_id in user_ids])
+    assert unchanged.version == 1
+
+    changed = _edit(db_session, expense_id, group_id, user_ids[0], [(user_ids[0], 15.0), (user_ids[1], 5.0)])
+    assert changed.version == 2
+
+
+def test_edit_expense_stale_version_conflicts(db_session, query_counter):
+    _, expense_id, group_id, user_ids = _seed_split_expense(db_session, n_users=2)
+    _edit(db_session, expense_id, group_id, user_ids[0], [(user_ids[0], 20.0)])
+    payload = _expense_payload(paid_by=db_session.get(User, user_ids[0]), splits=[], amount=1.0)
+
+    query_counter.reset()
+    with pytest.raises(ExpenseVersionConflictError):
+        edit_expense_service(expense_update=ExpenseUpdate(id=expense_id, version=1, expense=payload), user_id=user_ids[0], group_id=group_id, db=db_session)
+    assert _writes(query_counter) == [] #rejected before writing anything
+
+
+def test_edit_expense_concurrent_writer_conflicts(db_session):
+    _, expense_id, group_id, user_ids = _seed_split_expense(db_session, n_users=2)
+    db_session.get(Expense, expense_id) #our read, at version 1
+    # another request commits its edit in between; the session still holds version 1
+    db_session.execute(update(Expense).where(Expense.id == expense_id).values(version=2))
+
+    with pytest.raises(ExpenseVersionConflictError):
+        _edit(db_session, expense_id, group_id, user_ids[0], [(user_ids[0], 20.0)], description="Mine")
+
+
+def test_delete_expense_checks_version(db_session):
+    _, expense_id, group_id, user_ids = _seed_split_expense(db_session, n_users=2)
+
+    with pytest.raises(ExpenseVersionConflictError):
+        delete_expense_service(expense_delete=ExpenseDelete(id=expense_id, version=7), group_id=group_id, db=db_session)
+    delete_expense_service(expense_delete=ExpenseDelete(id=expense_id, version=1), group_id=group_id, db=db_session)
+
+    assert db_session.get(Expense, expense_id) is None
+
+
+# compact equal splits; stored as participant ids on the expense, no expense_split rows
+def _equal_payload(payer_id: int, amount: float, user_ids=None, description: str = "Equal") -> ExpenseCreate:
+    return ExpenseCreate(paid_by_id=payer_id, amount=amount, description=description, split={"kind": "equal", "user_ids": user_ids})
+
+
+def _split_rows(db_session, expense_id: int) -> int:
+    return db_session.query(ExpenseSplit).filter(ExpenseSplit.expense_id == expense_id).count()
+
+
+def test_equal_split_is_stored_compactly(db_session, query_counter):
+    users, _, group_id, user_ids = _seed_split_expense(db_session, n_users=3)
+
+    query_counter.reset()
+    expense = create_expense_service(new_expense=_equal_payload(user_ids[2], 1.0), user_id=user_ids[2], group_id=group_id, db=db_session)
+
+    assert expense.equal_split_user_ids == sorted(user_ids)
+    assert _split_rows(db_session, expense.id) == 0
+    assert not any("expense_split" in statement for statement in _writes(query_counter))
+    # expanded on read: 34 / 33 / 33 cents, leftover cent to the lowest id
+    details = get_expense_details(expense_id=expense.id, db=db_session)
+    assert [(split.user.id, split.user.name, split.amount) for split in details.splits] == [
+        (user_ids[0], "User 0", 34), (user_ids[1], "User 1", 33), (user_ids[2], "User 2", 33),
+    ]
+
+
+def test_balances_cover_both_split_forms(db_session):
+    _, _, group_id, user_ids = _seed_split_expense(db_session, n_users=3) #rows: user 0 paid 30, everyone owes 10
+    create_expense_service(new_expense=_equal_payload(user_ids[1], 1.0, user_ids), user_id=user_ids[1], group_id=group_id, db=db_session)
+
+    balances = calculate_balances(group_id=group_id, db=db_session)
+
+    assert balances == {user_ids[0]: 2000 - 34, user_ids[1]: -1000 + 100 - 33, user_ids[2]: -1000 - 33}
+    assert sum(balances.values()) == 0
+    assert calculate_balance(user=db_session.get(User, user_ids[1]), group_id=group_id, db=db_session) == balances[user_ids[1]]
+
+
+def test_edit_switches_between_split_forms(db_session):
+    _, expense_id, group_id, user_ids = _seed_split_expense(db_session, n_users=2)
+
+    update_ = ExpenseUpdate(id=expense_id, version=1, expense=_equal_payload(user_ids[0], 20.0, user_ids, description="Shared"))
+    expense = edit_expense_service(expense_update=update_, user_id=user_ids[0], group_id=group_id, db=db_session)
+    assert (expense.equal_split_user_ids, expense.version, _split_rows(db_session, expense_id)) == (sorted(user_ids), 2, 0)
+
+    # same equal split again is not a change
+    update_ = ExpenseUpdate(id=expense_id, version=2, expense=_equal_payload(user_ids[0], 20.0, list(reversed(user_ids)), description="Shared"))
+    assert edit_expense_service(expense_update=update_, user_id=user_ids[0], group_id=group_id, db=db_session).version == 2
+
+    payload = _expense_payload(paid_by=db_session.get(User, user_ids[0]), splits=[(db_session.get(User, user_ids[0]), 15.0), (db_session.get(User, user_ids[1]), 5.0)], amount=20.0, description="Shared")
+    expense = edit_expense_service(expense_update=ExpenseUpdate(id=expense_id, version=2, expense=payload), user_id=user_ids[0], group_id=group_id, db=db_session)
+    assert (expense.equal_split_user_ids, expense.version) == (None, 3)
+    assert sorted((split.user_id, split.amount) for split in expense.splits) == [(user_ids[0], 1500), (user_ids[1], 500)]
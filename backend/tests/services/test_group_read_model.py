@@ -0,0 +1,169 @@
+import pytest
+
+from app.db.models import Group, GroupMembers, User, Expense, ExpenseSplit
+from app.db.schemas import GroupOutAdapter
+from app.services.group_read_model import load_group_view, to_columnar, parse_group_include, GroupInclude, FULL_GROUP
+from app.core.exceptions import GroupFullDetailsError, GroupNotFoundError, GroupIncludeError
+
+
+def _seed_group(db_session) -> tuple[Group, User, User]:
+    alice = User(name="Alice", email="alice-read@example.com", pw="hashed")
+    bob = User(name="Bob", email="bob-read@example.com", pw="hashed")
+    group = Group(name="Read Model", pw="pw", emoji="🏕")
+    db_session.add_all([alice, bob, group])
+    db_session.flush()
+    db_session.add_all([GroupMembers(user_id=alice.id, group_id=group.id), GroupMembers(user_id=bob.id, group_id=group.id)])
+
+    dinner = Expense(amount=3000, description="Dinner", group_id=group.id, paid_by_id=alice.id, created_by_id=alice.id)
+    dinner.splits = [ExpenseSplit(user_id=alice.id, amount=1500), ExpenseSplit(user_id=bob.id, amount=1500)]
+    taxi = Expense(amount=1200, description=None, group_id=group.id, paid_by_id=bob.id, created_by_id=bob.id)
+    taxi.splits = [ExpenseSplit(user_id=alice.id, amount=1200)]
+    db_session.add_all([dinner, taxi])
+    db_session.flush()
+    return group, alice, bob
+
+
+def _as_json(group) -> dict:
+    for member in group.members:
+        member.balance = 150
+    return GroupOutAdapter.dump_python(GroupOutAdapter.validate_python(group, from_attributes=True))
+
+
+def _sorted(view: dict) -> dict:
+    view["members"].sort(key=lambda m: m["id"])
+    view["expenses"].sort(key=lambda e: e["id"])
+    for expense in view["expenses"]:
+        expense["splits"].sort(key=lambda s: s["user"]["id"])
+    return view
+
+
+def test_load_group_view_serializes_like_group_out(db_session):
+    group, alice, bob = _seed_group(db_session)
+
+    view = _sorted(_as_json(load_group_view(group_id=group.id, db=db_session)))
+
+    assert view["members"] == [{"id": alice.id, "name": "Alice", "balance": 1.5}, {"id": bob.id, "name": "Bob", "balance": 1.5}]
+    dinner, taxi = view["expenses"]
+    assert (dinner["description"], dinner["amount"], dinner["paid_by"]) == ("Dinner", 30.0, {"id": alice.id, "name": "Alice"})
+    assert dinner["splits"] == [{"user": {"id": alice.id, "name": "Alice"}, "amount": 15.0}, {"user": {"id": bob.id, "name": "Bob"}, "amount": 15.0}]
+    assert (taxi["description"], taxi["amount"], taxi["paid_by"]) == (None, 12.0, {"id": bob.id, "name": "Bob"})
+    assert taxi["splits"] == [{"user": {"id": alice.id, "name": "Alice"}, "amount": 12.0}]
+
+
+def test_load_group_view_shares_user_records(db_session):
+    group, alice, _ = _seed_group(db_session)
+
+    view = load_group_view(group_id=group.id, db=db_session)
+
+    alice_records = {id(split.user) for expense in view.expenses for split in expense.splits if split.user.id == alice.id}
+    alice_records |= {id(expense.paid_by) for expense in view.expenses if expense.paid_by.id == alice.id}
+    assert len(alice_records) == 1
+
+
+def test_to_columnar_dedupes_users(db_session):
+    group, alice, bob = _seed_group(db_session)
+    view = load_group_view(group_id=group.id, db=db_session)
+    for member in view.members:
+        member.balance = 0
+
+    columnar = to_columnar(view)
+
+    assert sorted(columnar["users"]["id"]) == sorted([alice.id, bob.id])
+    assert len(columnar["expenses"]["id"]) == 2
+    assert columnar["expenses"]["split_offsets"][-1] == len(columnar["splits"]["user"]) == 3
+    assert sorted(columnar["splits"]["amount"]) == [12.0, 15.0, 15.0]
+
+
+def test_load_group_view_empty_group(db_session):
+    group = Group(name="Empty", pw="pw", emoji=None)
+    db_session.add(group)
+    db_session.flush()
+
+    view = load_group_view(group_id=group.id, db=db_session)
+
+    assert view.name == "Empty"
+    assert view.members == []
+    assert view.expenses == []
+
+
+def test_load_group_view_skips_unknown_equal_split_ids(db_session):
+    group, alice, _ = _seed_group(db_session)
+    # written before equal split ids were checked against the members
+    db_session.add(Expense(amount=1000, description="Legacy", group_id=group.id, paid_by_id=alice.id, created_by_id=alice.id, equal_split_user_ids=[alice.id, 99999]))
+    db_session.flush()
+
+    view = load_group_view(group_id=group.id, db=db_session)
+
+    legacy = next(expense for expense in view.expenses if expense.description == "Legacy")
+    assert [(split.user.id, split.amount) for split in legacy.splits] == [(alice.id, 500)]
+
+
+def test_load_group_view_not_found(db_session):
+    with pytest.raises(GroupNotFoundError):
+        load_group_view(group_id=999999, db=db_session)
+
+
+def test_load_group_view_failure(db_session, monkeypatch):
+    def broken_execute(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(db_session, "execute", broken_execute)
+
+    with pytest.raises(GroupFullDetailsError):
+        load_group_view(group_id=1, db=db_session)
+
+
+def test_parse_group_include():
+    assert parse_group_include(None) == FULL_GROUP
+    assert parse_group_include("") == GroupInclude(members=False, balances=False, expenses=False)
+    assert parse_group_include("members, expenses(limit=20)") == GroupInclude(members=True, balances=False, expenses=True, expense_limit=20)
+    # balances are per member, so they bring the member list along
+    assert parse_group_include("balances") == GroupInclude(members=True, balances=True, expenses=False)
+
+
+@pytest.mark.parametrize("value", ["invites", "members(limit=2)", "expenses(limit=0)", "expenses(limit=x)", "expenses(offset=2)", "members,,expenses"])
+def test_parse_group_include_rejects(value):
+    with pytest.raises(GroupIncludeError):
+        parse_group_include(value)
+
+
+def test_load_group_view_include_limits_queries(db_session, query_counter):
+    group, _, _ = _seed_group(db_session)
+
+    query_counter.reset()
+    view = load_group_view(group_id=group.id, db=db_session, include=GroupInclude(members=True, balances=False, expenses=False))
+
+    assert query_counter.count == 1
+    assert len(view.members) == 2
+    assert view.expenses == []
+
+    query_counter.reset()
+    header_only = load_group_view(group_id=group.id, db=db_session, include=GroupInclude(members=False, balances=False, expenses=False))
+
+    assert query_counter.count == 1
+    assert (header_only.name, header_only.members, header_only.expenses) == ("Read Model", [], [])
+
+
+def test_load_group_view_expense_limit(db_session):
+    group, _, _ = _seed_group(db_session)
+
+    view = load_group_view(group_id=group.id, db=db_session, include=GroupInclude(members=False, balances=False, expense_limit=1))
+
+    assert [expense.description for expense in view.expenses] == [None] #the taxi, added last
+    assert view.members == []
+
+
+def test_load_group_view_expands_equal_splits(db_session, query_counter):
+    group, alice, bob = _seed_group(db_session)
+    carol = User(name="Carol", email="carol-read@example.com", pw="hashed") #a participant who isn't a member (anymore)
+    db_session.add(carol)
+    db_session.flush()
+    db_session.add(Expense(amount=100, description="Tip", group_id=group.id, paid_by_id=bob.id, created_by_id=bob.id, equal_split_user_ids=sorted([alice.id, bob.id, carol.id])))
+    db_session.flush()
+
+    query_counter.reset()
+    view = load_group_view(group_id=group.id, db=db_session)
+    [tip] = [expense for expense in view.expenses if expense.description == "Tip"]
+
+    assert sorted((split.user.name, split.amount) for split in tip.splits) == [("Alice", 34), ("Bob", 33), ("Carol", 33)]
+    assert query_counter.count == 3 #group + members, expenses + splits, carol's name
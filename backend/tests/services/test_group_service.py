@@ -1,4 +1,5 @@
 import pytest
+from sqlalchemy import update
 
 from app.db.models import (
     Group,
@@ -9,16 +10,19 @@ from app.db.models import (
     GroupInvite,
 )
 from app.services.group_service import (
-    get_full_group_details,
     check_join_group,
     check_link_join,
     add_user_group,
     get_short_group_details,
+    recount_group,
     calculate_balance,
+    calculate_balances,
     create_group_invite_service,
 )
+from app.services.split_strategies import split_equal
+from app.services.expense_service import create_expense_service, edit_expense_service, delete_expense_service
+from app.db.schemas import ExpenseCreate, ExpenseUpdate, ExpenseDelete
 from app.core.exceptions import (
-    GroupFullDetailsError,
     GroupNotFoundError,
     GroupCheckLinkJoinError,
     GroupAddUserError,
@@ -28,46 +32,6 @@ from app.core.exceptions import (
 )
 
 
-def test_get_full_group_details_success(db_session):
-    user = User(name="Greg", email="greg@example.com", pw="hashed")
-    group = Group(name="Weekend", pw="pw", emoji="🏖")
-    db_session.add_all([user, group])
-    db_session.flush()
-
-    membership = GroupMembers(user_id=user.id, group_id=group.id)
-    db_session.add(membership)
-
-    expense = Expense(
-        amount=100.0,
-        description="Hotel",
-        group_id=group.id,
-        paid_by_id=user.id,
-        created_by_id=user.id,
-    )
-    db_session.add(expense)
-    db_session.flush()
-
-    split = ExpenseSplit(expense_id=expense.id, user_id=user.id, amount=100.0)
-    db_session.add(split)
-    db_session.flush()
-
-    result = get_full_group_details(group_id=group.id, db=db_session)
-
-    assert result.id == group.id
-    assert len(result.members) == 1
-    assert len(result.expenses) == 1
-
-
-def test_get_full_group_details_failure(db_session, monkeypatch):
-    def broken_query(*args, **kwargs):
-        raise RuntimeError("boom")
-
-    monkeypatch.setattr(db_session, "query", broken_query)
-
-    with pytest.raises(GroupFullDetailsError):
-        get_full_group_details(group_id=1, db=db_session)
-
-
 def test_check_join_group_success(db_session):
     group = Group(name="Study", pw="joinme", emoji=None)
     db_session.add(group)
@@ -126,9 +90,10 @@ def test_add_user_group_success(db_session):
     db_session.add_all([user, group])
     db_session.flush()
 
-    result = add_user_group(group_id=group.id, user=user, db=db_session)
+    membership = add_user_group(group_id=group.id, user=user, db=db_session)
 
-    assert any(member.id == user.id for member in result.members)
+    assert (membership.user_id, membership.group_id) == (user.id, group.id)
+    assert db_session.query(GroupMembers).filter(GroupMembers.group_id == group.id).count() == 1
 
 
 def test_add_user_group_failure(db_session, monkeypatch):
@@ -162,6 +127,32 @@ def test_get_short_group_details_success(db_session):
     assert groups[0].id == group.id
 
 
+def test_group_counters_follow_writes(db_session):
+    users = [User(name=f"Counter{i}", email=f"counter{i}@example.com", pw="hashed") for i in range(3)]
+    group = Group(name="Counters", pw="pw", emoji=None)
+    db_session.add_all(users + [group])
+    db_session.flush()
+    for user in users:
+        add_user_group(group_id=group.id, user=user, db=db_session)
+
+    def payload(amount: float) -> ExpenseCreate:
+        return ExpenseCreate.model_validate({"paid_by_id": users[0].id, "amount": amount, "description": None, "split": {"kind": "equal"}})
+
+    first = create_expense_service(new_expense=payload(30), user_id=users[0].id, group_id=group.id, db=db_session)
+    second = create_expense_service(new_expense=payload(12.5), user_id=users[0].id, group_id=group.id, db=db_session)
+    edit_expense_service(ExpenseUpdate(id=first.id, version=1, expense=payload(40)), user_id=users[0].id, group_id=group.id, db=db_session)
+    delete_expense_service(ExpenseDelete(id=second.id, version=1), group_id=group.id, db=db_session)
+
+    db_session.expire(group) #the counter UPDATEs don't refresh loaded instances
+    assert (group.member_count, group.expense_count, group.total_spent) == (3, 1, 4000)
+    assert group.last_activity_at is not None
+
+    db_session.execute(update(Group).where(Group.id == group.id).values(member_count=0, expense_count=0, total_spent=0))
+    recount_group(group.id, db_session)
+    db_session.expire(group)
+    assert (group.member_count, group.expense_count, group.total_spent) == (3, 1, 4000)
+
+
 def test_get_short_group_details_failure(db_session, monkeypatch):
     def broken_query(*args, **kwargs):
         raise RuntimeError("query failed")
@@ -180,7 +171,7 @@ def test_calculate_balance_success(db_session):
     db_session.flush()
 
     expense = Expense(
-        amount=120.0,
+        amount=12000,
         description="Lift tickets",
         group_id=group.id,
         paid_by_id=user.id,
@@ -189,14 +180,14 @@ def test_calculate_balance_success(db_session):
     db_session.add(expense)
     db_session.flush()
 
-    split_user = ExpenseSplit(expense_id=expense.id, user_id=user.id, amount=40.0)
-    split_partner = ExpenseSplit(expense_id=expense.id, user_id=partner.id, amount=80.0)
+    split_user = ExpenseSplit(expense_id=expense.id, user_id=user.id, amount=4000)
+    split_partner = ExpenseSplit(expense_id=expense.id, user_id=partner.id, amount=8000)
     db_session.add_all([split_user, split_partner])
     db_session.flush()
 
     balance = calculate_balance(user=user, group_id=group.id, db=db_session)
 
-    assert balance == pytest.approx(80.0)
+    assert balance == 8000 #cents, summed exactly
 
 
 def test_calculate_balance_failure(db_session, monkeypatch):
@@ -209,6 +200,59 @@ def test_calculate_balance_failure(db_session, monkeypatch):
         calculate_balance(user=User(id=1, name="Temp", email="t@example.com", pw="pw"), group_id=1, db=db_session)
 
 
+def test_calculate_balances_matches_per_user(db_session):
+    user = User(name="Quinn", email="quinn@example.com", pw="hashed")
+    partner = User(name="Rae", email="rae@example.com", pw="hashed")
+    group = Group(name="Camping", pw="pw", emoji=None)
+    db_session.add_all([user, partner, group])
+    db_session.flush()
+
+    for payer, amount in [(user, 9000), (partner, 3000)]:
+        expense = Expense(amount=amount, description="Gear", group_id=group.id, paid_by_id=payer.id, created_by_id=payer.id)
+        expense.splits = [ExpenseSplit(user_id=user.id, amount=amount // 2), ExpenseSplit(user_id=partner.id, amount=amount // 2)]
+        db_session.add(expense)
+    db_session.flush()
+
+    balances = calculate_balances(group_id=group.id, db=db_session)
+
+    assert balances[user.id] == calculate_balance(user=user, group_id=group.id, db=db_session)
+    assert balances[user.id] == 3000
+    assert balances[partner.id] == -3000
+
+
+def test_calculate_balances_compact_equal_splits(db_session, query_counter):
+    users = [User(name=f"Compact{i}", email=f"compact{i}@example.com", pw="hashed") for i in range(3)]
+    group = Group(name="Compact", pw="pw", emoji=None)
+    db_session.add_all(users + [group])
+    db_session.flush()
+    ids = sorted(user.id for user in users)
+    # same lists with different leftovers, a refund (negative) and a second list; grouped in sql, expanded per list
+    expected = {user_id: 0 for user_id in ids}
+    for amount, participants in [(100, ids), (101, ids), (1000, ids), (-100, ids), (-7, ids[1:]), (5, ids[1:])]:
+        db_session.add(Expense(amount=amount, description=None, group_id=group.id, paid_by_id=ids[0], created_by_id=ids[0], equal_split_user_ids=participants))
+        expected[ids[0]] += amount
+        for user_id, share in split_equal(amount, participants).items():
+            expected[user_id] -= share
+    db_session.flush()
+
+    query_counter.reset()
+    balances = calculate_balances(group_id=group.id, db=db_session)
+
+    assert balances == expected
+    assert query_counter.count == 3
+    assert calculate_balance(user=users[2], group_id=group.id, db=db_session) == expected[users[2].id]
+
+
+def test_calculate_balances_failure(db_session, monkeypatch):
+    def broken_query(*args, **kwargs):
+        raise RuntimeError("sum failed")
+
+    monkeypatch.setattr(db_session, "query", broken_query)
+
+    with pytest.raises(GroupCalculateBalanceError):
+        calculate_balances(group_id=1, db=db_session)
+
+
 def test_create_group_invite_service_success(db_session):
     user = User(name="Olive", email="olive@example.com", pw="hashed")
     group = Group(name="Potluck", pw="pw", emoji=None)
@@ -0,0 +1,89 @@
+from datetime import date, datetime, timezone
+
+from sqlalchemy import select
+
+from app.db.models import Group, GroupMembers, User, MonthlyRollup
+from app.db.schemas import ExpenseCreate, ExpenseUpdate, ExpenseDelete
+from app.services.expense_service import create_expense_service, edit_expense_service, delete_expense_service
+from app.services.rollup_service import expense_contribution, rebuild_group_rollups, get_group_rollups, month_of
+
+
+def _group(db_session, size: int = 3) -> tuple[Group, list[User]]:
+    users = [User(name=f"Roll{i}", email=f"roll{i}@example.com", pw="hashed") for i in range(size)]
+    group = Group(name="Rollups", pw="pw", emoji=None)
+    db_session.add_all(users + [group])
+    db_session.flush()
+    db_session.add_all([GroupMembers(user_id=user.id, group_id=group.id) for user in users])
+    db_session.flush()
+    return group, users
+
+
+def _payload(paid_by: User, amount: float, occurred_at: datetime, **fields) -> ExpenseCreate:
+    return ExpenseCreate.model_validate({"paid_by_id": paid_by.id, "amount": amount, "description": None, "occurred_at": occurred_at, **fields})
+
+
+def _rollups(group_id: int, db_session) -> dict[tuple[date, int], tuple[int, int, int, int]]:
+    rows = db_session.scalars(select(MonthlyRollup).where(MonthlyRollup.group_id == group_id))
+    return {
+        (row.month, row.user_id): (row.paid_total, row.paid_count, row.owed_total, row.owed_count)
+        for row in rows if row.paid_count or row.owed_count
+    }
+
+
+def test_month_of_is_utc():
+    assert month_of(datetime(2025, 3, 31, 23, 30)) == date(2025, 3, 1)
+    assert month_of(datetime.fromisoformat("2025-04-01T01:00:00+02:00")) == date(2025, 3, 1)
+
+
+def test_expense_contribution():
+    contribution = expense_contribution(1000, 1, datetime(2025, 5, 17), {1: 400, 2: 600})
+    assert contribution == {(1, date(2025, 5, 1)): [1000, 1, 400, 1], (2, date(2025, 5, 1)): [0, 0, 600, 1]}
+
+
+def test_write_paths_match_rebuild(db_session):
+    group, (alice, bob, cara) = _group(db_session)
+    march, april = datetime(2025, 3, 10, tzinfo=timezone.utc), datetime(2025, 4, 2, tzinfo=timezone.utc)
+
+    dinner = create_expense_service(new_expense=_payload(alice, 10, march, split={"kind": "equal"}), user_id=alice.id, group_id=group.id, db=db_session)
+    taxi = create_expense_service(
+        new_expense=_payload(bob, 9, march, split={"kind": "shares", "shares": {str(bob.id): 2, str(cara.id): 1}}),
+        user_id=bob.id, group_id=group.id, db=db_session,
+    )
+    create_expense_service(new_expense=_payload(cara, 5, april, split={"kind": "equal", "user_ids": [alice.id]}), user_id=cara.id, group_id=group.id, db=db_session)
+
+    assert _rollups(group.id, db_session) == {
+        (date(2025, 3, 1), alice.id): (1000, 1, 334, 1),
+        (date(2025, 3, 1), bob.id): (900, 1, 933, 2),
+        (date(2025, 3, 1), cara.id): (0, 0, 633, 2),
+        (date(2025, 4, 1), alice.id): (0, 0, 500, 1),
+        (date(2025, 4, 1), cara.id): (500, 1, 0, 0),
+    }
+
+    # moving the dinner to april and switching it to explicit splits moves all of it
+    edit = _payload(bob, 12, april, splits=[{"user": {"id": bob.id, "name": bob.name}, "amount": 12}])
+    edit_expense_service(ExpenseUpdate(id=dinner.id, version=1, expense=edit), user_id=bob.id, group_id=group.id, db=db_session)
+    delete_expense_service(ExpenseDelete(id=taxi.id, version=1), group_id=group.id, db=db_session)
+
+    incremental = _rollups(group.id, db_session)
+    assert incremental == {
+        (date(2025, 4, 1), alice.id): (0, 0, 500, 1),
+        (date(2025, 4, 1), bob.id): (1200, 1, 1200, 1),
+        (date(2025, 4, 1), cara.id): (500, 1, 0, 0),
+    }
+    rebuild_group_rollups(group.id, db_session)
+    assert _rollups(group.id, db_session) == incremental
+
+
+def test_get_group_rollups_range(db_session):
+    group, (alice, bob, _) = _group(db_session)
+    for month in (1, 2, 3):
+        occurred_at = datetime(2025, month, 15, tzinfo=timezone.utc)
+        create_expense_service(new_expense=_payload(alice, month, occurred_at, split={"kind": "equal", "user_ids": [bob.id]}), user_id=alice.id, group_id=group.id, db=db_session)
+
+    rows = get_group_rollups(group.id, db_session, since=date(2025, 2, 20), until=date(2025, 3, 1))
+
+    # since rounds down to its month, until is exclusive; months with nothing left in them are skipped
+    assert [(row.month, row.user_id, row.paid_total, row.owed_total) for row in rows] == [
+        (date(2025, 2, 1), alice.id, 200, 0),
+        (date(2025, 2, 1), bob.id, 0, 200),
+    ]
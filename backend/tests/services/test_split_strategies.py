@@ -0,0 +1,102 @@
+from fractions import Fraction
+
+import pytest
+from pydantic import ValidationError
+
+from app.db.models import Group, GroupMembers, User
+from app.db.schemas import ExpenseCreate
+from app.core.exceptions import ExpenseSplitMemberError
+from app.services.split_strategies import split_equal, split_weighted, resolve_splits, equal_split_members
+
+
+def _expense(amount: float, **fields) -> ExpenseCreate:
+    return ExpenseCreate.model_validate({"paid_by_id": 1, "amount": amount, "description": None, **fields})
+
+
+def test_split_equal_gives_remainder_to_lowest_ids():
+    assert split_equal(1000, [7, 3, 5]) == {3: 334, 5: 333, 7: 333}
+    assert split_equal(-1000, [7, 3, 5]) == {3: -334, 5: -333, 7: -333} #refunds mirror it
+    assert sum(split_equal(100_01, list(range(1, 101))).values()) == 100_01
+
+
+def test_split_weighted_largest_remainder():
+    # 2:1 of 1.00 -> 66.67 / 33.33
+    assert split_weighted(100, {1: Fraction(2), 2: Fraction(1)}) == {1: 67, 2: 33}
+    # equal fractions tie -> lowest user id
+    assert split_weighted(100, {9: Fraction(1), 4: Fraction(1), 6: Fraction(1)}) == {4: 34, 6: 33, 9: 33}
+    # non-integer weights are scaled, not rounded
+    assert split_weighted(1000, {1: Fraction("33.5"), 2: Fraction("66.5")}) == {1: 335, 2: 665}
+
+
+def test_split_weighted_is_exact_for_large_groups():
+    weights = {user_id: Fraction(user_id % 7 + 1) for user_id in range(1, 5001)}
+    result = split_weighted(123_456_78, weights)
+    assert sum(result.values()) == 123_456_78
+    assert result == split_weighted(123_456_78, dict(reversed(weights.items()))) #independent of input order
+
+
+def _group_with_members(db_session, count: int, prefix: str) -> tuple[Group, list[User]]:
+    users = [User(name=f"{prefix}{i}", email=f"{prefix.lower()}{i}@example.com", pw="hashed") for i in range(count)]
+    group = Group(name=prefix, pw="pw", emoji=None)
+    db_session.add_all(users + [group])
+    db_session.flush()
+    db_session.add_all([GroupMembers(user_id=user.id, group_id=group.id) for user in users])
+    db_session.flush()
+    return group, users
+
+
+def test_resolve_rules(db_session):
+    group, users = _group_with_members(db_session, 2, "Rules")
+    a, b = (user.id for user in users)
+    assert resolve_splits(_expense(10, split={"kind": "shares", "shares": {a: 3, b: 1}}), group_id=group.id, db=db_session) == {a: 750, b: 250}
+    assert resolve_splits(_expense(10, split={"kind": "percentage", "percentages": {a: 12.5, b: 87.5}}), group_id=group.id, db=db_session) == {a: 125, b: 875}
+    assert resolve_splits(_expense(10, split={"kind": "exact", "amounts": {a: 9.99, b: 0.01}}), group_id=group.id, db=db_session) == {a: 999, b: 1}
+    assert resolve_splits(_expense(10, split={"kind": "equal", "user_ids": [b, a, b]}), group_id=group.id, db=db_session) == {a: 500, b: 500}
+    explicit = [{"user": {"id": a, "name": "a"}, "amount": 4}, {"user": {"id": a, "name": "a"}, "amount": 6}]
+    assert resolve_splits(_expense(10, splits=explicit), group_id=group.id, db=db_session) == {a: 1000}
+
+
+def test_resolve_equal_over_group_members(db_session):
+    group, users = _group_with_members(db_session, 3, "Eq")
+
+    result = resolve_splits(_expense(0.1, split={"kind": "equal"}), group_id=group.id, db=db_session)
+
+    assert result == {users[0].id: 4, users[1].id: 3, users[2].id: 3}
+
+
+def test_equal_split_rejects_non_members(db_session):
+    group, users = _group_with_members(db_session, 2, "Outside")
+    stranger = User(name="Stranger", email="stranger-eq@example.com", pw="hashed")
+    db_session.add(stranger)
+    db_session.flush()
+
+    for outsider in (stranger.id, 99999): #another user, an id with no user at all
+        expense = _expense(10, split={"kind": "equal", "user_ids": [users[0].id, outsider]})
+        with pytest.raises(ExpenseSplitMemberError):
+            equal_split_members(expense, group_id=group.id, db=db_session)
+
+
+def test_weights_of_non_members_are_rejected_before_splitting(db_session, monkeypatch):
+    group, users = _group_with_members(db_session, 1, "Weights")
+    monkeypatch.setattr("app.services.split_strategies.split_weighted", lambda *args: pytest.fail("split before the member check"))
+
+    expense = _expense(10, split={"kind": "shares", "shares": {users[0].id: 1, 99999: 1}})
+    with pytest.raises(ExpenseSplitMemberError):
+        resolve_splits(expense, group_id=group.id, db=db_session)
+
+
+@pytest.mark.parametrize("fields", [
+    {},
+    {"splits": [], "split": {"kind": "equal"}},
+    {"split": {"kind": "percentage", "percentages": {"1": 50, "2": 49.99}}},
+    {"split": {"kind": "exact", "amounts": {"1": 5}}},
+    {"split": {"kind": "shares", "shares": {"1": 0}}},
+    {"split": {"kind": "shares", "shares": {"1": "1E-5000000", "2": "1E5000000"}}}, #unbounded exponents
+    {"split": {"kind": "shares", "shares": {"1": "100." + "0" * 100 + "1"}}}, #more places than pydantic's check sees
+    {"split": {"kind": "percentage", "percentages": {"1": "100", "2": "1E-3000000"}}}, #100 under 28-digit rounding
+    {"split": {"kind": "equal", "user_ids": []}},
+    {"split": {"kind": "evenly"}},
+])
+def test_invalid_split_rules_are_rejected(fields):
+    with pytest.raises(ValidationError):
+        _expense(10, **fields)
@@ -0,0 +1,104 @@
+import gzip
+import zlib
+
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app.core.compression import CompressionMiddleware, choose_encoding, _Gzip
+from app.core.config import settings
+
+
+BIG = "x" * 5000
+
+
+def _app() -> CompressionMiddleware:
+    async def big(request):
+        return PlainTextResponse(BIG)
+
+    async def small(request):
+        return PlainTextResponse("tiny")
+
+    async def image(request):
+        return Response(b"\x89PNG" + b"0" * 5000, media_type="image/png")
+
+    async def stream(request):
+        async def rows():
+            for n in range(3):
+                yield f"row {n}\n" * 100
+        return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+    app = Starlette(routes=[Route("/big", big), Route("/small", small), Route("/image", image), Route("/stream", stream)])
+    return CompressionMiddleware(app, encodings={"gzip": lambda: _Gzip(6)}) #fixed, so installed brotli/zstd don't change the tests
+
+
+def _raw_get(client: TestClient, path: str, accept_encoding: str = "gzip"):
+    # iter_raw skips httpx's decoding, so we see the bytes on the wire
+    with client.stream("GET", path, headers={"Accept-Encoding": accept_encoding}) as response:
+        return response, b"".join(response.iter_raw())
+
+
+def test_compresses_large_allowed_bodies():
+    response, body = _raw_get(TestClient(_app()), "/big")
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) == len(body)
+    assert gzip.decompress(body).decode() == BIG
+
+
+def test_skips_small_bodies_and_other_types():
+    client = TestClient(_app())
+
+    response, body = _raw_get(client, "/small")
+    assert "content-encoding" not in response.headers
+    assert body == b"tiny"
+
+    response, _ = _raw_get(client, "/image")
+    assert "content-encoding" not in response.headers
+
+
+def test_skips_when_client_does_not_accept():
+    response, body = _raw_get(TestClient(_app()), "/big", accept_encoding="identity")
+
+    assert "content-encoding" not in response.headers
+    assert body.decode() == BIG
+
+
+def test_streams_are_compressed_per_chunk():
+    response, body = _raw_get(TestClient(_app()), "/stream")
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    assert decompressor.decompress(body).decode() == "".join(f"row {n}\n" * 100 for n in range(3))
+
+
+def test_disabled_by_setting(monkeypatch):
+    monkeypatch.setattr(settings, "compression_enabled", False)
+
+    response, _ = _raw_get(TestClient(_app()), "/big")
+
+    assert "content-encoding" not in response.headers
+
+
+def test_choose_encoding_honours_q_and_server_order():
+    encodings = {"br": None, "zstd": None, "gzip": None}
+
+    assert choose_encoding("gzip, br", encodings) == "br"
+    assert choose_encoding("gzip, br;q=0.5", encodings) == "gzip"
+    assert choose_encoding("*", encodings) == "br"
+    assert choose_encoding("deflate", encodings) is None
+    assert choose_encoding("gzip;q=0", {"gzip": None}) is None
+
+
+def test_group_view_is_compressed(client, db_session, auth_header, monkeypatch):
+    monkeypatch.setattr(settings, "compression_min_size", 0) #a user without groups gets "[]"
+    headers, _ = auth_header
+
+    response = client.get("/groups/view-short", headers={**headers, "Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert isinstance(response.json(), list)
@@ -0,0 +1,87 @@
+import json
+import logging
+import queue
+
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app.core.logger import JsonFormatter, NonBlockingQueueHandler, RequestIdMiddleware, SamplingFilter, current_request_id
+
+
+def _record(name: str = "test_app.app.services.group_service", level: int = logging.INFO, msg: str = "hello %s", args=("world",)) -> logging.LogRecord:
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+def test_json_formatter_renders_args_and_extras():
+    record = _record()
+    record.request_id = "abc"
+    record.group_id = 7 #as if passed through extra={...}
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert entry["msg"] == "hello world"
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "test_app.app.services.group_service"
+    assert entry["request_id"] == "abc"
+    assert entry["group_id"] == 7
+    assert "args" not in entry
+
+
+def test_queue_handler_drops_instead_of_blocking():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=2))
+
+    for _ in range(5):
+        handler.handle(_record())
+
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+
+
+def test_queue_handler_defers_formatting():
+    handler = NonBlockingQueueHandler(queue.Queue())
+
+    handler.handle(_record())
+
+    queued = handler.queue.get_nowait()
+    assert queued.args == ("world",) #rendered by the listener thread, not here
+    assert queued.request_id is None
+
+
+def test_sampling_filter_uses_longest_prefix():
+    sampling = SamplingFilter({"app.services": 1.0, "app.services.group_service": 0.0}, "test_app")
+
+    assert not sampling.filter(_record())
+    assert sampling.filter(_record(name="test_app.app.services.expense_service"))
+    assert sampling.filter(_record(level=logging.WARNING)) #never sampled away
+    assert sampling.filter(_record(name="test_app.app.api.groups"))
+
+
+def _app() -> RequestIdMiddleware:
+    async def echo(request):
+        return PlainTextResponse(current_request_id())
+
+    return RequestIdMiddleware(Starlette(routes=[Route("/", echo)]))
+
+
+def test_request_id_middleware_generates_and_reuses():
+    client = TestClient(_app())
+
+    generated = client.get("/")
+    assert generated.headers["x-request-id"] == generated.text
+    assert len(generated.text) == 32
+
+    reused = client.get("/", headers={"X-Request-ID": "req-123"})
+    assert reused.headers["x-request-id"] == reused.text == "req-123"
+
+    rejected = client.get("/", headers={"X-Request-ID": "has spaces; and=junk"})
+    assert rejected.text != "has spaces; and=junk"
+
+
+def test_app_responses_carry_request_id(client, auth_header):
+    headers, _ = auth_header
+
+    response = client.get("/groups/view-short", headers={**headers, "X-Request-ID": "trace-1"})
+
+    assert response.headers["x-request-id"] == "trace-1"
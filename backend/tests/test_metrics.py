@@ -0,0 +1,81 @@
+import os
+
+from fastapi import HTTPException
+from prometheus_client import REGISTRY
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.exceptions import GroupNotFoundError
+from app.core.metrics import record_exception
+
+
+def _sample(name: str, labels: dict) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_metrics_endpoint_exposes_route_latency(client, auth_header):
+    headers, _ = auth_header
+    client.get("/groups/view-short", headers=headers)
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/groups/view-short"}' in body
+    assert "http_requests_in_flight" in body
+    assert "db_pool_checked_out" in body
+
+
+def test_metrics_route_label_uses_template(client, auth_header):
+    headers, _ = auth_header
+    before = _sample("http_requests_total", {"method": "GET", "route": "/groups/{group_id}", "status": "403"})
+
+    client.get("/groups/12345", headers=headers)
+
+    after = _sample("http_requests_total", {"method": "GET", "route": "/groups/{group_id}", "status": "403"})
+    assert after == before + 1
+
+
+def test_record_exception_uses_service_exception_class():
+    before = _sample("http_exceptions_total", {"exception": "GroupNotFoundError"})
+
+    try:
+        try:
+            raise GroupNotFoundError
+        except GroupNotFoundError:
+            raise HTTPException(status_code=404, detail="Group not found")
+    except HTTPException as exc:
+        record_exception(exc)
+
+    assert _sample("http_exceptions_total", {"exception": "GroupNotFoundError"}) == before + 1
+
+
+def test_sql_compiled_cache_counted(client, auth_header):
+    headers, _ = auth_header
+    before = _sample("cache_requests_total", {"cache": "sql_compiled", "result": "hit"})
+
+    client.get("/groups/view-short", headers=headers)
+    client.get("/groups/view-short", headers=headers)
+
+    assert _sample("cache_requests_total", {"cache": "sql_compiled", "result": "hit"}) > before
+
+
+def test_metrics_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_token", "scrape-secret")
+
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert response.status_code == 200
+    assert "http_requests_total" in response.text
+
+
+def test_multiprocess_registry_keeps_log_drops(client, monkeypatch, tmp_path):
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    monkeypatch.setattr(metrics, "_MULTIPROCESS", True)
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert f'log_records_dropped_total{{pid="{os.getpid()}"}}' in response.text
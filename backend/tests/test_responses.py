@@ -0,0 +1,64 @@
+import json
+
+from app.core.responses import FastJSONResponse, negotiate, COLUMNAR_JSON, COLUMNAR_MSGPACK
+from app.core.timing import RequestTimings, _current_timings
+from app.db.models import Group, GroupMembers, User, Expense, ExpenseSplit
+from app.db.schemas import GroupOutAdapter, GroupShortListAdapter
+from app.services.group_read_model import load_group_view
+
+
+def _group_with_expense(db_session) -> Group:
+    user = User(name="Renderer", email="renderer@example.com", pw="hashed")
+    group = Group(name="Rendered", pw="pw", emoji="🏠")
+    db_session.add_all([user, group])
+    db_session.flush()
+    db_session.add(GroupMembers(user_id=user.id, group_id=group.id))
+    expense = Expense(amount=1250, description="Lunch", group_id=group.id, paid_by_id=user.id, created_by_id=user.id)
+    expense.splits = [ExpenseSplit(user_id=user.id, amount=1250)]
+    db_session.add(expense)
+    db_session.flush()
+    return group
+
+
+def test_fast_json_response_renders_group_view(db_session):
+    group = load_group_view(_group_with_expense(db_session).id, db=db_session)
+    for member in group.members:
+        member.balance = 0
+
+    response = FastJSONResponse(group, GroupOutAdapter)
+
+    assert response.media_type == "application/json"
+    body = json.loads(response.body)
+    assert body["name"] == "Rendered"
+    assert body["members"] == [{"id": group.members[0].id, "name": "Renderer", "balance": 0.0}]
+    assert body["expenses"][0]["paid_by"]["name"] == "Renderer"
+    assert body["expenses"][0]["splits"][0]["amount"] == 12.5
+
+
+def test_fast_json_response_counts_towards_ser_timing():
+    timings = RequestTimings(started=0.0)
+    token = _current_timings.set(timings)
+    try:
+        group = {"id": 1, "name": "a", "emoji": None, "member_count": 1, "expense_count": 0, "total_spent": 0, "last_activity_at": "2025-01-01T00:00:00Z"}
+        FastJSONResponse([group], GroupShortListAdapter)
+    finally:
+        _current_timings.reset(token)
+
+    assert timings.ser_ms > 0
+
+
+OFFERS = ["application/json", COLUMNAR_JSON, COLUMNAR_MSGPACK]
+
+
+def test_negotiate_defaults_to_first_offer():
+    assert negotiate(None, OFFERS) == "application/json"
+    assert negotiate("*/*", OFFERS) == "application/json"
+    assert negotiate("text/html", OFFERS) == "application/json"
+
+
+def test_negotiate_honours_quality():
+    assert negotiate(COLUMNAR_MSGPACK, OFFERS) == COLUMNAR_MSGPACK
+    assert negotiate(f"application/json;q=0.5, {COLUMNAR_JSON}", OFFERS) == COLUMNAR_JSON
+    assert negotiate(f"{COLUMNAR_MSGPACK};q=0.9, {COLUMNAR_JSON};q=0.8", OFFERS) == COLUMNAR_MSGPACK
+    # a specific range beats the wildcard it overlaps with
+    assert negotiate(f"application/*, application/json;q=0", OFFERS) == COLUMNAR_JSON
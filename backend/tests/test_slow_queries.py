@@ -0,0 +1,77 @@
+from app.core.config import settings
+from app.core.slow_queries import recent_slow_queries, clear_slow_queries, _param_shape
+from app.db.models import Group, User
+from app.services.group_service import get_short_group_details
+
+
+def _enable(monkeypatch, threshold_ms: float = 0.0):
+    monkeypatch.setattr(settings, "slow_query_log_enabled", True)
+    monkeypatch.setattr(settings, "slow_query_threshold_ms", threshold_ms)
+    clear_slow_queries()
+
+
+def test_slow_query_attributed_to_service(db_session, monkeypatch):
+    user = User(name="Slow", email="slow@example.com", pw="hashed")
+    db_session.add(user)
+    db_session.flush()
+    _enable(monkeypatch)
+
+    get_short_group_details(user_id=user.id, db=db_session)
+
+    recorded = recent_slow_queries()
+    assert recorded
+    newest = recorded[0]
+    assert newest.call_site.startswith("app.services.group_service.get_short_group_details:")
+    assert "group" in newest.statement.lower()
+    # only types are recorded, never the bound values
+    assert user.id not in (newest.param_shape if isinstance(newest.param_shape, list) else newest.param_shape.values())
+
+
+def test_slow_query_threshold_filters(db_session, monkeypatch):
+    _enable(monkeypatch, threshold_ms=60_000)
+
+    db_session.add(Group(name="Fast", pw="pw", emoji=None))
+    db_session.flush()
+
+    assert recent_slow_queries() == []
+
+
+def test_param_shape_executemany():
+    shape = _param_shape([("a", 1), ("b", 2)], executemany=True)
+
+    assert shape == {"batch": 2, "row": ["str", "int"]}
+
+
+def test_admin_slow_queries_disabled_without_key(client, monkeypatch):
+    monkeypatch.setattr(settings, "admin_api_key", None)
+
+    response = client.get("/admin/slow-queries")
+
+    assert response.status_code == 404
+
+
+def test_admin_slow_queries_wrong_key(client, monkeypatch):
+    monkeypatch.setattr(settings, "admin_api_key", "secret")
+
+    response = client.get("/admin/slow-queries", headers={"X-Admin-Key": "nope"})
+
+    assert response.status_code == 403
+
+    response = client.get("/admin/slow-queries", headers={"X-Admin-Key": "sécret".encode("latin-1")}) #non-ascii, as servers decode headers
+
+    assert response.status_code == 403
+
+
+def test_admin_slow_queries_success(client, auth_header, monkeypatch):
+    headers, _ = auth_header
+    monkeypatch.setattr(settings, "admin_api_key", "secret")
+    _enable(monkeypatch)
+
+    client.get("/groups/view-short", headers=headers)
+    monkeypatch.setattr(settings, "slow_query_log_enabled", False)
+    response = client.get("/admin/slow-queries", headers={"X-Admin-Key": "secret"})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body
+    assert any(entry["call_site"] and entry["call_site"].startswith("app.services.group_service") for entry in body)
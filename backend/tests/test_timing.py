@@ -0,0 +1,58 @@
+from app.core.config import settings
+from app.core.logger import RequestIdMiddleware
+from app.core.security import create_access_token, hash_password
+from app.core.timing import RequestTimings, ServerTimingMiddleware
+from app.db.models import Group, GroupMembers, User
+from app.main import app
+
+
+def _member_headers(db_session) -> tuple[dict[str, str], Group]:
+    user = User(name="Timer", email="timer@example.com", pw=hash_password("password"))
+    group = Group(name="Timed", pw="pw", emoji=None)
+    db_session.add_all([user, group])
+    db_session.flush()
+    db_session.add(GroupMembers(user_id=user.id, group_id=group.id))
+    db_session.flush()
+    return {"Authorization": f"Bearer {create_access_token(user.id)}"}, group
+
+
+def test_server_timing_header_when_sampled(client, db_session, monkeypatch):
+    monkeypatch.setattr(settings, "perf_sample_rate", 1.0)
+    headers, group = _member_headers(db_session)
+
+    response = client.get(f"/groups/{group.id}", headers=headers)
+
+    assert response.status_code == 200
+    timing = response.headers["Server-Timing"]
+    assert timing.startswith("db;dur=")
+    assert "ser;dur=" in timing
+    assert "total;dur=" in timing
+    # auth lookups + group details + balances all go through the engine hooks
+    queries = int(timing.split('desc="')[1].split(" queries")[0])
+    assert queries > 0
+
+
+def test_server_timing_header_absent_when_not_sampled(client, db_session, monkeypatch):
+    monkeypatch.setattr(settings, "perf_sample_rate", 0.0)
+    headers, group = _member_headers(db_session)
+
+    response = client.get(f"/groups/{group.id}", headers=headers)
+
+    assert response.status_code == 200
+    assert "Server-Timing" not in response.headers
+
+
+def test_request_timings_log_fields():
+    timings = RequestTimings(started=0.0, queries=3, db_ms=1.234, rows=7, orm_loads=2, ser_ms=0.5)
+
+    fields = timings.log_fields()
+
+    assert fields["queries"] == 3
+    assert fields["db_ms"] == 1.23
+    assert fields["rows"] == 7
+    assert fields["orm_loads"] == 2
+
+
+def test_timing_wraps_every_middleware_but_the_request_id():
+    outermost_first = [middleware.cls for middleware in app.user_middleware]
+    assert outermost_first[:2] == [RequestIdMiddleware, ServerTimingMiddleware]
@@ -0,0 +1,135 @@
+import json
+
+import pytest
+
+from app.core.config import settings
+from app.core.tracing import recent_traces, clear_traces, span, traced, flush_trace_file
+from app.db.models import Group, GroupMembers
+
+
+@pytest.fixture()
+def sampled(monkeypatch):
+    monkeypatch.setattr(settings, "trace_sample_rate", 1.0)
+    clear_traces()
+    yield
+    clear_traces()
+
+
+def _children(trace, parent) -> list:
+    return [child for child in trace.spans if child.parent_id == parent.span_id]
+
+
+def _by_name(trace, name: str):
+    return next(recorded for recorded in trace.spans if recorded.name == name)
+
+
+def test_span_tree_covers_dependency_service_sql_and_serialization(client, db_session, auth_header, sampled):
+    headers, user = auth_header
+    group = Group(name="Traced", pw="pw", emoji=None)
+    db_session.add(group)
+    db_session.flush()
+    db_session.add(GroupMembers(user_id=user.id, group_id=group.id))
+    db_session.flush()
+
+    response = client.get("/groups/view-short", headers=headers)
+
+    assert response.status_code == 200
+    [trace] = recent_traces()
+    root = trace.spans[0]
+    assert root.name == "GET /groups/view-short"
+    assert root.parent_id is None
+    assert root.attributes["http.status_code"] == 200
+
+    dependency = _by_name(trace, "app.core.security.get_current_user")
+    endpoint = _by_name(trace, "endpoint view_all_groups")
+    assert dependency.parent_id == endpoint.parent_id == root.span_id
+
+    service = _by_name(trace, "app.services.group_service.get_short_group_details")
+    assert service.parent_id == endpoint.span_id
+    sql = [child for child in _children(trace, service) if child.name == "sql"]
+    assert sql and all("db.statement" in child.attributes for child in sql)
+    assert _by_name(trace, "serialize json").parent_id == endpoint.span_id
+    assert all(recorded.end_ns is not None and recorded.end_ns >= recorded.start_ns for recorded in trace.spans)
+
+
+def test_unsampled_requests_record_nothing(client, auth_header, monkeypatch):
+    monkeypatch.setattr(settings, "trace_sample_rate", 0.0)
+    clear_traces()
+    headers, _ = auth_header
+
+    client.get("/groups/view-short", headers=headers)
+
+    assert recent_traces() == []
+
+
+def test_traceparent_decides_sampling_and_trace_id(client, auth_header, monkeypatch):
+    monkeypatch.setattr(settings, "trace_sample_rate", 0.0)
+    monkeypatch.setattr(settings, "trace_trust_upstream", True)
+    clear_traces()
+    headers, _ = auth_header
+    trace_id, parent_id = "4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7"
+
+    client.get("/groups/view-short", headers={**headers, "traceparent": f"00-{trace_id}-{parent_id}-01"})
+    client.get("/groups/view-short", headers={**headers, "traceparent": f"00-{trace_id}-{parent_id}-00"})
+
+    [trace] = recent_traces()
+    assert trace.trace_id == trace_id
+    assert trace.spans[0].parent_id == parent_id
+
+
+def test_untrusted_traceparent_cannot_force_sampling(client, auth_header, monkeypatch):
+    clear_traces()
+    headers, _ = auth_header
+    trace_id, parent_id = "4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7"
+    traceparent = {"traceparent": f"00-{trace_id}-{parent_id}-01"}
+
+    monkeypatch.setattr(settings, "trace_sample_rate", 0.0)
+    client.get("/groups/view-short", headers={**headers, **traceparent})
+    assert recent_traces() == []
+
+    # sampled by our own rate, the upstream trace is still continued
+    monkeypatch.setattr(settings, "trace_sample_rate", 1.0)
+    client.get("/groups/view-short", headers={**headers, **traceparent})
+    [trace] = recent_traces()
+    assert (trace.trace_id, trace.spans[0].parent_id) == (trace_id, parent_id)
+    clear_traces()
+
+
+def test_traced_is_transparent_outside_requests(sampled):
+    @traced
+    def broken():
+        raise ValueError("boom")
+
+    # outside a request nothing is recorded and the function behaves normally
+    with pytest.raises(ValueError):
+        broken()
+    with span("outside") as outside:
+        assert outside is None
+
+
+def test_trace_file_export(client, auth_header, sampled, monkeypatch, tmp_path):
+    trace_file = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(settings, "trace_file", str(trace_file))
+    headers, _ = auth_header
+
+    client.get("/groups/view-short", headers=headers)
+    flush_trace_file() #written by the writer thread, not the request
+
+    [line] = trace_file.read_text().splitlines()
+    exported = json.loads(line)
+    assert exported["trace_id"] == recent_traces()[0].trace_id
+    assert exported["spans"][0]["name"] == "GET /groups/view-short"
+
+
+def test_admin_traces(client, auth_header, sampled, monkeypatch):
+    monkeypatch.setattr(settings, "admin_api_key", "secret")
+    headers, _ = auth_header
+    client.get("/groups/view-short", headers=headers)
+    monkeypatch.setattr(settings, "trace_sample_rate", 0.0)
+
+    response = client.get("/admin/traces", headers={"X-Admin-Key": "secret"})
+
+    assert response.status_code == 200
+    [trace] = response.json()
+    assert trace["spans"][0]["name"] == "GET /groups/view-short"
+    assert any(recorded["name"] == "sql" for recorded in trace["spans"])
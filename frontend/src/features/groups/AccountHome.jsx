@@ -18,6 +18,14 @@ import { Label } from '../../components/ui/label.jsx'
 import { Card } from '../../components/ui/card.jsx'
 import { cn } from '../../lib/utils.js'
 
+// counters come with the group list (denormalized on the group), no need to open each group
+function formatGroupSummary(group) {
+  const members = `${group.member_count} ${group.member_count === 1 ? 'member' : 'members'}`
+  const expenses = `${group.expense_count} ${group.expense_count === 1 ? 'expense' : 'expenses'}`
+  const spent = new Intl.NumberFormat(undefined, { style: 'currency', currency: 'USD' }).format(group.total_spent ?? 0)
+  return `${members} · ${expenses} · ${spent}`
+}
+
 function EmojiPicker({ selectedEmoji, onEmojiSelect }) {
   const emojis = [
     { name: 'Party', code: '🎉' },
@@ -274,6 +282,8 @@ export default function AccountHome() {
     try {
       const result = await getUserGroups()
       const list = Array.isArray(result) ? result : result ? [result] : []
+      // most recently active first; iso timestamps sort as strings
+      list.sort((a, b) => String(b.last_activity_at ?? '').localeCompare(String(a.last_activity_at ?? '')))
       setGroups(list)
       syncGroupSummaries(list)
     } catch (err) {
@@ -369,7 +379,10 @@ export default function AccountHome() {
                 className="flex w-full items-center gap-4 rounded-xl px-4 py-5 text-left"
               >
                 <span className="text-3xl">{group.emoji || '👥'}</span>
-                <span className="text-lg font-medium">{group.name}</span>
+                <span className="flex flex-col">
+                  <span className="text-lg font-medium">{group.name}</span>
+                  <span className="text-sm text-muted-foreground">{formatGroupSummary(group)}</span>
+                </span>
               </button>
             </Card>
           ))}
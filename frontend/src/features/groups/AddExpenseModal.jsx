@@ -286,6 +286,11 @@ export default function AddExpenseModal({
       }
     }
 
+    // nothing typed in by hand: let the server split evenly (stored compactly, leftover cents to the lowest ids)
+    const splitFields = selectedSplits.every((split) => !split.isManual)
+      ? { split: { kind: 'equal', user_ids: selectedSplits.map((split) => split.id) } }
+      : { splits: payloadSplits }
+
     const payerId = paidById ?? selectedSplits[0].id
 
     setIsSubmitting(true)
@@ -297,11 +302,12 @@ export default function AddExpenseModal({
         amount: roundedAmount,
         paid_by_id: payerId,
         photo_url: expense?.photo_url ?? null,
-        splits: payloadSplits,
+        ...splitFields,
       }
 
       updateGroupExpense(groupId, {
         id: expense.id,
+        version: expense.version,
         expense: expensePayload,
       })
         .then((updatedExpense) => {
@@ -320,7 +326,7 @@ export default function AddExpenseModal({
       amount: roundTwo(amountValue),
       paid_by_id: payerId,
       photo_url: null,
-      splits: payloadSplits,
+      ...splitFields,
     })
       .then((createdExpense) => {
         onSuccess(createdExpense, 'create')
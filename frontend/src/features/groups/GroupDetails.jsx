@@ -354,7 +354,7 @@ export default function GroupDetails() {
   async function handleDeleteExpense(expense) {
     if (!groupId || !expense?.id) return
     try {
-      await deleteGroupExpense(groupId, { id: expense.id })
+      await deleteGroupExpense(groupId, { id: expense.id, version: expense.version })
       setGroup((prev) => {
         if (!prev) return prev
         const existingExpenses = Array.isArray(prev.expenses) ? prev.expenses : []